@@ -0,0 +1,183 @@
+"""
+Slave adres haritası: Modbus adres aralığı -> depo + ofset + codec
+Her fonksiyon kodu bir adres alanına (coil, discrete input, holding, input register) bağlanır;
+alan, başlangıç adresine göre sıralı aralıklardan oluşur ve istek bisect ile çözülür.
+
+  AddressSpace(codec).add(start, count, store, offset, table)
+      [start, start + count) adreslerini store[offset ...] indekslerine eşler (codec alan başına)
+  read(address, count)            : yanıt verisi (bitler LSB ilk paketli, register'lar big-endian)
+  write(address, count, payload)  : istek verisini depolara yazar, yazılan (tablo, indeks, adet) listesi
+  overlay(start, count, store, ...): alanın kopyası, [start, start + count) başka depoya yönlendirilir
+
+Depo dilimlenebilir herhangi bir nesne olabilir (liste, numpy dizisi, PackedBits ya da okunduğunda
+değerini hesaplayan bir nesne, ör. change_feed.ChangeFeedRegisters).
+
+Haritada olmayan adresler okumada 0 döner (eski davranış); yazmada istek reddedilir.
+Yeni blok eklemek tek add() çağrısıdır, okuma / yazma yolunda bloğa özel dal yoktur.
+"""
+import struct
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+class BitCodec:
+    """PackedBits deposu; veri LSB ilk paketli bitlerdir"""
+    unit = "bits"
+
+    @staticmethod
+    def read(store, index: int, count: int) -> bytes:
+        return store.read_packed(index, count)
+
+    @staticmethod
+    def write(store, index: int, count: int, payload: bytes):
+        store.write_packed(index, count, payload)
+
+    @staticmethod
+    def join(parts: List[Tuple[int, int, bytes]], count: int) -> bytes:
+        """(istek içi ofset, adet, veri) parçalarını bit hizasında birleştir, boşluklar 0"""
+        value = 0
+        for position, _, data in parts:
+            value |= int.from_bytes(data, 'little') << position
+        return value.to_bytes((count + 7) // 8, 'little')
+
+    @staticmethod
+    def part(payload: bytes, position: int, count: int) -> bytes:
+        value = (int.from_bytes(payload, 'little') >> position) & ((1 << count) - 1)
+        return value.to_bytes((count + 7) // 8, 'little')
+
+class RegisterCodec:
+    """16-bit register listesi; veri big-endian register'lardır"""
+    unit = "registers"
+
+    @staticmethod
+    def read(store, index: int, count: int) -> bytes:
+        return struct.pack(f'>{count}H', *store[index:index + count])
+
+    @staticmethod
+    def write(store, index: int, count: int, payload: bytes):
+        store[index:index + count] = struct.unpack(f'>{count}H', payload[:2 * count])
+
+    @staticmethod
+    def join(parts: List[Tuple[int, int, bytes]], count: int) -> bytes:
+        data = bytearray(2 * count)
+        for position, size, part in parts:
+            data[2 * position:2 * (position + size)] = part
+        return bytes(data)
+
+    @staticmethod
+    def part(payload: bytes, position: int, count: int) -> bytes:
+        return payload[2 * position:2 * (position + count)]
+
+class ArrayRegisterCodec(RegisterCodec):
+    """uint16 numpy dizisi (ör. unit_arena görünümü); dilim tek seferde big-endian'a çevrilir"""
+
+    @staticmethod
+    def read(store, index: int, count: int) -> bytes:
+        return store[index:index + count].astype('>u2').tobytes()
+
+    @staticmethod
+    def write(store, index: int, count: int, payload: bytes):
+        store[index:index + count] = np.frombuffer(payload, dtype='>u2', count=count)
+
+@dataclass(frozen=True)
+class AddressRange:
+    start: int
+    count: int
+    store: Any
+    offset: int  # start adresinin depodaki indeksi
+    table: str   # Yazma günlüğündeki tablo adı (register_journal.TABLES)
+
+class AddressSpace:
+    """Tek bir adres alanı (ör. holding register'lar); tüm aralıklar aynı codec'i kullanır"""
+
+    def __init__(self, codec):
+        self.codec = codec
+        self.ranges: List[AddressRange] = []
+        self.starts: List[int] = []  # bisect için aralık başlangıçları
+
+    def add(self, start: int, count: int, store, offset: int = 0, table: str = None) -> AddressRange:
+        if count <= 0 or offset < 0 or offset + count > len(store):
+            raise ValueError(f"Geçersiz aralık: {start}+{count} (depo boyutu {len(store)}, ofset {offset})")
+        position = bisect_right(self.starts, start)
+        previous = self.ranges[position - 1] if position else None
+        following = self.ranges[position] if position < len(self.ranges) else None
+        if (previous and previous.start + previous.count > start) or (following and start + count > following.start):
+            raise ValueError(f"Aralık {start}-{start + count - 1} mevcut bir blokla çakışıyor")
+        address_range = AddressRange(start, count, store, offset, table or self.codec.unit)
+        self.ranges.insert(position, address_range)
+        self.starts.insert(position, start)
+        return address_range
+
+    def overlay(self, start: int, count: int, store, offset: int = 0, table: str = None) -> "AddressSpace":
+        """Aynı aralıklarla yeni alan; [start, start + count) store'a düşer, altında kalan aralıklar bölünür"""
+        space = AddressSpace(self.codec)
+        end = start + count
+        for address_range in self.ranges:
+            range_end = address_range.start + address_range.count
+            if range_end <= start or address_range.start >= end:
+                space.add(address_range.start, address_range.count, address_range.store,
+                          address_range.offset, address_range.table)
+                continue
+            if address_range.start < start:
+                space.add(address_range.start, start - address_range.start, address_range.store,
+                          address_range.offset, address_range.table)
+            if range_end > end:
+                space.add(end, range_end - end, address_range.store,
+                          address_range.offset + end - address_range.start, address_range.table)
+        space.add(start, count, store, offset, table)
+        return space
+
+    def segments(self, address: int, count: int) -> List[Tuple[int, AddressRange, int, int]]:
+        """İsteğin haritadaki parçaları: (istek içi ofset, aralık, depo indeksi, adet)"""
+        end = address + count
+        position = max(bisect_right(self.starts, address) - 1, 0)
+        segments = []
+        for address_range in self.ranges[position:]:
+            if address_range.start >= end:
+                break
+            first = max(address, address_range.start)
+            last = min(end, address_range.start + address_range.count)
+            if first < last:
+                segments.append((first - address, address_range,
+                                 address_range.offset + first - address_range.start, last - first))
+        return segments
+
+    def covers(self, address: int, count: int) -> bool:
+        """[address, address + count) tamamen haritada mı (yazma kontrolü)"""
+        return sum(segment[3] for segment in self.segments(address, count)) == count
+
+    def read(self, address: int, count: int) -> bytes:
+        segments = self.segments(address, count)
+        codec = self.codec
+        if len(segments) == 1 and segments[0][3] == count:  # Tek bloğa düşen istek (yaygın yol)
+            _, address_range, index, _ = segments[0]
+            return codec.read(address_range.store, index, count)
+        return codec.join([(position, size, codec.read(address_range.store, index, size))
+                           for position, address_range, index, size in segments], count)
+
+    def write(self, address: int, count: int, payload: bytes) -> List[Tuple[str, int, int]]:
+        """Yazar ve (tablo, depo indeksi, adet) listesini döndürür; kontrol (covers) çağırana aittir"""
+        written = []
+        for position, address_range, index, size in self.segments(address, count):
+            self.codec.write(address_range.store, index, size, self.codec.part(payload, position, size))
+            written.append((address_range.table, index, size))
+        return written
+
+def build_address_map(mapping) -> Dict[int, AddressSpace]:
+    """ModbusMapping tablolarından fonksiyon kodu -> adres alanı tablosu (adres = tablo indeksi)"""
+    coils = AddressSpace(BitCodec)
+    coils.add(0, len(mapping.tab_bits), mapping.tab_bits, table="bits")
+    discrete_inputs = AddressSpace(BitCodec)
+    discrete_inputs.add(0, len(mapping.tab_input_bits), mapping.tab_input_bits, table="input_bits")
+    register_codec = ArrayRegisterCodec if isinstance(mapping.tab_registers, np.ndarray) else RegisterCodec
+    holding_registers = AddressSpace(register_codec)
+    holding_registers.add(0, len(mapping.tab_registers), mapping.tab_registers, table="registers")
+    input_registers = AddressSpace(register_codec)
+    input_registers.add(0, len(mapping.tab_input_registers), mapping.tab_input_registers, table="input_registers")
+    return {
+        0x01: coils, 0x05: coils, 0x0F: coils,
+        0x02: discrete_inputs,
+        0x03: holding_registers, 0x06: holding_registers, 0x10: holding_registers, 0x17: holding_registers,
+        0x04: input_registers,
+    }
@@ -0,0 +1,190 @@
+"""
+Dengeleme (balancing) komut motoru
+Master'ın 40000+ aralığına (BMSBalancing, hücre başına 1 register) yazdığı bayraklar
+BMS kartı başına toplanır ve hız sınırlı döngülerle CAN dengeleme mesajlarına çevrilir.
+
+Mesaj düzeni eski CanBusWorker.create_balancing_message ile aynıdır (klasik CAN, 8 byte):
+  paketin 1. yarısı (0x97, BMS 1-3)  : [01, b0, b1, b2, 02, b0, b1, b2]  ve  [03, b0, b1, b2, 00, 00, 00, 00]
+  paketin 2. yarısı (0x98, BMS 4-6)  : aynı düzen, BMU numaraları yarı içinde 1-3
+  b0-b2: kart içi hücre bitleri (hücre 1 -> b0 bit0, hücre 9 -> b1 bit0, ...)
+
+Eski arayüz tek paketi 0x97 / 0x98 ile adresliyordu. Çok string'li sistemde ID'ler
+generate_can_ids düzenindedir (response_bit = 0): [string_id:4][bms_id:5][packet_bit:1],
+bms_id çerçevedeki ilk kartın global numarasıdır. legacy_ids=True eski sabit ID'leri kullanır.
+
+Yalnızca bitleri gerçekten değişen kartların çerçeveleri gönderilir; aynı döngüde gelen
+yüzlerce bayrak yazması paket başına en fazla 4 çerçeveye indirgenir.
+"""
+import threading
+import time
+from typing import Sequence, Tuple
+import numpy as np
+from bms_register_map import BMSBalancing
+from can_codec import cell_slot_layout
+
+BALANCING_FRAME_SIZE = 8
+LEGACY_BALANCING_IDS = (0x97, 0x98)  # Paketin 1. (BMS 1-3) ve 2. (BMS 4-6) yarısı
+
+# Paket başına 4 çerçeve: (ilk kart, ikinci kart veya -1), 0 tabanlı
+FRAME_BOARDS = np.array([[0, 1], [2, -1], [3, 4], [5, -1]])
+FRAME_TEMPLATE = np.array([[0x01, 0, 0, 0, 0x02, 0, 0, 0],
+                           [0x03, 0, 0, 0, 0x00, 0, 0, 0]] * 2, dtype=np.uint8)
+
+class BalancingEngine:
+    def __init__(self, transport=None, min_interval: float = 0.1, max_frames_per_cycle: int = 64,
+                 total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_bms: Sequence[int] = (18, 18, 18, 18, 18, 14), legacy_ids: bool = False):
+        self.transport = transport
+        self.min_interval = min_interval  # İki gönderim döngüsü arası en az süre (s)
+        self.max_frames_per_cycle = max_frames_per_cycle  # Döngü başına çerçeve üst sınırı (bus yükü)
+        self.packets_per_string = packets_per_string
+        self.cells_per_packet = sum(cells_per_bms)
+        self.flag_count = total_strings * packets_per_string * self.cells_per_packet
+        self.slot_index, self.slot_mask = cell_slot_layout(cells_per_bms)
+        boards = (total_strings, packets_per_string, len(cells_per_bms))
+        self.dirty = np.zeros(boards, dtype=bool)  # Yazma gelmiş, henüz işlenmemiş kartlar
+        self.forced = np.zeros(boards, dtype=bool)  # Değişmemiş olsa da gönderilecek kartlar
+        self.sent_bits = np.zeros(boards + (3,), dtype=np.uint8)  # Karta en son gönderilen hücre bitleri
+        self.can_ids = self._build_can_ids(total_strings, packets_per_string, legacy_ids)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.journal_ranges = None  # Bağlanırsa (attach_journal) bayrak yazmaları günlükten alınır
+        self.last_send = 0.0
+        self.frames_sent = 0
+        self.flag_writes = 0
+
+    def _build_can_ids(self, total_strings: int, packets_per_string: int, legacy_ids: bool) -> np.ndarray:
+        """(string, paket, çerçeve) -> CAN ID tablosu"""
+        if legacy_ids:
+            ids = np.array(LEGACY_BALANCING_IDS)[[0, 0, 1, 1]]
+            return np.broadcast_to(ids, (total_strings, packets_per_string, 4)).astype(np.uint32)
+        string_id = np.arange(1, total_strings + 1).reshape(-1, 1, 1)
+        packet_id = np.arange(1, packets_per_string + 1).reshape(1, -1, 1)
+        global_bms_id = (packet_id - 1) * len(self.slot_index) + FRAME_BOARDS[:, 0] + 1
+        can_ids = (string_id << 6) | (global_bms_id << 1) | ((packet_id - 1) % 2)
+        return can_ids.astype(np.uint32)
+
+    def attach_journal(self, journal):
+        """Slave'in yazma günlüğüne 'balancing' tüketicisi olarak bağlan (notify çağrısı gerekmez)"""
+        self.journal_ranges = journal.consumer("balancing", ("registers",), self.wakeup)
+
+    def collect(self):
+        """Günlükte son take'ten beri değişen register aralıklarını kirli kartlara çevir"""
+        if self.journal_ranges is not None:
+            for address, count in self.journal_ranges.take("registers"):
+                self._mark_dirty(address, count)
+
+    def notify(self, address: int, count: int = 1):
+        """Register yazması sonrası çağrılır (günlüksüz kullanım); aralık dışındaki adresler yok sayılır"""
+        if self._mark_dirty(address, count):
+            self.wakeup.set()
+
+    def _mark_dirty(self, address: int, count: int) -> bool:
+        first = max(address, BMSBalancing.STATUS_BASE) - BMSBalancing.STATUS_BASE
+        last = min(address + count, BMSBalancing.STATUS_BASE + self.flag_count) - BMSBalancing.STATUS_BASE
+        if first >= last:
+            return False
+        cells = np.arange(first, last)
+        packets, cell_in_packet = np.divmod(cells, self.cells_per_packet)
+        string_index, packet_index = np.divmod(packets, self.packets_per_string)
+        board = np.searchsorted(self.slot_index[:, 0], cell_in_packet, side="right") - 1
+        with self.lock:
+            self.dirty[string_index, packet_index, board] = True
+            self.flag_writes += last - first
+        return True
+
+    def board_bits(self, flags: np.ndarray) -> np.ndarray:
+        """(string, paket, hücre) bool -> (string, paket, kart, 3) hücre bit byte'ları"""
+        slots = flags[..., self.slot_index] & self.slot_mask
+        slots = np.concatenate([slots, np.zeros(slots.shape[:-1] + (24 - slots.shape[-1],), dtype=bool)], axis=-1)
+        return np.packbits(slots, axis=-1, bitorder="little")
+
+    def build_frames(self, bits: np.ndarray, string_index: np.ndarray, packet_index: np.ndarray,
+                     frame_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Seçilen (string, paket, çerçeve) üçlüleri için (can_ids, (N, 8) çerçeveler)"""
+        frames = FRAME_TEMPLATE[frame_index].copy()
+        first, second = FRAME_BOARDS[frame_index, 0], FRAME_BOARDS[frame_index, 1]
+        frames[:, 1:4] = bits[string_index, packet_index, first]
+        paired = second >= 0
+        frames[paired, 5:8] = bits[string_index[paired], packet_index[paired], second[paired]]
+        return self.can_ids[string_index, packet_index, frame_index], frames
+
+    def flush(self, tab_registers) -> int:
+        """Bekleyen kartların çerçevelerini gönder (hız sınırı uygulanmaz); gönderilen çerçeve sayısı"""
+        self.collect()
+        with self.lock:
+            if not self.dirty.any():
+                return 0
+            base = BMSBalancing.STATUS_BASE
+            flags = np.array(tab_registers[base:base + self.flag_count]) != 0
+            bits = self.board_bits(flags.reshape(self.dirty.shape[:2] + (self.cells_per_packet,)))
+            changed = self.dirty & ((bits != self.sent_bits).any(axis=-1) | self.forced)
+            # Değeri değişmeyen yazmalar için çerçeve gerekmez
+            self.dirty &= changed
+
+            frame_changed = changed[..., FRAME_BOARDS[:, 0]] | (changed[..., FRAME_BOARDS[:, 1]] &
+                                                                (FRAME_BOARDS[:, 1] >= 0))
+            string_index, packet_index, frame_index = np.nonzero(frame_changed)
+            string_index, packet_index, frame_index = (a[:self.max_frames_per_cycle] for a in
+                                                       (string_index, packet_index, frame_index))
+            if len(frame_index) == 0:
+                return 0
+            can_ids, frames = self.build_frames(bits, string_index, packet_index, frame_index)
+
+            for column in (0, 1):
+                boards = FRAME_BOARDS[frame_index, column]
+                valid = boards >= 0
+                sent = (string_index[valid], packet_index[valid], boards[valid])
+                self.sent_bits[sent] = bits[sent]
+                self.dirty[sent] = False
+                self.forced[sent] = False
+            remaining = self.dirty.any()
+
+        if self.transport is not None:
+            self.transport.send_batch(can_ids, frames, BALANCING_FRAME_SIZE)
+        self.frames_sent += len(can_ids)
+        self.last_send = time.monotonic()
+        if remaining:
+            self.wakeup.set()  # Üst sınıra takılan kartlar bir sonraki döngüde
+        return len(can_ids)
+
+    def stop_all(self, tab_registers):
+        """Tüm bayrakları sıfırla ve her karta durdurma çerçevesi gönder (eski stop_balancing gibi)"""
+        base = BMSBalancing.STATUS_BASE
+        tab_registers[base:base + self.flag_count] = [0] * self.flag_count
+        with self.lock:
+            self.dirty[:] = True
+            self.forced[:] = True
+        self.wakeup.set()
+
+    def start(self, tab_registers, journal=None):
+        """Yazma bildirimlerini (notify veya günlük) bekleyip en fazla min_interval'da bir gönderim yapan thread"""
+        if journal is not None:
+            self.attach_journal(journal)
+        self.stop_event.clear()
+
+        def engine_loop():
+            while not self.stop_event.is_set():
+                if not self.wakeup.wait(0.5):
+                    continue
+                # Aynı aralıkta gelen yazmalar tek döngüde birleşir
+                delay = self.last_send + self.min_interval - time.monotonic()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                self.wakeup.clear()
+                try:
+                    self.flush(tab_registers)
+                except Exception as e:
+                    print(f"❌ Dengeleme mesajı gönderme hatası: {e}")
+
+        self.thread = threading.Thread(target=engine_loop, name="balancing", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
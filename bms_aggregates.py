@@ -0,0 +1,99 @@
+"""
+Paket ve string özetleri (min / max / ortalama hücre voltajı, fark, max sıcaklık, en yüksek / en düşük hücre)
+Ingest sırasında yalnızca güncellenen paketler yeniden hesaplanır, string özetleri paket özetlerinden türetilir.
+Register yerleşimi: BMSSummaries / SummaryField (bms_register_map)
+"""
+import warnings
+import numpy as np
+from bms_register_map import BMSSummaries, SummaryField
+from can_codec import floats_to_registers
+
+FLOAT_FIELDS = (SummaryField.MIN_CELL_VOLTAGE, SummaryField.MAX_CELL_VOLTAGE, SummaryField.AVG_CELL_VOLTAGE,
+                SummaryField.CELL_SPREAD, SummaryField.MAX_TEMPERATURE)
+
+class PackAggregates:
+    def __init__(self, total_strings: int = 12, packets_per_string: int = 4, cells_per_packet: int = 104):
+        self.cells_per_packet = cells_per_packet
+        shape = (total_strings, packets_per_string)
+        self.min_voltage = np.full(shape, np.nan)
+        self.max_voltage = np.full(shape, np.nan)
+        self.voltage_sum = np.zeros(shape)
+        self.cell_count = np.zeros(shape, dtype=np.intp)
+        self.max_temperature = np.full(shape, np.nan)
+        self.max_cell = np.zeros(shape, dtype=np.intp)  # 1 tabanlı, 0 = veri yok
+        self.min_cell = np.zeros(shape, dtype=np.intp)
+        self.string_max_cell = np.zeros(total_strings, dtype=np.intp)  # String içi hücre no (1 tabanlı)
+        self.string_min_cell = np.zeros(total_strings, dtype=np.intp)
+
+    def update(self, cell_voltages: np.ndarray, cells_received: np.ndarray,
+               temperatures: np.ndarray, temps_received: np.ndarray,
+               string_index: np.ndarray, packet_index: np.ndarray):
+        """Yalnızca verilen (0 tabanlı) string / paketleri yeniden hesapla"""
+        if len(string_index) == 0:
+            return
+        packets = np.unique(np.asarray(string_index) * cell_voltages.shape[1] + np.asarray(packet_index))
+        s, p = np.divmod(packets, cell_voltages.shape[1])
+
+        received = cells_received[s, p]
+        voltages = cell_voltages[s, p]
+        has_cells = received.any(axis=1)
+        high = np.where(received, voltages, -np.inf)
+        low = np.where(received, voltages, np.inf)
+        max_cell = high.argmax(axis=1)
+        min_cell = low.argmin(axis=1)
+        rows = np.arange(len(packets))
+
+        self.max_voltage[s, p] = np.where(has_cells, high[rows, max_cell], np.nan)
+        self.min_voltage[s, p] = np.where(has_cells, low[rows, min_cell], np.nan)
+        self.voltage_sum[s, p] = np.where(received, voltages, 0.0).sum(axis=1)
+        self.cell_count[s, p] = received.sum(axis=1)
+        self.max_cell[s, p] = np.where(has_cells, max_cell + 1, 0)
+        self.min_cell[s, p] = np.where(has_cells, min_cell + 1, 0)
+
+        temps = np.where(temps_received[s, p], temperatures[s, p], -np.inf).max(axis=1)
+        self.max_temperature[s, p] = np.where(np.isfinite(temps), temps, np.nan)
+
+        # Etkilenen string'ler paket özetlerinden (string başına 4 paket) türetilir
+        strings = np.unique(s)
+        best = np.nan_to_num(self.max_voltage[strings], nan=-np.inf).argmax(axis=1)
+        worst = np.nan_to_num(self.min_voltage[strings], nan=np.inf).argmin(axis=1)
+        best_cell = self.max_cell[strings, best]
+        worst_cell = self.min_cell[strings, worst]
+        self.string_max_cell[strings] = np.where(best_cell > 0, best * self.cells_per_packet + best_cell, 0)
+        self.string_min_cell[strings] = np.where(worst_cell > 0, worst * self.cells_per_packet + worst_cell, 0)
+
+    def _summary_block(self, min_voltage, max_voltage, voltage_sum, cell_count, max_temperature,
+                       max_cell, min_cell) -> np.ndarray:
+        count = len(min_voltage)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = np.where(cell_count > 0, voltage_sum / np.maximum(cell_count, 1), np.nan)
+        floats = np.stack([min_voltage, max_voltage, average, (max_voltage - min_voltage) * 1000.0,
+                           max_temperature], axis=1)
+        # Veri yoksa NaN yerine 0 yayınlanır (kalite bloğu NO_DATA gösterir)
+        floats = np.nan_to_num(floats, nan=0.0)
+        block = np.zeros((count, SummaryField.SIZE), dtype=np.uint16)
+        registers = floats_to_registers(floats.reshape(-1)).reshape(count, len(FLOAT_FIELDS), 2)
+        for i, field in enumerate(FLOAT_FIELDS):
+            block[:, field:field + 2] = registers[:, i]
+        block[:, SummaryField.MAX_CELL] = max_cell
+        block[:, SummaryField.MIN_CELL] = min_cell
+        return block.reshape(-1)
+
+    def packet_block(self) -> np.ndarray:
+        return self._summary_block(self.min_voltage.reshape(-1), self.max_voltage.reshape(-1),
+                                   self.voltage_sum.reshape(-1), self.cell_count.reshape(-1),
+                                   self.max_temperature.reshape(-1), self.max_cell.reshape(-1),
+                                   self.min_cell.reshape(-1))
+
+    def string_block(self) -> np.ndarray:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return self._summary_block(np.nanmin(self.min_voltage, axis=1), np.nanmax(self.max_voltage, axis=1),
+                                       self.voltage_sum.sum(axis=1), self.cell_count.sum(axis=1),
+                                       np.nanmax(self.max_temperature, axis=1),
+                                       self.string_max_cell, self.string_min_cell)
+
+    def write_registers(self, tab_registers):
+        for base, block in ((BMSSummaries.PACKET_SUMMARY_BASE, self.packet_block()),
+                            (BMSSummaries.STRING_SUMMARY_BASE, self.string_block())):
+            tab_registers[base:base + len(block)] = block.tolist()
@@ -1,12 +1,15 @@
 import time
 import random
-from modbus import ModbusMaster
-from bms_register_map import BMSAddressCalculator, BMSRegisters, BMSDataConverter, BMSCoils
+from bms_client import BMSMaster
+from read_cache import ReadCache
+from bms_register_map import BMSAddressCalculator, BMSRegisters, BMSDataConverter, BMSCoils, BMSPointGroups, DataQuality
 
 class NuvelBMSMaster:
     
-    def __init__(self, host="127.0.0.1", port=1024):
-        self.master = ModbusMaster()
+    def __init__(self, host="127.0.0.1", port=1024, unit_id=1, cache_ttl=None):
+        # cache_ttl (s) verilirse tekrar eden okumalar TTL boyunca önbellekten döner
+        self.cache = ReadCache(default_ttl=cache_ttl) if cache_ttl else None
+        self.master = BMSMaster(unit_id, cache=self.cache)
         self.host = host
         self.port = port
         
@@ -65,12 +68,20 @@ class NuvelBMSMaster:
             power = total_voltage * abs(current) / 1000
             print(f"⚡ Anlık Güç: {power:.1f}kW")
             
+            quality = None
+            error, groups = self.master.read_point_quality(BMSPointGroups.MAIN, 1)
+            if error.value == 0 and groups:
+                quality, age, _ = groups[0]
+                if quality != DataQuality.GOOD:
+                    print(f"⚠️ Veri kalitesi: {quality.name} (yaş {age}s)")
+            
             return {
                 'soc': soc,
                 'soh': soh,
                 'voltage': total_voltage,
                 'temperature': temp,
-                'current': current
+                'current': current,
+                'quality': quality
             }
             
         except Exception as e:
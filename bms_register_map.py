@@ -68,11 +68,47 @@ class BMSAddressCalculator:
         if not (1 <= cell_no <= 104):
             raise ValueError("Cell no 1-104 arası olmalı")
         
-        base_address = 40000  # Balancing status base
+        base_address = BALANCING_STATUS_BASE
         # Balancing durumu bit tabanlı, hala tek register
         offset = (string_no - 1) * 4 * 104 + (packet_no - 1) * 104 + (cell_no - 1)
         return base_address + offset
     
+    @staticmethod
+    def get_cell_group(string_no: int, packet_no: int) -> int:
+        if not (1 <= string_no <= 12):
+            raise ValueError("String no 1-12 arası olmalı")
+        if not (1 <= packet_no <= 4):
+            raise ValueError("Packet no 1-4 arası olmalı")
+        return BMSPointGroups.CELLS_BASE + (string_no - 1) * 4 + (packet_no - 1)
+    
+    @staticmethod
+    def get_temp_group(string_no: int, packet_no: int) -> int:
+        if not (1 <= string_no <= 12):
+            raise ValueError("String no 1-12 arası olmalı")
+        if not (1 <= packet_no <= 4):
+            raise ValueError("Packet no 1-4 arası olmalı")
+        return BMSPointGroups.TEMPS_BASE + (string_no - 1) * 4 + (packet_no - 1)
+    
+    @staticmethod
+    def get_packet_summary_address(string_no: int, packet_no: int) -> int:
+        if not (1 <= string_no <= 12):
+            raise ValueError("String no 1-12 arası olmalı")
+        if not (1 <= packet_no <= 4):
+            raise ValueError("Packet no 1-4 arası olmalı")
+        return BMSSummaries.PACKET_SUMMARY_BASE + ((string_no - 1) * 4 + (packet_no - 1)) * SummaryField.SIZE
+    
+    @staticmethod
+    def get_string_summary_address(string_no: int) -> int:
+        if not (1 <= string_no <= 12):
+            raise ValueError("String no 1-12 arası olmalı")
+        return BMSSummaries.STRING_SUMMARY_BASE + (string_no - 1) * SummaryField.SIZE
+    
+    @staticmethod
+    def get_quality_address(group: int) -> int:
+        if not (0 <= group < BMSPointGroups.COUNT):
+            raise ValueError(f"Grup no 0-{BMSPointGroups.COUNT - 1} arası olmalı")
+        return BMSDiagnostics.QUALITY_BASE + group * 4
+    
     @staticmethod
     def parse_cell_address(address: int) -> tuple:
         if address < BMSRegisters.CELL_VOLTAGE_BASE:
@@ -98,7 +134,9 @@ class BMSAddressCalculator:
         return string_no, packet_no, bms_no, sensor_no
 
 class BMSInputs(IntEnum):
-    pass
+    # Discrete input'lar (FC02) coil'ler gibi ham adreslidir: adres = tab_input_bits indeksi
+    ALARM_BASE = 20000            # Alarm bitleri (20000-20015)
+    ALARM_COUNT = 16
 
 class BMSCoils(IntEnum):
     # 32-bit float çiftleri
@@ -112,6 +150,76 @@ class BMSCoils(IntEnum):
     PACK_VOLT_HIGH = 30007
     PACK_VOLT_LOW = 30008   
 
+class BMSDiagnostics(IntEnum):
+    # Slave sağlık / performans blokları (salt okunur, slave tarafından yazılır)
+    DIAG_BASE = 30100
+    REQUESTS_PER_SEC = 30100          # İstek/s, 32-bit float (30100-30101)
+    REQUESTS_PER_SEC_HIGH = 30100
+    REQUESTS_PER_SEC_LOW = 30101
+    INGEST_AGE = 30102                # Son CAN/JSON güncellemesinden beri geçen süre (s), float (30102-30103)
+    INGEST_AGE_HIGH = 30102
+    INGEST_AGE_LOW = 30103
+    INGEST_DURATION = 30104           # Son ingest süresi (ms), float (30104-30105)
+    INGEST_DURATION_HIGH = 30104
+    INGEST_DURATION_LOW = 30105
+    CONNECTED_CLIENTS = 30106         # Bağlı master sayısı, 16-bit
+    DROPPED_FRAMES = 30107            # Atılan CAN çerçeveleri, 32-bit tam sayı (30107-30108)
+    DROPPED_FRAMES_HIGH = 30107
+    DROPPED_FRAMES_LOW = 30108
+    TOTAL_REQUESTS = 30109            # Toplam istek, 32-bit tam sayı (30109-30110)
+    TOTAL_REQUESTS_HIGH = 30109
+    TOTAL_REQUESTS_LOW = 30110
+    UPTIME = 30111                    # Çalışma süresi (s), 32-bit tam sayı (30111-30112)
+    UPTIME_HIGH = 30111
+    UPTIME_LOW = 30112
+    QUALITY_BASE = 30200              # Nokta grubu başına 4 register: kalite, yaş (s), zaman damgası (u32 unix s)
+
+class BMSSummaries(IntEnum):
+    # Ingest sırasında güncellenen paket / string özetleri (salt okunur)
+    PACKET_SUMMARY_BASE = 31000       # 48 paket x 12 register (31000-31575), string-1/paket-1'den başlayarak
+    STRING_SUMMARY_BASE = 31600       # 12 string x 12 register (31600-31743)
+
+class SummaryField(IntEnum):
+    # Özet bloğu içindeki ofsetler
+    MIN_CELL_VOLTAGE = 0              # V, 32-bit float
+    MAX_CELL_VOLTAGE = 2              # V, 32-bit float
+    AVG_CELL_VOLTAGE = 4              # V, 32-bit float
+    CELL_SPREAD = 6                   # max - min (mV), 32-bit float
+    MAX_TEMPERATURE = 8               # °C, 32-bit float
+    MAX_CELL = 10                     # En yüksek hücre no (paket içi 1-104 / string içi 1-416), 0 = veri yok
+    MIN_CELL = 11                     # En düşük hücre no
+    SIZE = 12
+
+class BMSChangeFeed(IntEnum):
+    # "Şu sıradan beri değişenler" bloğu; FC 0x17 ile tek istekte imleç yazılıp blok okunur
+    CURSOR = 32000                    # Master'ın son aldığı sıra no, u32 (32000-32001), yalnızca FC 0x17 ile
+    CURSOR_HIGH = 32000
+    CURSOR_LOW = 32001
+    EPOCH = 32002                     # İmlecin alındığı slave açılış dönemi (0 = bilinmiyor), imleçle birlikte yazılır
+    BLOCK_BASE = 32010                # Başlık: sonraki imleç u32, kayıt sayısı, bayraklar, dönem; sonra kayıtlar
+    HEADER_SIZE = 5
+    ENTRY_SIZE = 3                    # Nokta no (0-4991 hücre, 4992-7007 sıcaklık) + değer (32-bit float)
+
+class BMSBalancing(IntEnum):
+    # Master tarafından yazılır; değişiklikler BalancingEngine ile CAN dengeleme mesajlarına çevrilir
+    STATUS_BASE = 40000               # Hücre başına 1 register (0 = kapalı, 0 dışı = dengele), 40000-44991
+    STATUS_COUNT = 4992               # 12 string x 4 paket x 104 hücre
+
+# Sıcak yoldaki adres hesapları için düz int (IntEnum üye erişimi ve toplaması daha yavaş)
+BALANCING_STATUS_BASE = int(BMSBalancing.STATUS_BASE)
+
+class DataQuality(IntEnum):
+    NO_DATA = 0                       # Hiç güncellenmedi (yazılmamış / sıfır bank da bu değeri okur)
+    GOOD = 1                          # Son güncelleme stale eşiğinden yeni
+    STALE = 2                         # Veri var ama eşikten eski
+    SIMULATED = 3                     # Geliştirme modunda üretilmiş sahte veri
+
+class BMSPointGroups(IntEnum):
+    MAIN = 0                          # Ana veriler (1000-1015) ve 30003-30008 blokları
+    CELLS_BASE = 1                    # String/paket başına hücre voltajları (48 grup)
+    TEMPS_BASE = 49                   # String/paket başına sıcaklıklar (48 grup)
+    COUNT = 97
+
 class BMSDataConverter:
     @staticmethod
     def float_to_registers(value: float) -> tuple:
@@ -133,6 +241,16 @@ class BMSDataConverter:
         # Bytes'ı float'a çevir
         return struct.unpack('>f', bytes_data)[0]
     
+    @staticmethod
+    def u32_to_registers(value: int) -> tuple:
+        """32-bit işaretsiz tam sayıyı 2 register'a çevir (taşmada sarar)"""
+        value = int(value) & 0xFFFFFFFF
+        return value >> 16, value & 0xFFFF
+    
+    @staticmethod
+    def registers_to_u32(high_reg: int, low_reg: int) -> int:
+        return (high_reg << 16) | low_reg
+    
     @staticmethod
     def voltage_to_raw(voltage_v: float) -> int:
         return int(voltage_v * 10)
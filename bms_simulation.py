@@ -0,0 +1,82 @@
+"""
+NumPy tabanlı BMS simülasyon durumu
+Hücre voltajları, sıcaklıklar ve paket parametreleri (string × paket × hücre)
+matrislerinde tutulur; rastgele yürüyüş, sınırlama ve paket toplamları tek
+vektörel adımda hesaplanır. CANMessageSimulator bu sınıfı kullanır.
+"""
+import numpy as np
+from typing import Optional, Sequence
+
+class BMSSimulationState:
+    def __init__(self, total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_bms: Sequence[int] = (18, 18, 18, 18, 18, 14),
+                 temps_per_bms: int = 7, seed: Optional[int] = None):
+        self.total_strings = total_strings
+        self.packets_per_string = packets_per_string
+        self.cells_per_bms = tuple(cells_per_bms)
+        self.bms_per_packet = len(self.cells_per_bms)
+        self.temps_per_bms = temps_per_bms
+        self.cells_per_packet = sum(self.cells_per_bms)  # 104
+        self.temps_per_packet = self.bms_per_packet * temps_per_bms  # 42
+        self.rng = np.random.default_rng(seed)
+
+        shape = (total_strings, packets_per_string)
+        self.cell_voltages = np.empty(shape + (self.cells_per_packet,))   # V
+        self.temperatures = np.empty(shape + (self.temps_per_packet,))    # °C
+        self.soc = np.empty(shape)       # %
+        self.soh = np.empty(shape)       # %
+        self.currents = np.empty(shape)  # A
+        self.pack_voltages = np.empty(shape)  # V
+
+        self.initialize()
+
+    @property
+    def total_cells(self) -> int:
+        return self.cell_voltages.size
+
+    @property
+    def total_temps(self) -> int:
+        return self.temperatures.size
+
+    def initialize(self):
+        """Başlangıç sahte verilerini oluştur"""
+        uniform = self.rng.uniform
+        self.soc[...] = uniform(80.0, 95.0, self.soc.shape)
+        self.soh[...] = uniform(95.0, 99.5, self.soh.shape)
+        self.currents[...] = uniform(-100.0, 50.0, self.currents.shape)
+        self.cell_voltages[...] = uniform(3.65, 3.75, self.cell_voltages.shape)
+        self.temperatures[...] = uniform(20.0, 35.0, self.temperatures.shape)
+        self.cell_voltages.sum(axis=2, out=self.pack_voltages)
+
+    def step(self):
+        """Tek simülasyon adımı (gerçekçi değişimler), tüm tesis için vektörel"""
+        uniform = self.rng.uniform
+
+        # SOC azalması (şarj tükenmesi simülasyonu)
+        self.soc -= uniform(0.1, 0.3, self.soc.shape)
+        np.maximum(self.soc, 10.0, out=self.soc)
+
+        # SOH çok yavaş azalması
+        self.soh -= uniform(0.001, 0.01, self.soh.shape)
+        np.maximum(self.soh, 90.0, out=self.soh)
+
+        # Akım değişimi
+        self.currents += uniform(-5.0, 5.0, self.currents.shape)
+        np.clip(self.currents, -200.0, 100.0, out=self.currents)
+
+        # Hücre voltajları (küçük değişimler) ve paket toplamları
+        self.cell_voltages += uniform(-0.01, 0.01, self.cell_voltages.shape)
+        np.clip(self.cell_voltages, 3.0, 4.2, out=self.cell_voltages)
+        self.cell_voltages.sum(axis=2, out=self.pack_voltages)
+
+        # Sıcaklık değişimleri
+        self.temperatures += uniform(-1.0, 2.0, self.temperatures.shape)
+        np.clip(self.temperatures, 0.0, 80.0, out=self.temperatures)
+
+    def cell_voltage(self, string_id: int, packet_id: int, cell_id: int) -> float:
+        """1 tabanlı (string, paket, hücre) ile hücre voltajı"""
+        return float(self.cell_voltages[string_id - 1, packet_id - 1, cell_id - 1])
+
+    def temperature(self, string_id: int, packet_id: int, temp_id: int) -> float:
+        """1 tabanlı (string, paket, sensör) ile sıcaklık"""
+        return float(self.temperatures[string_id - 1, packet_id - 1, temp_id - 1])
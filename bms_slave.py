@@ -5,40 +5,117 @@ import random
 import json
 import os
 import traceback
+import threading
+import selectors
+import numpy as np
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional
 from bms_register_map import (
-    BMSRegisters, BMSInputs, BMSCoils,
+    BMSRegisters, BMSInputs, BMSCoils, BMSDiagnostics, BMSPointGroups,
     BMS_INITIAL_VALUES, BMS_INPUT_VALUES, BMS_COIL_VALUES,
     BMSDataConverter, BMSAddressCalculator
 )
+from can_codec import CANFrameDecoder
+from modbus_core import split_frames, PackedBits, MAX_READ_BITS, MAX_READ_REGISTERS
+from slave_metrics import SlaveMetrics
+from data_quality import PointQualityStore, REGISTERS_PER_GROUP
+from bms_aggregates import PackAggregates
+from cell_extrema import CellExtremaTree
+from register_journal import TABLES, WriteJournal
+from change_feed import ChangeFeed, change_feed_space
+from address_map import AddressSpace, build_address_map
+
+# Diagnostik + kalite register'ları (30100-30587); periyodik yazılır, kendi nesliyle önbelleğe alınır
+DIAGNOSTICS_FIRST = int(BMSDiagnostics.DIAG_BASE)
+DIAGNOSTICS_END = int(BMSDiagnostics.QUALITY_BASE) + BMSPointGroups.COUNT * REGISTERS_PER_GROUP
 
 @dataclass
 class ModbusMapping:
-    tab_bits: List[bool]
-    tab_input_bits: List[bool] 
+    tab_bits: PackedBits  # Coil'ler, bit-paketli (LSB ilk)
+    tab_input_bits: PackedBits
     tab_registers: List[int]
     tab_input_registers: List[int]
+    generation: int = 0  # Her veri güncellemesinde artar (yanıt önbelleği geçersizleştirme)
+    journal: Optional[WriteJournal] = None  # Master yazmalarının günlüğü ve tüketici başına kirli aralıklar
+    spaces: Optional[Dict[int, AddressSpace]] = None  # Fonksiyon kodu -> adres alanı (address_map)
+    shared_generation: Optional[np.ndarray] = None  # Arena bankasıysa dış yazıcıların nesli (UnitArena.touch)
+    diagnostics_generation: int = 0  # Yalnızca diagnostik / kalite bloğu (DIAGNOSTICS_FIRST-DIAGNOSTICS_END) yazılınca artar
 
 class MegaBMSSlave:
-    def __init__(self, host: str = "0.0.0.0", port: int = 1024):
+    def __init__(self, host: str = "0.0.0.0", port: int = 1024, production: bool = False):
         self.host = host
         self.port = port
         self.socket = None
-        self.mapping = None
+        self.mapping = None  # Yerel veri kaynağının (CAN / JSON / simülasyon) bankası
+        self.units = {}  # unit ID -> ModbusMapping; boşsa her unit ID self.mapping'e düşer
         self.last_update = time.time()
         self.data_file = "bms_data.json"  # CAN simulator'dan gelen veri dosyası
+        self.json_points_mtime = None  # Hücre / sıcaklıkları en son ayrıştırılan bms_data.json'un zamanı
         self.use_fake_data = False  # Başlangıçta gerçek veriler kullanılır
+        self.data_timestamp = 0.0  # Son okunan bms_data.json'un değişiklik zamanı
+        self.production = production  # True ise hiçbir register'a sahte/rastgele değer yazılmaz
+        self.quality = PointQualityStore()  # Nokta grubu başına zaman damgası / kalite
+        self.historian = None  # Ayarlanırsa (RingHistorian) her CAN ingest'i zaman serisine eklenir
+        self.archiver = None  # Ayarlanırsa (HistorianArchiver) dolan historian pencereleri diske yazılır
+        self.rollups = None  # Ayarlanırsa (RollupPipeline) 1 dk / 1 saat min-max-ortalama kovaları güncellenir
+        self.aggregates = PackAggregates()  # Paket / string özetleri (BMSSummaries register blokları)
+        self.cell_extrema = CellExtremaTree()  # Paket başına min / max hücre ağaçları (dengeleme kararları)
+        self.change_feed = ChangeFeed()  # Deadband'i aşan noktaların sıra numaralı akışı (FC 0x17 ile okunur)
+        self.file_cells = np.zeros((12, 4, 104))  # JSON yolunun (bms_data.json / CAN dosyası) son hücre voltajları
+        self.file_cells_received = np.zeros(self.file_cells.shape, dtype=bool)
+        self.file_temps = np.zeros((12, 4, 42))  # Paket içi sıra CAN düzeninde (BMS başına 7 sensör)
+        self.file_temps_received = np.zeros(self.file_temps.shape, dtype=bool)
+        self.balancing = None  # Ayarlanırsa (BalancingEngine) 40000+ bayrak yazmaları CAN dengeleme mesajına çevrilir
+        self.can_decoder = None  # CAN FD çerçevelerinden doğrudan ingest (ilk kullanımda oluşturulur)
+        self.ingest_deadbands = (0.0, 0.0, 0.0)  # Hücre V, sıcaklık °C, akım A (CANFrameDecoder.set_deadbands)
+        self.can_transport = None  # Ayarlanırsa veri kaynağı CAN bus'tır (bms_data.json okunmaz)
+        self.can_thread = None
+        self.verbose = True  # İstek başına [MODBUS]/[DEBUG] logları
+        self.refresh_on_request = True  # Her istekte simulate_mega_bms_data() (JSON) çağrılır
+        self.clients = set()  # serve() ile bağlı master soketleri
+        self.response_cache = {}  # (unit, FC, adres, adet) -> (nesil, PDU)
+        self.response_cache_size = 1024
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.metrics = SlaveMetrics()  # FC / master başına sayaçlar ve gecikme histogramları
+        self.client_names = {}  # soket -> "ip:port" (metrik etiketi)
+        self.started = time.time()
+        self.last_ingest_duration = 0.0  # Son CAN/JSON ingest süresi (s)
+        self.rejected_frames = 0  # Çözücünün kabul etmediği CAN çerçeveleri
+        self.diagnostics_thread = None
+        self.diagnostics_stop = threading.Event()
         
     def mapping_new(self, nb_bits: int, nb_input_bits: int, 
-                   nb_registers: int, nb_input_registers: int) -> ModbusMapping:
+                   nb_registers: int, nb_input_registers: int,
+                   arena=None, unit_id: int = None) -> ModbusMapping:
+        """arena (UnitArena) verilirse tablolar arenadaki unit_id dilimine görünümdür"""
+        if arena is not None:
+            tab_bits, tab_input_bits, tab_registers, tab_input_registers = arena.tables(unit_id)
+        else:
+            tab_bits, tab_input_bits = PackedBits(nb_bits), PackedBits(nb_input_bits)
+            tab_registers, tab_input_registers = [0] * nb_registers, [0] * nb_input_registers
 
-        return ModbusMapping(
-            tab_bits=[False] * nb_bits,
-            tab_input_bits=[False] * nb_input_bits,
-            tab_registers=[0] * nb_registers,
-            tab_input_registers=[0] * nb_input_registers
+        mapping = ModbusMapping(
+            tab_bits=tab_bits,
+            tab_input_bits=tab_input_bits,
+            tab_registers=tab_registers,
+            tab_input_registers=tab_input_registers,
+            journal=WriteJournal({"bits": nb_bits, "input_bits": nb_input_bits,
+                                  "registers": nb_registers, "input_registers": nb_input_registers}),
+            shared_generation=arena.generation_view(unit_id) if arena is not None else None
         )
+        mapping.spaces = build_address_map(mapping)
+        return mapping
+    
+    def attach_change_feed(self):
+        """Yerel bankanın FC 0x17 alanında imleç / blok aralıklarını değişiklik akışına bağla"""
+        self.mapping.spaces[0x17] = change_feed_space(self.mapping.spaces[0x17], self.change_feed)
+        self.response_cache.clear()
+    
+    def add_unit(self, unit_id: int, mapping: ModbusMapping):
+        """unit_id'ye gelen istekleri mapping'e yönlendir (ilk add_unit'ten sonra bilinmeyen unit'ler reddedilir)"""
+        self.units[unit_id] = mapping
+        self.response_cache.clear()
         
     def initialize_mega_bms_data(self):
         # 32-bit float register'ları başlat
@@ -46,6 +123,12 @@ class MegaBMSSlave:
             if register < len(self.mapping.tab_registers):
                 self.mapping.tab_registers[register] = value
                 
+        if self.production:
+            # Üretim modunda hücre/sensör register'ları ilk gerçek veriye kadar 0 kalır (kalite: NO_DATA)
+            self.mapping.generation += 1
+            print("✅ Mega BMS başlatma tamamlandı (üretim modu, veri bekleniyor)")
+            return
+        
         print("🔋 4,992 hücre voltajı başlatılıyor (32-bit float format)...")
         base_voltage = 3.73  # 3.73V
         for string_no in range(1, 13): 
@@ -80,9 +163,8 @@ class MegaBMSSlave:
                             print(f"Sensör {string_no}-{packet_no}-{bms_no}-{sensor_no} başlatma hatası: {e}")
                 
         for input_addr, value in BMS_INPUT_VALUES.items():
-            offset = input_addr - 20000
-            if 0 <= offset < len(self.mapping.tab_input_bits):
-                self.mapping.tab_input_bits[offset] = value
+            if input_addr < len(self.mapping.tab_input_bits):
+                self.mapping.tab_input_bits[input_addr] = value
                 
         for coil_addr, value in BMS_COIL_VALUES.items():
             if coil_addr < len(self.mapping.tab_registers):
@@ -94,6 +176,8 @@ class MegaBMSSlave:
             if i < len(self.mapping.tab_bits):
                 self.mapping.tab_bits[i] = (i % 2 == 0)  # Çift numaralı coil'ler aktif
                 
+        self.quality.mark(slice(None), simulated=True)
+        self.mapping.generation += 1
         print("✅ Mega BMS başlatma tamamlandı (32-bit float format)!")
     
     def load_can_data(self):
@@ -117,6 +201,7 @@ class MegaBMSSlave:
                 return None
                 
             self.use_fake_data = False
+            self.data_timestamp = file_time
             return data
             
         except Exception as e:
@@ -199,6 +284,9 @@ class MegaBMSSlave:
                 self.mapping.tab_registers[BMSCoils.PACK_VOLT_LOW] = low_reg
             
             # Hücre voltajlarını güncelle (varsa)
+            cell_packets, temp_packets = set(), set()
+            cells_mask = np.zeros(self.file_cells.shape, dtype=bool)
+            temps_mask = np.zeros(self.file_temps.shape, dtype=bool)
             cell_voltages = can_data.get('cell_voltages', {})
             for cell_name, voltage in cell_voltages.items():
                 try:
@@ -214,6 +302,9 @@ class MegaBMSSlave:
                             high_reg, low_reg = BMSDataConverter.float_to_registers(float(voltage))
                             self.mapping.tab_registers[address] = high_reg
                             self.mapping.tab_registers[address + 1] = low_reg
+                            cell_packets.add((string_no - 1, packet_no - 1))
+                            self.file_cells[string_no - 1, packet_no - 1, cell_no - 1] = float(voltage)
+                            cells_mask[string_no - 1, packet_no - 1, cell_no - 1] = True
                 except:
                     continue
             
@@ -238,9 +329,22 @@ class MegaBMSSlave:
                                 high_reg, low_reg = BMSDataConverter.float_to_registers(float(temperature))
                                 self.mapping.tab_registers[address] = high_reg
                                 self.mapping.tab_registers[address + 1] = low_reg
+                                temp_packets.add((string_no - 1, packet_no - 1))
+                                self.file_temps[string_no - 1, packet_no - 1, temp_no - 1] = float(temperature)
+                                temps_mask[string_no - 1, packet_no - 1, temp_no - 1] = True
                 except:
                     continue
+            
+            # Paket / string özetleri, min-max ağaçları ve değişiklik akışı CAN ingest'iyle aynı şekilde
+            self._ingest_file_points(cells_mask, temps_mask)
                     
+            # Kalite zaman damgası verinin kendisinin (dosyanın) zamanıdır, okuma zamanı değil
+            self.quality.mark(BMSPointGroups.MAIN, self.data_timestamp)
+            for string_index, packet_index in cell_packets:
+                self.quality.mark_packets(string_index, packet_index, self.data_timestamp, temps=False)
+            for string_index, packet_index in temp_packets:
+                self.quality.mark_packets(string_index, packet_index, self.data_timestamp, cells=False)
+            self.mapping.generation += 1
             print(f"📡 CAN verilerinden güncellendi: SOC={main_data.get('soc', 0):.1f}%, "
                   f"Current={main_data.get('current', 0):.1f}A, "
                   f"Voltage={main_data.get('pack_voltage', 0):.1f}V")
@@ -249,6 +353,177 @@ class MegaBMSSlave:
             print(f"❌ CAN veri işleme hatası: {e}")
             self.use_fake_data = True
     
+    def _ingest_file_points(self, cells_mask: np.ndarray, temps_mask: np.ndarray):
+        """file_cells / file_temps'e yazılan noktaları CAN ingest'iyle aynı türetilmiş yapılara işle"""
+        self.file_cells_received |= cells_mask
+        self.file_temps_received |= temps_mask
+        changed_strings, changed_packets = np.nonzero(cells_mask.any(axis=2) | temps_mask.any(axis=2))
+        if len(changed_strings):
+            self.aggregates.update(self.file_cells, self.file_cells_received,
+                                   self.file_temps, self.file_temps_received,
+                                   changed_strings, changed_packets)
+            self.aggregates.write_registers(self.mapping.tab_registers)
+            self.cell_extrema.update_packets(self.file_cells, cells_mask)
+        self.change_feed.update(self.file_cells, self.file_temps, cells_mask, temps_mask)
+    
+    def _set_float_register(self, address: int, value: float):
+        high_reg, low_reg = BMSDataConverter.float_to_registers(float(value))
+        self.mapping.tab_registers[address] = high_reg
+        self.mapping.tab_registers[address + 1] = low_reg
+    
+    def ingest_can_frames(self, can_ids, frames) -> int:
+        """Ham CAN FD çerçevelerini tek geçişte çözüp doğrudan register bankasına yaz"""
+        if self.can_decoder is None:
+            self.can_decoder = CANFrameDecoder()
+            self.can_decoder.set_deadbands(*self.ingest_deadbands)
+        decoder = self.can_decoder
+        
+        ingest_start = time.perf_counter()
+        accepted = decoder.decode(can_ids, frames)
+        self.rejected_frames += len(can_ids) - accepted
+        if not accepted:
+            return 0
+        
+        # Deadband altında kalan batch register'lara, nesle ve türetilmiş yapılara dokunmaz
+        changed_strings, changed_packets = decoder.changed_packets()
+        if len(changed_strings):
+            decoder.write_registers(self.mapping.tab_registers)
+            self.aggregates.update(decoder.cell_voltages, decoder.cells_received,
+                                   decoder.temperatures, decoder.temps_received,
+                                   changed_strings, changed_packets)
+            self.aggregates.write_registers(self.mapping.tab_registers)
+            self.cell_extrema.update_packets(decoder.cell_voltages, decoder.cells_changed)
+            self.change_feed.update(decoder.cell_voltages, decoder.temperatures,
+                                    decoder.cells_changed, decoder.temps_changed)
+            
+            # CAN'den türetilebilen ana veriler (String-1, Packet-1 referans alınır)
+            if decoder.cells_received[0, 0].all():
+                pack_voltage = decoder.cell_voltages[0, 0].sum()
+                self._set_float_register(BMSRegisters.TOTAL_VOLTAGE_HIGH, pack_voltage)
+                self._set_float_register(BMSCoils.PACK_VOLT_HIGH, pack_voltage)
+                self._set_float_register(BMSRegisters.CURRENT_HIGH, decoder.currents[0, 0])
+            
+            if decoder.cells_received.any():
+                avg_cellv = decoder.cell_voltages[decoder.cells_received].mean()
+                self._set_float_register(BMSRegisters.AVERAGE_VOLTAGE_HIGH, avg_cellv)
+                self._set_float_register(BMSCoils.AVG_CELLV_HIGH, avg_cellv)
+            
+            if decoder.temps_received.any():
+                temps = decoder.temperatures[decoder.temps_received]
+                self._set_float_register(BMSRegisters.MAX_TEMPERATURE_HIGH, temps.max())
+                self._set_float_register(BMSRegisters.AVERAGE_TEMPERATURE_HIGH, temps.mean())
+                self._set_float_register(BMSCoils.AVG_TEMP_HIGH, temps.mean())
+            self.mapping.generation += 1
+        
+        now = time.time()
+        if self.historian is not None:
+            self.historian.append(decoder.cell_voltages, decoder.temperatures, now,
+                                  decoder.cells_received, decoder.temps_received)
+            if self.archiver is not None:
+                self.archiver.maybe_roll()
+        if self.rollups is not None:
+            # Yalnızca bu batch'te gelen paketler örnek sayılır (diğerlerinin son değeri tekrar sayılmaz)
+            updated = np.zeros(decoder.currents.shape, dtype=bool)
+            updated[decoder.batch_strings, decoder.batch_packets] = True
+            self.rollups.add(decoder.cell_voltages, decoder.temperatures, now,
+                             decoder.cells_received & updated[..., None],
+                             decoder.temps_received & updated[..., None])
+        self.quality.mark_packets(decoder.batch_strings, decoder.batch_packets, now)
+        self.quality.mark(BMSPointGroups.MAIN, now)
+        self.last_update = now
+        self.last_ingest_duration = time.perf_counter() - ingest_start
+        return accepted
+    
+    def set_ingest_deadbands(self, cell_voltage: float, temperature: float, current: float):
+        """Ingest deadband'leri (V, °C, A); altındaki değişimler register'lara yazılmaz, nesli artırmaz"""
+        self.ingest_deadbands = (cell_voltage, temperature, current)
+        if self.can_decoder is not None:
+            self.can_decoder.set_deadbands(*self.ingest_deadbands)
+    
+    def weakest_cell(self, string_no: int, packet_no: int, bms_no: int = None):
+        """Paketteki (bms_no verilirse o karttaki) en düşük hücre: (hücre no, voltaj); veri yoksa hücre no 0"""
+        if bms_no is None:
+            return self.cell_extrema.min(string_no, packet_no)
+        return self.cell_extrema.bms_min(string_no, packet_no, bms_no)
+    
+    def strongest_cell(self, string_no: int, packet_no: int, bms_no: int = None):
+        """Paketteki (bms_no verilirse o karttaki) en yüksek hücre: (hücre no, voltaj)"""
+        if bms_no is None:
+            return self.cell_extrema.max(string_no, packet_no)
+        return self.cell_extrema.bms_max(string_no, packet_no, bms_no)
+    
+    def start_can_ingest(self, transport, batch_size: int = 288, timeout: float = 0.5):
+        """CAN transport'undan toplu okuma yapıp register bankasını güncelleyen thread'i başlat"""
+        self.can_transport = transport
+        self.refresh_on_request = False
+        
+        def ingest_loop():
+            while self.can_transport is transport:
+                can_ids, frames = transport.recv_batch(batch_size, timeout)
+                if len(can_ids):
+                    try:
+                        self.ingest_can_frames(can_ids, frames)
+                    except Exception as e:
+                        print(f"❌ CAN ingest hatası: {e}")
+        
+        self.can_thread = threading.Thread(target=ingest_loop, name="can-ingest", daemon=True)
+        self.can_thread.start()
+    
+    def stop_can_ingest(self):
+        transport, self.can_transport = self.can_transport, None
+        if self.can_thread:
+            self.can_thread.join()
+            self.can_thread = None
+        if transport:
+            transport.close()
+            self.refresh_on_request = True
+    
+    def update_diagnostics(self, requests_per_sec: float = 0.0):
+        """Sağlık / performans ve veri kalitesi register bloklarını (BMSDiagnostics) yaz"""
+        dropped = self.rejected_frames
+        if self.can_transport is not None:
+            dropped += getattr(self.can_transport, "dropped_frames", 0)
+        
+        self._set_float_register(BMSDiagnostics.REQUESTS_PER_SEC_HIGH, requests_per_sec)
+        self._set_float_register(BMSDiagnostics.INGEST_AGE_HIGH, max(0.0, time.time() - self.last_update))
+        self._set_float_register(BMSDiagnostics.INGEST_DURATION_HIGH, self.last_ingest_duration * 1000.0)
+        self.mapping.tab_registers[BMSDiagnostics.CONNECTED_CLIENTS] = min(len(self.clients), 0xFFFF)
+        for address, value in ((BMSDiagnostics.DROPPED_FRAMES_HIGH, dropped),
+                               (BMSDiagnostics.TOTAL_REQUESTS_HIGH, self.metrics.total_requests()),
+                               (BMSDiagnostics.UPTIME_HIGH, time.time() - self.started)):
+            high_reg, low_reg = BMSDataConverter.u32_to_registers(value)
+            self.mapping.tab_registers[address] = high_reg
+            self.mapping.tab_registers[address + 1] = low_reg
+        self.quality.write_registers(self.mapping.tab_registers)
+        # Genel nesil artmaz: hücre / sıcaklık blokları önbellekte kalır
+        self.mapping.diagnostics_generation += 1
+    
+    def start_diagnostics(self, interval: float = 1.0):
+        """Diagnostik register'larını istek yolundan bağımsız olarak periyodik güncelleyen thread"""
+        self.diagnostics_stop.clear()
+        
+        def diagnostics_loop():
+            previous_total = self.metrics.total_requests()
+            previous_time = time.perf_counter()
+            while not self.diagnostics_stop.wait(interval):
+                total = self.metrics.total_requests()
+                now = time.perf_counter()
+                try:
+                    self.update_diagnostics((total - previous_total) / (now - previous_time))
+                except Exception as e:
+                    print(f"❌ Diagnostik güncelleme hatası: {e}")
+                previous_total, previous_time = total, now
+        
+        self.update_diagnostics()
+        self.diagnostics_thread = threading.Thread(target=diagnostics_loop, name="diagnostics", daemon=True)
+        self.diagnostics_thread.start()
+    
+    def stop_diagnostics(self):
+        self.diagnostics_stop.set()
+        if self.diagnostics_thread:
+            self.diagnostics_thread.join()
+            self.diagnostics_thread = None
+    
     def simulate_mega_bms_data(self):
         """4992 hücreli ve 2304 sensörlü BMS verilerini simüle eder"""
         try:
@@ -256,96 +531,134 @@ class MegaBMSSlave:
             json_data_loaded = False
             try:
                 if os.path.exists("bms_data.json"):
-                    with open("bms_data.json", "r", encoding="utf-8") as f:
-                        json_data = json.load(f)
+                    json_mtime = os.path.getmtime("bms_data.json")
+                    if json_mtime == self.json_points_mtime:
+                        # Dosya değişmedi: bankadaki değerler güncel, nesil (yanıt önbelleği) korunur
+                        json_data_loaded = True
+                    else:
+                        with open("bms_data.json", "r", encoding="utf-8") as f:
+                            json_data = json.load(f)
+                        self.json_points_mtime = json_mtime
+                        self.mapping.generation += 1  # Register'lar değişiyor: yanıt önbelleği geçersiz
                     
-                    # JSON verisindeki main_data'yı kullan
-                    main_data = json_data.get("main_data", {})
-                    if main_data:
+                        # JSON verisindeki main_data'yı kullan
+                        main_data = json_data.get("main_data", {})
+                        if main_data:
 
-                        # SOC güncelle (yeni: 'soc' anahtarı ile)
-                        if "soc" in main_data:
-                            soc_value = float(main_data["soc"])
-                            high_reg, low_reg = BMSDataConverter.float_to_registers(soc_value)
-                            self.mapping.tab_registers[BMSRegisters.SOC_HIGH] = high_reg
-                            self.mapping.tab_registers[BMSRegisters.SOC_LOW] = low_reg
+                            # SOC güncelle (yeni: 'soc' anahtarı ile)
+                            if "soc" in main_data:
+                                soc_value = float(main_data["soc"])
+                                high_reg, low_reg = BMSDataConverter.float_to_registers(soc_value)
+                                self.mapping.tab_registers[BMSRegisters.SOC_HIGH] = high_reg
+                                self.mapping.tab_registers[BMSRegisters.SOC_LOW] = low_reg
 
-                        # Total Voltage güncelle
-                        if "total_voltage" in main_data:
-                            voltage_value = float(main_data["total_voltage"])
-                            high_reg, low_reg = BMSDataConverter.float_to_registers(voltage_value)
-                            self.mapping.tab_registers[BMSCoils.PACK_VOLT_HIGH] = high_reg
-                            self.mapping.tab_registers[BMSCoils.PACK_VOLT_LOW] = low_reg
+                            # Total Voltage güncelle
+                            if "total_voltage" in main_data:
+                                voltage_value = float(main_data["total_voltage"])
+                                high_reg, low_reg = BMSDataConverter.float_to_registers(voltage_value)
+                                self.mapping.tab_registers[BMSCoils.PACK_VOLT_HIGH] = high_reg
+                                self.mapping.tab_registers[BMSCoils.PACK_VOLT_LOW] = low_reg
 
-                        # Current güncelle
-                        if "current" in main_data:
-                            current_value = float(main_data["current"])
-                            high_reg, low_reg = BMSDataConverter.float_to_registers(current_value)
-                            self.mapping.tab_registers[BMSRegisters.CURRENT_HIGH] = high_reg
-                            self.mapping.tab_registers[BMSRegisters.CURRENT_LOW] = low_reg
+                            # Current güncelle
+                            if "current" in main_data:
+                                current_value = float(main_data["current"])
+                                high_reg, low_reg = BMSDataConverter.float_to_registers(current_value)
+                                self.mapping.tab_registers[BMSRegisters.CURRENT_HIGH] = high_reg
+                                self.mapping.tab_registers[BMSRegisters.CURRENT_LOW] = low_reg
 
-                        # Ortalama hücre voltajı (1012-1013)
-                        if "avg_cell_voltage" in main_data:
-                            avg_cellv = float(main_data["avg_cell_voltage"])
-                            high_reg, low_reg = BMSDataConverter.float_to_registers(avg_cellv)
-                            self.mapping.tab_registers[BMSRegisters.AVERAGE_VOLTAGE_HIGH] = high_reg
-                            self.mapping.tab_registers[BMSRegisters.AVERAGE_VOLTAGE_LOW] = low_reg
+                            # Ortalama hücre voltajı (1012-1013)
+                            if "avg_cell_voltage" in main_data:
+                                avg_cellv = float(main_data["avg_cell_voltage"])
+                                high_reg, low_reg = BMSDataConverter.float_to_registers(avg_cellv)
+                                self.mapping.tab_registers[BMSRegisters.AVERAGE_VOLTAGE_HIGH] = high_reg
+                                self.mapping.tab_registers[BMSRegisters.AVERAGE_VOLTAGE_LOW] = low_reg
 
-                        # Ortalama sıcaklık (1014-1015)
-                        if "avg_temperature" in main_data:
-                            avg_temp = float(main_data["avg_temperature"])
-                            high_reg, low_reg = BMSDataConverter.float_to_registers(avg_temp)
-                            self.mapping.tab_registers[BMSRegisters.AVERAGE_TEMPERATURE_HIGH] = high_reg
-                            self.mapping.tab_registers[BMSRegisters.AVERAGE_TEMPERATURE_LOW] = low_reg
+                            # Ortalama sıcaklık (1014-1015)
+                            if "avg_temperature" in main_data:
+                                avg_temp = float(main_data["avg_temperature"])
+                                high_reg, low_reg = BMSDataConverter.float_to_registers(avg_temp)
+                                self.mapping.tab_registers[BMSRegisters.AVERAGE_TEMPERATURE_HIGH] = high_reg
+                                self.mapping.tab_registers[BMSRegisters.AVERAGE_TEMPERATURE_LOW] = low_reg
                     
-                    # JSON'dan hücre voltajlarını güncelle
-                    cell_update_count = 0
-                    if "cell_voltages" in json_data:
-                        for cell_key, voltage in json_data["cell_voltages"].items():
+                        # JSON'dan hücre voltajlarını ve sıcaklıkları güncelle
+                        cell_update_count = 0
+                        temp_update_count = 0
+                        cell_packets, temp_packets = set(), set()
+                        cells_mask = np.zeros(self.file_cells.shape, dtype=bool)
+                        temps_mask = np.zeros(self.file_temps.shape, dtype=bool)
+                        for cell_key, voltage in json_data.get("cell_voltages", {}).items():
                             try:
-                                cell_num = int(cell_key.replace("cell_", ""))
-                                if cell_num <= 100:  # İlk 100 hücre
+                                if cell_key.startswith("string_"):
+                                    # Simülatör formatı: "string_1_packet_1_cell_1"
+                                    parts = cell_key.split("_")
+                                    string_no, packet_no, cell_no = int(parts[1]), int(parts[3]), int(parts[5])
+                                else:
+                                    cell_num = int(cell_key.replace("cell_", ""))
+                                    if cell_num > 100:  # Eski format: ilk 100 hücre
+                                        continue
                                     # String 1, Packet 1 olarak varsayıyoruz
                                     string_no = ((cell_num - 1) // 104) + 1
                                     packet_no = (((cell_num - 1) % 104) // 26) + 1
                                     cell_no = ((cell_num - 1) % 26) + 1
-                                    
-                                    address = BMSAddressCalculator.get_cell_voltage_address(string_no, packet_no, cell_no)
-                                    if address + 1 < len(self.mapping.tab_registers):
-                                        high_reg, low_reg = BMSDataConverter.float_to_registers(float(voltage))
-                                        self.mapping.tab_registers[address] = high_reg
-                                        self.mapping.tab_registers[address + 1] = low_reg
-                                        cell_update_count += 1
-                            except:
+                                
+                                address = BMSAddressCalculator.get_cell_voltage_address(string_no, packet_no, cell_no)
+                                if address + 1 < len(self.mapping.tab_registers):
+                                    high_reg, low_reg = BMSDataConverter.float_to_registers(float(voltage))
+                                    self.mapping.tab_registers[address] = high_reg
+                                    self.mapping.tab_registers[address + 1] = low_reg
+                                    cell_update_count += 1
+                                    cell_packets.add((string_no - 1, packet_no - 1))
+                                    self.file_cells[string_no - 1, packet_no - 1, cell_no - 1] = float(voltage)
+                                    cells_mask[string_no - 1, packet_no - 1, cell_no - 1] = True
+                            except (ValueError, IndexError):
                                 continue
-                    
-                    # JSON'dan sıcaklıkları güncelle
-                    temp_update_count = 0
-                    if "temperatures" in json_data:
-                        for temp_key, temp in json_data["temperatures"].items():
+                        
+                        for temp_key, temp in json_data.get("temperatures", {}).items():
                             try:
-                                temp_num = int(temp_key.replace("temp_", ""))
-                                if temp_num <= 50:  # İlk 50 sensör
+                                if temp_key.startswith("string_"):
+                                    # Simülatör formatı: "string_1_packet_1_temp_1"; paket içi sıra CAN düzeninde (BMS başına 7)
+                                    parts = temp_key.split("_")
+                                    string_no, packet_no, temp_no = int(parts[1]), int(parts[3]), int(parts[5])
+                                    bms_no, sensor_no = (temp_no - 1) // 7 + 1, (temp_no - 1) % 7 + 1
+                                else:
+                                    temp_num = int(temp_key.replace("temp_", ""))
+                                    if temp_num > 50:  # Eski format: ilk 50 sensör
+                                        continue
                                     # String 1, Packet 1, BMS 1 olarak varsayıyoruz
                                     string_no = ((temp_num - 1) // 8) + 1
                                     packet_no = 1
                                     bms_no = 1
                                     sensor_no = ((temp_num - 1) % 8) + 1
-                                    
-                                    address = BMSAddressCalculator.get_temperature_address(string_no, packet_no, bms_no, sensor_no)
-                                    if address + 1 < len(self.mapping.tab_registers):
-                                        high_reg, low_reg = BMSDataConverter.float_to_registers(float(temp))
-                                        self.mapping.tab_registers[address] = high_reg
-                                        self.mapping.tab_registers[address + 1] = low_reg
-                                        temp_update_count += 1
-                            except:
+                                
+                                address = BMSAddressCalculator.get_temperature_address(string_no, packet_no, bms_no, sensor_no)
+                                if address + 1 < len(self.mapping.tab_registers):
+                                    high_reg, low_reg = BMSDataConverter.float_to_registers(float(temp))
+                                    self.mapping.tab_registers[address] = high_reg
+                                    self.mapping.tab_registers[address + 1] = low_reg
+                                    temp_update_count += 1
+                                    temp_packets.add((string_no - 1, packet_no - 1))
+                                    if sensor_no <= 7:  # Türetilmiş yapılar CAN düzenini (BMS başına 7 sensör) izler
+                                        temp_index = (bms_no - 1) * 7 + sensor_no - 1
+                                        self.file_temps[string_no - 1, packet_no - 1, temp_index] = float(temp)
+                                        temps_mask[string_no - 1, packet_no - 1, temp_index] = True
+                            except (ValueError, IndexError):
                                 continue
+                        
+                        # Özetler (31000 / 31600), min-max ağaçları ve değişiklik akışı varsayılan (JSON) modda da beslenir
+                        self._ingest_file_points(cells_mask, temps_mask)
                     
-                    json_data_loaded = True
-                    soc = main_data.get("soc_percent", 0)
-                    voltage = main_data.get("total_voltage", 0)
-                    current = main_data.get("current", 0)
-                    print(f"📊 JSON verisi kullanıldı - SOC: {soc:.1f}%, Voltaj: {voltage:.1f}V, Akım: {current:.1f}A, {cell_update_count} hücre, {temp_update_count} sensör güncellendi")
+                        json_data_loaded = True
+                        self.last_update = json_mtime
+                        # Eski dosya sessizce kullanılmaz: zaman damgası dosyanınki, kalite yaşa göre STALE olur
+                        self.quality.mark(BMSPointGroups.MAIN, self.last_update)
+                        for string_index, packet_index in cell_packets:
+                            self.quality.mark_packets(string_index, packet_index, self.last_update, temps=False)
+                        for string_index, packet_index in temp_packets:
+                            self.quality.mark_packets(string_index, packet_index, self.last_update, cells=False)
+                        soc = main_data.get("soc_percent", 0)
+                        voltage = main_data.get("total_voltage", 0)
+                        current = main_data.get("current", 0)
+                        print(f"📊 JSON verisi kullanıldı - SOC: {soc:.1f}%, Voltaj: {voltage:.1f}V, Akım: {current:.1f}A, {cell_update_count} hücre, {temp_update_count} sensör güncellendi")
                         
             except Exception as json_error:
                 print(f"⚠️ JSON okuma hatası: {json_error}")
@@ -360,6 +673,13 @@ class MegaBMSSlave:
             print(f"❌ BMS veri simülasyonu hatası: {e}")
             traceback.print_exc()
         
+        if self.production:
+            return  # Üretim modunda rastgele değer enjeksiyonu yapılmaz
+        
+        # Aşağıdaki değerler rastgele üretilir: ana veri grubu SIMULATED olarak işaretlenir
+        self.mapping.generation += 1
+        self.quality.mark(BMSPointGroups.MAIN, simulated=True)
+        
         # Akım güncelle (32-bit float format)
         current_high = self.mapping.tab_registers[BMSRegisters.CURRENT_HIGH]
         current_low = self.mapping.tab_registers[BMSRegisters.CURRENT_LOW]
@@ -428,8 +748,66 @@ class MegaBMSSlave:
             print(f"Veri alma hatası: {e}")
             return None
             
+    def _build_read_pdu(self, function_code: int, address: int, count: int,
+                        mapping: ModbusMapping = None) -> bytes:
+        """Okuma yanıtının PDU kısmı (fonksiyon kodu + byte sayısı + veri)"""
+        # Adres -> depo çözümlemesi adres haritasında; haritada olmayan adresler 0 okunur
+        response_data = (mapping or self.mapping).spaces[function_code].read(address, count)
+        return bytes([function_code, len(response_data)]) + response_data
+    
+    def _cached_read_pdu(self, function_code: int, address: int, count: int,
+                         mapping: ModbusMapping = None, unit_id: int = 0) -> bytes:
+        """Aynı (unit, FC, adres, adet) okuması veri değişmediyse önceden kodlanmış PDU'dan yanıtlanır"""
+        mapping = mapping or self.mapping
+        # Nesil PDU'dan önce okunur: ingest sırasında üretilen PDU eski nesille etiketlenir ve atılır
+        generation = mapping.generation
+        if mapping.shared_generation is not None:
+            # İki sayaç da yalnızca artar; toplamları her iki kaynaktan gelen değişiklikte değişir
+            generation += int(mapping.shared_generation[0])
+        if function_code == 0x03 and address < DIAGNOSTICS_END and address + count > DIAGNOSTICS_FIRST:
+            generation = (generation, mapping.diagnostics_generation)
+        key = (unit_id, function_code, address, count)
+        cached = self.response_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            self.cache_hits += 1
+            return cached[1]
+        
+        self.cache_misses += 1
+        pdu = self._build_read_pdu(function_code, address, count, mapping)
+        if len(self.response_cache) >= self.response_cache_size:
+            self.response_cache.clear()
+        self.response_cache[key] = (generation, pdu)
+        return pdu
+    
+    def _client_name(self, client_socket: socket.socket) -> str:
+        name = self.client_names.get(client_socket)
+        if name is None:
+            try:
+                host, port = client_socket.getpeername()[:2]
+                name = f"{host}:{port}"
+            except OSError:
+                name = "?"
+            self.client_names[client_socket] = name
+        return name
+    
+    def _write_space(self, function_code: int, address: int, count: int, payload: bytes,
+                     mapping: ModbusMapping = None):
+        """Adres haritası üzerinden yaz ve her parçayı günlüğe işle"""
+        mapping = mapping or self.mapping
+        for table, index, size in mapping.spaces[function_code].write(address, count, payload):
+            if table in TABLES:  # Hesaplanmış depolar (ör. değişiklik akışı imleci) bankayı değiştirmez
+                self._record_write(table, index, size, mapping)
+    
+    def _record_write(self, table: str, address: int, count: int = 1, mapping: ModbusMapping = None):
+        """Master yazması sonrası: nesli artır, günlüğe ekle (tüketiciler, ör. dengeleme motoru, günlükten okur)"""
+        mapping = mapping or self.mapping
+        mapping.generation += 1
+        if mapping.journal is not None:
+            mapping.journal.record(table, address, count, mapping.generation)
+    
     def reply(self, client_socket: socket.socket, query: bytes) -> bool:
 
+        start = time.perf_counter()
         try:
             if len(query) < 8:
                 return False
@@ -437,89 +815,106 @@ class MegaBMSSlave:
             transaction_id, protocol_id, length, unit_id = struct.unpack('>HHHB', query[:7])
             function_code = query[7]
             
-            print(f"[MODBUS] Function Code: {function_code:02X}, Unit ID: {unit_id}, Address: {length}")
+            if self.verbose:
+                print(f"[MODBUS] Function Code: {function_code:02X}, Unit ID: {unit_id}, Address: {length}")
             
-            # Her istek öncesi veriyi güncelle
-            self.simulate_mega_bms_data()
+            # Unit ID yönlendirmesi: unit tablosu boşsa tek banka (eski davranış)
+            mapping = self.units.get(unit_id) if self.units else self.mapping
             
-            if function_code == 0x03: 
-                address, count = struct.unpack('>HH', query[8:12])
-                print(f"[DEBUG] Function 03: Reading {count} registers from address {address}")
-                response_data = bytearray()
-                
-                for i in range(count):
-                    reg_addr = address + i
-                    if reg_addr < len(self.mapping.tab_registers):
-                        value = self.mapping.tab_registers[reg_addr]
-                    else:
-                        value = 0
-                    response_data.extend(struct.pack('>H', value))
-                    
-                response = struct.pack('>HHHBB', 
-                    transaction_id, protocol_id, len(response_data) + 3, unit_id, function_code) + bytes([len(response_data)]) + response_data
-                    
-            elif function_code == 0x04:  # Read Input Registers
-                address, count = struct.unpack('>HH', query[8:12])
-                print(f"[DEBUG] Function 04: Reading {count} input registers from address {address}")
-                response_data = bytearray()
-                
-                for i in range(count):
-                    reg_addr = address + i
-                    if reg_addr < len(self.mapping.tab_input_registers):
-                        value = self.mapping.tab_input_registers[reg_addr]
-                    else:
-                        value = 0
-                    response_data.extend(struct.pack('>H', value))
-                    
+            # Her istek öncesi veriyi güncelle (CAN ingest aktifse veri zaten güncel)
+            if self.refresh_on_request and mapping is self.mapping:
+                ingest_start = time.perf_counter()
+                self.simulate_mega_bms_data()
+                self.last_ingest_duration = time.perf_counter() - ingest_start
+            
+            if mapping is None:
+                # 0x0A = Gateway Path Unavailable (bu unit ID için banka yok)
                 response = struct.pack('>HHHBB', 
-                    transaction_id, protocol_id, len(response_data) + 3, unit_id, function_code) + bytes([len(response_data)]) + response_data
-                    
-            elif function_code == 0x02:  
-                address, count = struct.unpack('>HH', query[8:12])
-                print(f"[DEBUG] Function 02: Reading {count} discrete inputs from address {address}")
-                byte_count = (count + 7) // 8
-                response_data = bytearray(byte_count)
+                    transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x0A])
                 
-                for i in range(count):
-                    input_addr = address + i - 20000  
-                    if 0 <= input_addr < len(self.mapping.tab_input_bits):
-                        if self.mapping.tab_input_bits[input_addr]:
-                            response_data[i // 8] |= (1 << (i % 8))
-                            
-                response = struct.pack('>HHHBB', 
-                    transaction_id, protocol_id, byte_count + 3, unit_id, function_code) + bytes([byte_count]) + response_data
-                    
-            elif function_code == 0x01:  # Read Coils - Standard bit tabanlı
+            elif function_code in (0x01, 0x02, 0x03, 0x04):
                 address, count = struct.unpack('>HH', query[8:12])
-                print(f"[DEBUG] Function 01: Reading {count} coils from address {address}")
-                byte_count = (count + 7) // 8
-                response_data = bytearray(byte_count)
-                
-                # Coil'leri bit olarak işle
-                for i in range(count):
-                    coil_addr = address + i
-                    if 0 <= coil_addr < len(self.mapping.tab_bits):
-                        if self.mapping.tab_bits[coil_addr]:
-                            response_data[i // 8] |= (1 << (i % 8))
-                            
-                response = struct.pack('>HHHBB', 
-                    transaction_id, protocol_id, byte_count + 3, unit_id, function_code) + bytes([byte_count]) + response_data
+                if self.verbose:
+                    print(f"[DEBUG] Function {function_code:02X}: Reading {count} items from address {address}")
+                limit = MAX_READ_BITS if function_code <= 0x02 else MAX_READ_REGISTERS
+                if not 1 <= count <= limit:
+                    # 0x03 = Illegal Data Value
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x03])
+                else:
+                    pdu = self._cached_read_pdu(function_code, address, count, mapping, unit_id)
+                    # Yalnızca transaction / unit ID yanıta yamalanır
+                    response = struct.pack('>HHHB', transaction_id, protocol_id, len(pdu) + 1, unit_id) + pdu
                     
             elif function_code == 0x06: 
                 address, value = struct.unpack('>HH', query[8:12])
-                if address < len(self.mapping.tab_registers):
-                    self.mapping.tab_registers[address] = value
-                    print(f"[MEGA BMS] Register {address} güncellendi: {value}")
+                if mapping.spaces[function_code].covers(address, 1):
+                    self._write_space(function_code, address, 1, query[10:12], mapping)
+                    if self.verbose:
+                        print(f"[MEGA BMS] Register {address} güncellendi: {value}")
                 response = query  
                 
+            elif function_code == 0x10: # Write Multiple Registers
+                address, count, byte_count = struct.unpack('>HHB', query[8:13])
+                if count < 1 or count > 123 or byte_count != 2 * count or len(query) < 13 + byte_count:
+                    # 0x03 = Illegal Data Value
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x03])
+                elif not mapping.spaces[function_code].covers(address, count):
+                    # 0x02 = Illegal Data Address
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x02])
+                else:
+                    self._write_space(function_code, address, count, query[13:13 + byte_count], mapping)
+                    if self.verbose:
+                        print(f"[MEGA BMS] Register {address}-{address + count - 1} güncellendi ({count} adet)")
+                    response = struct.pack('>HHHBBHH', transaction_id, protocol_id, 6, unit_id,
+                                           function_code, address, count)
+                
+            elif function_code == 0x17: # Read/Write Multiple Registers
+                read_address, read_count, write_address, write_count, byte_count = struct.unpack('>HHHHB', query[8:17])
+                if (not 1 <= read_count <= 125 or not 1 <= write_count <= 121 or byte_count != 2 * write_count
+                        or len(query) < 17 + byte_count):
+                    # 0x03 = Illegal Data Value
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x03])
+                elif not (mapping.spaces[function_code].covers(read_address, read_count) and
+                          mapping.spaces[function_code].covers(write_address, write_count)):
+                    # 0x02 = Illegal Data Address
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x02])
+                else:
+                    # Yazma okumadan önce (değişiklik akışı: imleç yazılır, blok aynı istekte okunur)
+                    self._write_space(function_code, write_address, write_count, query[17:17 + byte_count], mapping)
+                    data = mapping.spaces[function_code].read(read_address, read_count)
+                    pdu = bytes([function_code, 2 * read_count]) + data
+                    response = struct.pack('>HHHB', transaction_id, protocol_id, len(pdu) + 1, unit_id) + pdu
+                
+            elif function_code == 0x0F: # Write Multiple Coils
+                address, count, byte_count = struct.unpack('>HHB', query[8:13])
+                if count < 1 or count > 1968 or byte_count != (count + 7) // 8 or len(query) < 13 + byte_count:
+                    # 0x03 = Illegal Data Value
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x03])
+                elif not mapping.spaces[function_code].covers(address, count):
+                    # 0x02 = Illegal Data Address
+                    response = struct.pack('>HHHBB', 
+                        transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x02])
+                else:
+                    self._write_space(function_code, address, count, query[13:13 + byte_count], mapping)
+                    if self.verbose:
+                        print(f"[MEGA BMS] Coil {address}-{address + count - 1} güncellendi ({count} adet)")
+                    response = struct.pack('>HHHBBHH', transaction_id, protocol_id, 6, unit_id,
+                                           function_code, address, count)
+                
             elif function_code == 0x05: # Write Single Coil - Standard bit tabanlı
                 address, value = struct.unpack('>HH', query[8:12])
                 
                 # Standard coil yazma işlemi
-                coil_addr = address
-                if 0 <= coil_addr < len(self.mapping.tab_bits):
-                    self.mapping.tab_bits[coil_addr] = (value == 0xFF00)
-                    print(f"[MEGA BMS] Coil {address} güncellendi: {'ON' if value == 0xFF00 else 'OFF'}")
+                if mapping.spaces[function_code].covers(address, 1):
+                    self._write_space(function_code, address, 1, b'\x01' if value == 0xFF00 else b'\x00', mapping)
+                    if self.verbose:
+                        print(f"[MEGA BMS] Coil {address} güncellendi: {'ON' if value == 0xFF00 else 'OFF'}")
                         
                 response = query  # Echo back request  
                 
@@ -529,26 +924,150 @@ class MegaBMSSlave:
                 response = struct.pack('>HHHBB', 
                     transaction_id, protocol_id, 3, unit_id, function_code | 0x80) + bytes([0x01])
                 
-            client_socket.send(response)
+            client_socket.sendall(response)
+            self.metrics.record(self._client_name(client_socket), function_code, len(query), len(response),
+                                time.perf_counter() - start, bool(response[7] & 0x80))
             return True
             
-        except Exception as e:
+        except OSError as e:
             print(f"Yanıt gönderme hatası: {e}")
+            if len(query) >= 8:
+                self.metrics.record(self._client_name(client_socket), query[7], len(query), 0,
+                                    time.perf_counter() - start, True)
             return False
+        except Exception as e:
+            # Çözülemeyen istek de yanıtlanır: 0x03 = Illegal Data Value (eksik / bozuk çerçeve),
+            # 0x04 = Server Device Failure (işleme hatası)
+            exception_code = 0x03 if isinstance(e, (struct.error, IndexError)) else 0x04
+            print(f"İstek işleme hatası (FC {query[7]:02X}, exception {exception_code:02X}): {e}")
+            response = query[:4] + struct.pack('>HBBB', 3, query[6], query[7] | 0x80, exception_code)
+            try:
+                client_socket.sendall(response)
+            except OSError:
+                return False
+            self.metrics.record(self._client_name(client_socket), query[7], len(query), len(response),
+                                time.perf_counter() - start, True)
+            return True
+            
+    def serve(self, stop_event: threading.Event = None, poll_interval: float = 0.5):
+        """Birden fazla master'ı tek thread'de yanıtla (pipelined istekler MBAP uzunluğuna göre ayrılır)"""
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ, None)
+        buffers = {}
+        
+        def drop(client_socket):
+            selector.unregister(client_socket)
+            buffers.pop(client_socket, None)
+            self.clients.discard(client_socket)
+            self.client_names.pop(client_socket, None)
+            client_socket.close()
+        
+        try:
+            while stop_event is None or not stop_event.is_set():
+                for key, _ in selector.select(poll_interval):
+                    if key.data is None:
+                        client_socket = self.tcp_accept()
+                        if client_socket:
+                            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                            selector.register(client_socket, selectors.EVENT_READ, True)
+                            buffers[client_socket] = bytearray()
+                            self.clients.add(client_socket)
+                            print(f"🔗 Master bağlandı ({len(self.clients)} aktif bağlantı)")
+                        continue
+                    
+                    client_socket = key.fileobj
+                    try:
+                        data = client_socket.recv(4096)
+                    except OSError:
+                        data = b''
+                    if not data:
+                        drop(client_socket)
+                        print(f"📴 Master bağlantısını kapattı ({len(self.clients)} aktif bağlantı)")
+                        continue
+                    
+                    buffer = buffers[client_socket]
+                    buffer.extend(data)
+                    # Yanıtlanamayan çerçeve sonrakileri düşürmez (gönderme hatası bağlantının kapanmasıyla görülür)
+                    for query in split_frames(buffer):
+                        self.reply(client_socket, query)
+        finally:
+            for client_socket in list(buffers):
+                drop(client_socket)
+            selector.close()
             
     def close(self):
         if self.socket:
             self.socket.close()
             
-def run_mega_bms_slave():
+def run_mega_bms_slave(can_kind: str = None, can_channel: str = "can0",
+                       metrics_port: int = None, metrics_interval: float = None,
+                       production: bool = False, history: float = None, archive_dir: str = None,
+                       segment_seconds: float = 600.0, rollups: bool = False, balancing: bool = False,
+                       deadbands: tuple = (0.0005, 0.1, 0.1), units: tuple = None, arena_name: str = None):
 
-    slave = MegaBMSSlave()
-    slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000)
+    slave = MegaBMSSlave(production=production)
+    slave.set_ingest_deadbands(*deadbands)
+    arena = None
+    if units:
+        from unit_arena import UnitArena
+        # Tüm unit bankaları tek paylaşımlı bellek bloğunda; yerel veri kaynağı ilk unit'i besler
+        arena = UnitArena(units, name=arena_name)
+        slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000, arena, units[0])
+        for unit_id in units:
+            slave.add_unit(unit_id, slave.mapping if unit_id == units[0] else
+                           slave.mapping_new(50000, 50000, 50000, 50000, arena, unit_id))
+        print(f"🧩 Unit'ler: {', '.join(map(str, units))} (yerel veri: unit {units[0]}, "
+              f"arena '{arena.name}', {arena.shm.size / 1e6:.1f} MB)")
+    else:
+        slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000)
+    slave.attach_change_feed()
     slave.initialize_mega_bms_data()
     
-    if not slave.tcp_listen():
+    if not slave.tcp_listen(max_connections=16):
         print("Socket açılamadı")
         return
+    
+    if archive_dir:
+        # Segment yazılırken ring buffer'ın dönmeye devam edebilmesi için en az 2 segment tutulur
+        history = max(history or 0.0, 2 * segment_seconds)
+    if history:
+        from historian import RingHistorian
+        slave.historian = RingHistorian(retention=history)
+        print(f"🗄️ Historian aktif: son {history:.0f}s ({slave.historian.memory_bytes() / 1e6:.0f} MB)")
+    if archive_dir:
+        from historian_segments import HistorianArchiver, SegmentStore
+        slave.archiver = HistorianArchiver(slave.historian, SegmentStore(archive_dir),
+                                           int(segment_seconds / slave.historian.interval))
+        print(f"💽 Historian arşivi: {archive_dir} ({segment_seconds:.0f}s segmentler)")
+    
+    if rollups:
+        from historian_rollups import RollupPipeline
+        slave.rollups = RollupPipeline()
+        print(f"📉 Rollup'lar aktif: 1 dk / 1 saat ({slave.rollups.memory_bytes() / 1e6:.0f} MB)")
+    
+    if can_kind:
+        from can_transport import open_can_transport
+        slave.start_can_ingest(open_can_transport(can_kind, can_channel))
+        print(f"📡 CAN ingest aktif ({can_kind}:{can_channel}), bms_data.json okunmayacak")
+        print(f"🎚️ Ingest deadband: hücre {deadbands[0] * 1000:g} mV, sıcaklık {deadbands[1]:g}°C, akım {deadbands[2]:g} A")
+    
+    if balancing:
+        from balancing_engine import BalancingEngine
+        # Dengeleme mesajları ingest ile aynı bus'a gönderilir; CAN yoksa yalnızca sayılır
+        slave.balancing = BalancingEngine(slave.can_transport)
+        # Dengeleme motoru yalnızca yerel CAN bus'taki bankanın günlüğüne bağlanır
+        slave.balancing.start(slave.mapping.tab_registers, slave.mapping.journal)
+        print(f"⚖️ Dengeleme motoru aktif (40000-44991 yazmaları -> CAN, en fazla {1 / slave.balancing.min_interval:.0f} döngü/s)")
+    
+    slave.start_diagnostics()
+    
+    if metrics_port:
+        from slave_metrics import start_metrics_server
+        start_metrics_server(slave.metrics, metrics_port)
+        print(f"📈 Metrikler: http://127.0.0.1:{metrics_port}/metrics")
+    if metrics_interval:
+        from slave_metrics import start_periodic_dump
+        start_periodic_dump(slave.metrics, metrics_interval)
         
     print(f"� MEGA BMS TCP Slave başlatılıyor (port {slave.port})...")
     print("\n" + "="*80)
@@ -563,8 +1082,13 @@ def run_mega_bms_slave():
     print("  🌡️ Sıcaklık Sensörleri: 7000 - 9303")
     print("  ⚡ Ana Veriler: 1000-1004, 10000-10004")
     print("  🎛️ Kontrol: 10050-10053")
-    print("  ⚠️ Alarmlar: 20000-20015")
+    print("  ⚠️ Alarmlar: 20000-20015 (discrete input, FC02)")
     print("  🔧 Komutlar: 30000-30005")
+    print("  🩺 Diagnostik: 30100-30112")
+    print("  🏷️ Veri Kalitesi: 30200-30587 (grup başına kalite, yaş, zaman damgası)")
+    print("  📦 Paket / String Özetleri: 31000-31575 / 31600-31743")
+    print("  🔔 Değişiklik Akışı: 32000-32001 imleç / 32010+ blok (FC 0x17)")
+    print("  ⚖️ Dengeleme Bayrakları: 40000-44991 (hücre başına 1 register)")
     
     print("\n🔢 Örnek Adres Hesaplamaları:")
     try:
@@ -583,25 +1107,58 @@ def run_mega_bms_slave():
     print("\n" + "="*80)
     
     try:
-        while True:
-            client_socket = slave.tcp_accept()
-            if not client_socket:
-                continue
-                
-            print(f"\n🔗 Master bağlandı - MEGA BMS verileri aktarılıyor...")
-            
-            while True:
-                query = slave.receive(client_socket)
-                if not query:
-                    print("📴 Master bağlantısını kapattı, yeni Master bekleniyor...")
-                    break
-                    
-                slave.reply(client_socket, query)
+        # Birden fazla master aynı anda bağlanabilir
+        slave.serve()
                 
     except KeyboardInterrupt:
         print("\n🛑 MEGA BMS Slave kapatılıyor...")
     finally:
+        slave.stop_diagnostics()
+        if slave.balancing:
+            slave.balancing.stop()
+        slave.stop_can_ingest()
+        if slave.archiver:
+            slave.archiver.flush()
         slave.close()
+        if arena:
+            slave.units.clear()
+            slave.mapping = None  # Arena görünümleri bırakılmadan paylaşımlı bellek kapatılamaz
+            arena.close()
+            arena.unlink()
 
 if __name__ == "__main__":
-    run_mega_bms_slave()
+    import argparse
+    parser = argparse.ArgumentParser(description="MEGA BMS Modbus TCP Slave")
+    # VirtualCANBus süreç içidir (can_pipeline_benchmark.py); iki süreç arası test için vcan0 kullanın
+    parser.add_argument("--can", choices=["socketcan"], default=None,
+                        help="Verileri bms_data.json yerine CAN bus'tan al")
+    parser.add_argument("--channel", default="can0")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Metrikleri bu portta HTTP ile sun (/metrics, /metrics.json)")
+    parser.add_argument("--metrics-interval", type=float, default=None,
+                        help="Metrik tablosunu bu aralıkla (saniye) konsola bas")
+    parser.add_argument("--production", action="store_true",
+                        help="Sahte/rastgele veri üretme; güncel olmayan veri yalnızca kalite register'larıyla bildirilir")
+    parser.add_argument("--history", type=float, default=None,
+                        help="CAN verilerini bu kadar saniye bellekte tut (ring-buffer historian)")
+    parser.add_argument("--archive", default=None,
+                        help="Historian segmentlerini bu dizine sıkıştırılmış olarak yaz")
+    parser.add_argument("--segment-seconds", type=float, default=600.0, help="Segment uzunluğu (saniye)")
+    parser.add_argument("--rollups", action="store_true",
+                        help="1 dk / 1 saat min-max-ortalama rollup'larını CAN ingest ile güncelle")
+    parser.add_argument("--balancing", action="store_true",
+                        help="40000+ dengeleme bayrağı yazmalarını CAN dengeleme mesajlarına çevir")
+    parser.add_argument("--deadband-mv", type=float, default=0.5,
+                        help="Hücre voltajı ingest deadband'i (mV); altındaki değişimler yazılmaz")
+    parser.add_argument("--deadband-temp", type=float, default=0.1, help="Sıcaklık ingest deadband'i (°C)")
+    parser.add_argument("--deadband-current", type=float, default=0.1, help="Akım ingest deadband'i (A)")
+    parser.add_argument("--units", default=None,
+                        help="Virgülle ayrılmış unit ID'leri (ör. 1,2,3); her unit ayrı banka, ilki yerel veri")
+    parser.add_argument("--arena-name", default=None,
+                        help="Unit bankalarının paylaşımlı bellek adı (konteyner ingest süreçleri bağlanır)")
+    args = parser.parse_args()
+    units = tuple(int(unit) for unit in args.units.split(",")) if args.units else None
+    run_mega_bms_slave(args.can, args.channel, args.metrics_port, args.metrics_interval,
+                       args.production, args.history, args.archive, args.segment_seconds, args.rollups,
+                       args.balancing, (args.deadband_mv / 1000.0, args.deadband_temp, args.deadband_current),
+                       units, args.arena_name)
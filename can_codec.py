@@ -0,0 +1,307 @@
+"""
+BMS CAN FD (64 byte) çerçeve kodlayıcısı / çözücüsü
+Bir döngüdeki tüm BMS yanıt çerçeveleri (varsayılan 12 × 4 × 6 = 288) tek bir
+bitişik buffer'a vektörel olarak yazılır (CANFrameEncoder) ve aynı şekilde tek
+geçişte hücre voltajı / sıcaklık matrislerine çözülür (CANFrameDecoder).
+Çerçeve düzeni CANMessageSimulator.create_can_message ve eski CanBusWorker ile aynıdır:
+
+  0-13  : 7 sıcaklık (NTC voltajı, little-endian u16)
+  14-15 : VAREF (0x0C80)
+  16-51 : 18 hücre voltajı (little-endian u16, kullanılmayan slotlar 0)
+  52-54 : DGS
+  55    : boş
+  56-59 : Pressure (float32)
+  60-63 : Current (float32)
+"""
+import numpy as np
+from typing import Optional, Sequence, Tuple, Union
+from bms_register_map import BMSAddressCalculator
+
+CAN_FD_FRAME_SIZE = 64
+CELL_SLOTS_PER_BMS = 18
+VAREF_RAW = 0x0C80  # data[14] = 0x80, data[15] = 0x0C
+
+# convert_voltage: voltage = (cell_val * 0.00015) + 1.5024
+VOLTAGE_LSB = 0.00015
+VOLTAGE_OFFSET = 1.5024
+
+# convert_temperature NTC sabitleri
+NTC_R25 = 10000.0
+NTC_BETA = 4100.0
+NTC_T25_KELVIN = 298.15
+NTC_SUPPLY_VOLTAGE = 3.0
+
+FRAME_DTYPE = np.dtype([
+    ('temps', '<u2', (7,)),
+    ('varef', '<u2'),
+    ('cells', '<u2', (CELL_SLOTS_PER_BMS,)),
+    ('dgs', 'u1', (3,)),
+    ('reserved', 'u1'),
+    ('pressure', '<f4'),
+    ('current', '<f4'),
+])
+assert FRAME_DTYPE.itemsize == CAN_FD_FRAME_SIZE
+
+def voltages_to_raw(voltages: np.ndarray) -> np.ndarray:
+    """voltage_to_bytes'ın vektörel hali (u16 ham değer)"""
+    raw = np.trunc((np.asarray(voltages, dtype=np.float64) - VOLTAGE_OFFSET) / VOLTAGE_LSB).astype(np.int64)
+    raw[raw < 0] += 65535 - 1
+    return (raw & 0xFFFF).astype(np.uint16)
+
+def temperatures_to_ntc_voltage(temps_celsius: np.ndarray) -> np.ndarray:
+    """convert_temperature'ın tersi: °C -> NTC bölücü voltajı"""
+    t_kelvin = np.asarray(temps_celsius, dtype=np.float64) + 273.15
+    log_ratio = (1 / NTC_T25_KELVIN - 1 / t_kelvin) * NTC_BETA
+    ntc = NTC_R25 / np.exp(log_ratio)
+    return NTC_SUPPLY_VOLTAGE * ntc / (ntc + NTC_R25)
+
+def temperatures_to_raw(temps_celsius: np.ndarray) -> np.ndarray:
+    """temp_to_voltage_bytes'ın vektörel hali (u16 ham değer)"""
+    return voltages_to_raw(temperatures_to_ntc_voltage(temps_celsius))
+
+def raw_to_voltages(raw: np.ndarray) -> np.ndarray:
+    """convert_voltage'ın vektörel hali (u16 ham değer -> V)"""
+    cell_val = np.asarray(raw).astype(np.int64)
+    cell_val[cell_val >= 0x8000] -= 65535 - 1
+    return cell_val * VOLTAGE_LSB + VOLTAGE_OFFSET
+
+def ntc_voltage_to_temperatures(volt: np.ndarray) -> np.ndarray:
+    """convert_temperature'ın vektörel hali (geçersiz voltajlar 0.0°C)"""
+    volt = np.asarray(volt, dtype=np.float64)
+    valid = (volt > 0) & (volt < NTC_SUPPLY_VOLTAGE)
+    safe = np.where(valid, volt, 1.5)
+    ntc = safe * NTC_R25 / (NTC_SUPPLY_VOLTAGE - safe)
+    t_kelvin = 1 / (1 / NTC_T25_KELVIN - np.log(NTC_R25 / ntc) / NTC_BETA)
+    return np.where(valid, t_kelvin - 273.15, 0.0)
+
+def raw_to_temperatures(raw: np.ndarray) -> np.ndarray:
+    """Ham sıcaklık değeri -> °C (convert_voltage + convert_temperature)"""
+    return ntc_voltage_to_temperatures(raw_to_voltages(raw))
+
+def floats_to_registers(values: np.ndarray) -> np.ndarray:
+    """float dizisini (N, 2) big-endian (high, low) register çiftlerine çevir"""
+    return np.asarray(values, dtype='>f4').reshape(-1).view('>u2').reshape(-1, 2).astype(np.uint16)
+
+def parse_can_ids(can_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """process_can_data'daki ID çözümünün vektörel hali -> (string, paket, bms_in_packet, response_bit)"""
+    can_ids = np.asarray(can_ids, dtype=np.int64)
+    bms_id = (can_ids >> 1) & 0x1F
+    string_id = (can_ids >> 6) & 0xF
+    response_bit = (can_ids >> 10) & 0x1
+    packet_id = (bms_id - 1) // 6 + 1
+    bms_in_packet = (bms_id - 1) % 6 + 1
+    return string_id, packet_id, bms_in_packet, response_bit
+
+def generate_can_ids(total_strings: int, packets_per_string: int, bms_per_packet: int = 6) -> np.ndarray:
+    """generate_can_id'nin tüm (string, paket, bms) için hesaplanmış tablosu"""
+    string_id = np.arange(1, total_strings + 1).reshape(-1, 1, 1)
+    packet_id = np.arange(1, packets_per_string + 1).reshape(1, -1, 1)
+    bms_id = np.arange(1, bms_per_packet + 1).reshape(1, 1, -1)
+    # CAN ID format: [response_bit:1][string_id:4][bms_id:5][packet_bit:1]
+    global_bms_id = (packet_id - 1) * bms_per_packet + bms_id
+    packet_bit = (packet_id - 1) % 2
+    can_ids = (1 << 10) | (string_id << 6) | (global_bms_id << 1) | packet_bit
+    return can_ids.astype(np.uint32).reshape(-1)
+
+def cell_slot_layout(cells_per_bms: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """(bms, slot) -> paket içi hücre indeksi tablosu ve geçerli slot maskesi"""
+    index = np.zeros((len(cells_per_bms), CELL_SLOTS_PER_BMS), dtype=np.intp)
+    mask = np.zeros_like(index, dtype=bool)
+    offset = 0
+    for bms, cell_count in enumerate(cells_per_bms):
+        index[bms, :cell_count] = np.arange(offset, offset + cell_count)
+        mask[bms, :cell_count] = True
+        offset += cell_count
+    return index, mask
+
+class CANFrameEncoder:
+    def __init__(self, total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_bms: Sequence[int] = (18, 18, 18, 18, 18, 14),
+                 temps_per_bms: int = 7, seed: Optional[int] = None):
+        self.total_strings = total_strings
+        self.packets_per_string = packets_per_string
+        self.bms_per_packet = len(cells_per_bms)
+        self.temps_per_bms = temps_per_bms
+        self.frame_count = total_strings * packets_per_string * self.bms_per_packet
+        self.rng = np.random.default_rng(seed)
+
+        # Döngüden bağımsız kısımlar bir kez hesaplanır
+        self.can_ids = generate_can_ids(total_strings, packets_per_string, self.bms_per_packet)
+        self.cell_index, self.cell_mask = cell_slot_layout(cells_per_bms)
+        self.frames = np.zeros(self.frame_count, dtype=FRAME_DTYPE)
+        self.frames['varef'] = VAREF_RAW
+
+    def encode(self, state) -> np.ndarray:
+        """BMSSimulationState'ten tüm çerçeveleri buffer'a yaz, (N, 64) uint8 görünüm döndür"""
+        frames = self.frames
+        shape = (self.total_strings, self.packets_per_string, self.bms_per_packet)
+
+        temps_raw = temperatures_to_raw(state.temperatures)
+        frames['temps'] = temps_raw.reshape(shape + (self.temps_per_bms,)).reshape(-1, self.temps_per_bms)
+
+        cells_raw = voltages_to_raw(state.cell_voltages)[..., self.cell_index]
+        cells_raw[..., ~self.cell_mask] = 0  # Kullanılmayan hücre slotları
+        frames['cells'] = cells_raw.reshape(-1, CELL_SLOTS_PER_BMS)
+
+        frames['dgs'] = self.rng.integers(0, 256, (self.frame_count, 3), dtype=np.uint8)
+        frames['pressure'] = self.rng.uniform(1.0, 3.0, self.frame_count)
+        frames['current'] = np.repeat(state.currents.reshape(-1), self.bms_per_packet)
+        return self.frame_bytes()
+
+    def frame_bytes(self) -> np.ndarray:
+        """Buffer'ın kopyasız (N, 64) byte görünümü"""
+        return self.frames.view(np.uint8).reshape(self.frame_count, CAN_FD_FRAME_SIZE)
+
+FrameInput = Union[bytes, bytearray, memoryview, np.ndarray]
+
+def _scatter_registers(tab_registers, addresses: np.ndarray, registers: np.ndarray):
+    """
+    (high, low) çiftlerini yalnızca kendi adreslerine yaz; aradaki register'lara dokunulmaz
+    (aynı anda master'ın FC06 / FC10 ile yazdığı değerler geri alınmaz).
+    numpy bankada tek fancy-index ataması, liste bankada ardışık adres dizisi başına bir dilim ataması.
+    """
+    if addresses.size == 0:
+        return
+    indices = np.stack([addresses, addresses + 1], axis=1).reshape(-1)
+    values = registers.reshape(-1)
+    if isinstance(tab_registers, np.ndarray):
+        tab_registers[indices] = values
+        return
+    order = np.argsort(indices, kind='stable')
+    indices, values = indices[order], values[order].tolist()
+    breaks = (np.flatnonzero(np.diff(indices) != 1) + 1).tolist()
+    for first, last in zip([0] + breaks, breaks + [len(indices)]):
+        start = int(indices[first])
+        tab_registers[start:start + last - first] = values[first:last]
+
+class CANFrameDecoder:
+    def __init__(self, total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_bms: Sequence[int] = (18, 18, 18, 18, 18, 14),
+                 temps_per_bms: int = 7):
+        self.total_strings = total_strings
+        self.packets_per_string = packets_per_string
+        self.bms_per_packet = len(cells_per_bms)
+        self.temps_per_bms = temps_per_bms
+        self.cell_index, self.cell_mask = cell_slot_layout(cells_per_bms)
+
+        shape = (total_strings, packets_per_string)
+        self.cell_voltages = np.zeros(shape + (sum(cells_per_bms),))
+        self.temperatures = np.zeros(shape + (self.bms_per_packet * temps_per_bms,))
+        self.currents = np.zeros(shape)
+        self.pressures = np.zeros(shape)
+        self.cells_received = np.zeros(self.cell_voltages.shape, dtype=bool)
+        self.temps_received = np.zeros(self.temperatures.shape, dtype=bool)
+        # Son decode() çağrısında kabul edilen çerçevelerin (0 tabanlı) string / paket indeksleri
+        self.batch_strings = np.empty(0, dtype=np.intp)
+        self.batch_packets = np.empty(0, dtype=np.intp)
+        # Son decode() çağrısında saklanan değeri deadband'den fazla değişen noktalar
+        self.cells_changed = np.zeros(self.cell_voltages.shape, dtype=bool)
+        self.temps_changed = np.zeros(self.temperatures.shape, dtype=bool)
+        self.currents_changed = np.zeros(shape, dtype=bool)
+        # Ingest deadband'leri: saklanan değere göre bu kadar değişmeyen okumalar yazılmaz (0 = yalnızca aynı değer)
+        self.cell_deadband = 0.0      # V
+        self.temp_deadband = 0.0      # °C
+        self.current_deadband = 0.0   # A
+
+        # Register adresleri (BMSAddressCalculator ile) bir kez hesaplanır
+        self.cell_addresses = np.array([
+            [[BMSAddressCalculator.get_cell_voltage_address(s, p, c)
+              for c in range(1, self.cell_voltages.shape[2] + 1)]
+             for p in range(1, packets_per_string + 1)]
+            for s in range(1, total_strings + 1)], dtype=np.intp)
+        # Sıcaklık no -> (bms, sensör): her BMS'in 7 sensörü 8'lik register bloğuna yazılır
+        self.temp_addresses = np.array([
+            [[BMSAddressCalculator.get_temperature_address(s, p, (t - 1) // temps_per_bms + 1,
+                                                           (t - 1) % temps_per_bms + 1)
+              for t in range(1, self.temperatures.shape[2] + 1)]
+             for p in range(1, packets_per_string + 1)]
+            for s in range(1, total_strings + 1)], dtype=np.intp)
+        # Hücre bloğu (1016+) sıcaklık bloğu (7000+) ile çakışır; çakışan register'larda sıcaklık
+        # yazılmış olmalı (tam yazmadaki sıra). Hücre başına aynı adresteki sıcaklığın düz indeksi, yoksa -1
+        temp_flat = self.temp_addresses.reshape(-1)
+        order = np.argsort(temp_flat)
+        position = np.minimum(np.searchsorted(temp_flat[order], self.cell_addresses), len(order) - 1)
+        self.cell_temp_overlap = np.where(temp_flat[order][position] == self.cell_addresses, order[position], -1)
+
+    def set_deadbands(self, cell_voltage: float = 0.0, temperature: float = 0.0, current: float = 0.0):
+        """Nokta sınıfı başına ingest deadband'leri (V, °C, A)"""
+        self.cell_deadband = cell_voltage
+        self.temp_deadband = temperature
+        self.current_deadband = current
+
+    def decode(self, can_ids: np.ndarray, frames: FrameInput) -> int:
+        """Bir grup 64-byte çerçeveyi tek geçişte çöz, kabul edilen çerçeve sayısını döndür"""
+        if isinstance(frames, np.ndarray):
+            frames = np.ascontiguousarray(frames, dtype=np.uint8).reshape(-1)
+        records = np.frombuffer(frames, dtype=FRAME_DTYPE)
+        string_id, packet_id, bms_in_packet, response_bit = parse_can_ids(can_ids[:len(records)])
+
+        valid = ((response_bit == 1) &
+                 (string_id >= 1) & (string_id <= self.total_strings) &
+                 (packet_id >= 1) & (packet_id <= self.packets_per_string))
+        self.cells_changed[:] = False
+        self.temps_changed[:] = False
+        self.currents_changed[:] = False
+        if not valid.any():
+            self.batch_strings = self.batch_packets = np.empty(0, dtype=np.intp)
+            return 0
+        records = records[valid]
+        s = string_id[valid] - 1
+        p = packet_id[valid] - 1
+        self.batch_strings, self.batch_packets = s, p
+        b = bms_in_packet[valid] - 1
+
+        # Sıcaklıklar: (N, 7) -> paket içi global sensör indeksi
+        temp_index = b[:, None] * self.temps_per_bms + np.arange(self.temps_per_bms)
+        rows = np.broadcast_to(s[:, None], temp_index.shape)
+        cols = np.broadcast_to(p[:, None], temp_index.shape)
+        self._store(self.temperatures, self.temps_received, self.temps_changed, self.temp_deadband,
+                    (rows, cols, temp_index), raw_to_temperatures(records['temps']))
+
+        # Hücre voltajları: (N, 18) -> yalnızca geçerli slotlar (BMS 6: 14 hücre)
+        cell_index = self.cell_index[b]
+        mask = self.cell_mask[b]
+        rows = np.broadcast_to(s[:, None], mask.shape)[mask]
+        cols = np.broadcast_to(p[:, None], mask.shape)[mask]
+        self._store(self.cell_voltages, self.cells_received, self.cells_changed, self.cell_deadband,
+                    (rows, cols, cell_index[mask]), raw_to_voltages(records['cells'])[mask])
+
+        currents = records['current'].astype(np.float64)
+        moved = ~(np.abs(currents - self.currents[s, p]) <= self.current_deadband)
+        self.currents[s[moved], p[moved]] = currents[moved]
+        self.currents_changed[s[moved], p[moved]] = True
+        self.pressures[s, p] = records['pressure']
+        return int(valid.sum())
+
+    @staticmethod
+    def _store(values: np.ndarray, received: np.ndarray, changed: np.ndarray, deadband: float,
+               index: tuple, new_values: np.ndarray):
+        """İlk kez gelen veya saklanan değerden deadband'den fazla uzaklaşan noktaları yaz"""
+        moved = ~received[index] | ~(np.abs(new_values - values[index]) <= deadband)
+        index = tuple(axis[moved] for axis in index)
+        values[index] = new_values[moved]
+        received[index] = True
+        changed[index] = True
+
+    def changed_packets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Son decode()'da en az bir noktası değişen paketlerin (0 tabanlı) string / paket indeksleri"""
+        return np.nonzero(self.cells_changed.any(axis=2) | self.temps_changed.any(axis=2) |
+                          self.currents_changed)
+
+    def write_registers(self, tab_registers, full: bool = False):
+        """
+        Çözülmüş hücre ve sıcaklık değerlerini register bankasına yaz (32-bit float, 2 register).
+        Varsayılan olarak yalnızca son decode()'da değişen noktalar; full=True tüm alınmış noktalar.
+        """
+        cells = self.cells_received if full else self.cells_changed
+        temps = self.temps_received if full else self.temps_changed
+        if not full:
+            # Değişen hücrenin ezdiği (daha önce alınmış) sıcaklık da yeniden yazılır
+            overlap = self.cell_temp_overlap[cells]
+            overlap = overlap[overlap >= 0]
+            if overlap.size:
+                temps = temps.copy()
+                temps.reshape(-1)[overlap] |= self.temps_received.reshape(-1)[overlap]
+        # Hücreler önce, sıcaklıklar sonra yazılır (update_from_can_data ile aynı sıra)
+        _scatter_registers(tab_registers, self.cell_addresses[cells], floats_to_registers(self.cell_voltages[cells]))
+        _scatter_registers(tab_registers, self.temp_addresses[temps], floats_to_registers(self.temperatures[temps]))
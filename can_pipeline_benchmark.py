@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+CAN -> Modbus uçtan uca benchmark'ı (tek süreç, sanal CAN bus)
+
+  BMSSimulationState + CANFrameEncoder  --(VirtualCANTransport)-->  MegaBMSSlave.ingest_can_frames
+  --> tab_registers --> Modbus TCP --> ModbusMaster
+
+Her döngüde tüm çerçeveler yayınlanır ve String-1/Packet-1/Cell-1 değerinin
+Modbus üzerinden okunabilir olmasına kadar geçen süre ölçülür.
+
+KULLANIM:
+python3 can_pipeline_benchmark.py [--cycles 200] [--rate 20]
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from bms_slave import MegaBMSSlave
+from bms_simulation import BMSSimulationState
+from bms_register_map import BMSAddressCalculator
+from can_codec import CANFrameEncoder, voltages_to_raw, raw_to_voltages, floats_to_registers
+from can_transport import VirtualCANTransport
+from modbus import ModbusMaster
+
+def _serve_one_master(slave: MegaBMSSlave):
+    client_socket = slave.tcp_accept()
+    if not client_socket:
+        return
+    while True:
+        query = slave.receive(client_socket)
+        if not query:
+            break
+        slave.reply(client_socket, query)
+
+def run_benchmark(cycles: int = 200, rate: float = 20.0, port: int = 15021,
+                  channel: str = "bench-vcan", seed: int = 1) -> dict:
+    slave = MegaBMSSlave(port=port)
+    slave.verbose = False
+    slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000)
+    slave.initialize_mega_bms_data()
+    if not slave.tcp_listen():
+        raise RuntimeError("Slave soketi açılamadı")
+    threading.Thread(target=_serve_one_master, args=(slave,), daemon=True).start()
+
+    rx = VirtualCANTransport(channel)
+    slave.start_can_ingest(rx)
+    tx = VirtualCANTransport(channel)
+
+    state = BMSSimulationState(seed=seed)
+    encoder = CANFrameEncoder(seed=seed)
+    master = ModbusMaster()
+    if not master.connect("127.0.0.1", port):
+        raise RuntimeError("Master bağlanamadı")
+
+    address = BMSAddressCalculator.get_cell_voltage_address(1, 1, 1)
+    latencies = []
+    timeouts = 0
+    previous = None
+    period = 1.0 / rate if rate > 0 else 0.0
+    started = time.perf_counter()
+
+    try:
+        for _ in range(cycles):
+            cycle_start = time.perf_counter()
+            state.step()
+            frames = encoder.encode(state)
+            quantized = raw_to_voltages(voltages_to_raw(state.cell_voltages[0, 0, :1]))
+            expected = floats_to_registers(quantized)[0].tolist()
+
+            t0 = time.perf_counter()
+            tx.send_batch(encoder.can_ids, frames)
+            if expected != previous:
+                # Değer Modbus'ta görünene kadar yokla
+                while True:
+                    _, registers = master.read_holding_registers(address, 2)
+                    if registers == expected:
+                        latencies.append(time.perf_counter() - t0)
+                        break
+                    if time.perf_counter() - t0 > 1.0:
+                        timeouts += 1
+                        break
+            previous = expected
+
+            sleep_time = period - (time.perf_counter() - cycle_start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+    finally:
+        elapsed = time.perf_counter() - started
+        master.close()
+        slave.stop_can_ingest()
+        tx.close()
+        slave.close()
+
+    lat_ms = np.sort(np.array(latencies)) * 1e3 if latencies else np.zeros(1)
+    return {
+        "cycles": cycles,
+        "frames": cycles * encoder.frame_count,
+        "frames_per_s": cycles * encoder.frame_count / elapsed,
+        "latency_p50_ms": float(np.percentile(lat_ms, 50)),
+        "latency_p99_ms": float(np.percentile(lat_ms, 99)),
+        "latency_max_ms": float(lat_ms[-1]),
+        "timeouts": timeouts,
+        "dropped_frames": rx.dropped_frames,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="CAN -> Modbus uçtan uca benchmark")
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=20.0, help="Döngü frekansı (Hz)")
+    parser.add_argument("--port", type=int, default=15021)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.cycles, args.rate, args.port)
+    print("\n⏱️ CAN -> MODBUS UÇTAN UCA BENCHMARK")
+    print("=" * 60)
+    for name, value in results.items():
+        print(f"  {name:<20} {value:12.3f}" if isinstance(value, float) else f"  {name:<20} {value:12d}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
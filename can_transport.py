@@ -0,0 +1,179 @@
+"""
+CAN FD taşıma katmanı
+Simülatör çerçeveleri buraya yayınlar, slave tarafındaki çözücü toplu olarak okur.
+
+  VirtualCANTransport  : Süreç içi sanal bus (loopback), geliştirme makinesinde uçtan uca test
+  SocketCANTransport   : Linux socketcan (python-can gerekli, opsiyonel)
+
+Çerçeveler her zaman (can_ids, frames) ikilisi olarak taşınır:
+can_ids -> (N,) uint32, frames -> (N, 64) uint8
+Gönderirken data_length ile klasik 8 byte'lık çerçeveler de (ör. dengeleme komutları) yollanabilir.
+"""
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from can_codec import CAN_FD_FRAME_SIZE
+
+FrameBatch = Tuple[np.ndarray, np.ndarray]
+
+def _empty_batch() -> FrameBatch:
+    return np.empty(0, dtype=np.uint32), np.empty((0, CAN_FD_FRAME_SIZE), dtype=np.uint8)
+
+class CANTransport:
+    """Tüm backend'lerin ortak arayüzü"""
+
+    def send_batch(self, can_ids: np.ndarray, frames: np.ndarray,
+                   data_length: int = CAN_FD_FRAME_SIZE) -> int:
+        raise NotImplementedError
+
+    def recv_batch(self, max_frames: int = 288, timeout: Optional[float] = None) -> FrameBatch:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class VirtualCANBus:
+    """Aynı kanal adını kullanan tüm VirtualCANTransport'lar tek bus'ı paylaşır"""
+    _buses: Dict[str, "VirtualCANBus"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.lock = threading.Lock()
+        self.receivers: List["VirtualCANTransport"] = []
+
+    @classmethod
+    def get(cls, channel: str) -> "VirtualCANBus":
+        with cls._registry_lock:
+            bus = cls._buses.get(channel)
+            if bus is None:
+                bus = cls._buses[channel] = VirtualCANBus(channel)
+            return bus
+
+    def attach(self, transport: "VirtualCANTransport"):
+        with self.lock:
+            self.receivers.append(transport)
+
+    def detach(self, transport: "VirtualCANTransport"):
+        with self.lock:
+            if transport in self.receivers:
+                self.receivers.remove(transport)
+
+    def publish(self, sender: "VirtualCANTransport", batch: FrameBatch):
+        with self.lock:
+            receivers = list(self.receivers)
+        for receiver in receivers:
+            if receiver is not sender:  # Gerçek CAN gibi kendi mesajını almaz
+                receiver._enqueue(batch)
+
+class VirtualCANTransport(CANTransport):
+    def __init__(self, channel: str = "vcan0", max_queued_frames: int = 288 * 64):
+        self.bus = VirtualCANBus.get(channel)
+        self.max_queued_frames = max_queued_frames
+        self.queue = deque()  # (can_ids, frames, başlangıç ofseti)
+        self.queued_frames = 0
+        self.dropped_frames = 0
+        self.condition = threading.Condition()
+        self.bus.attach(self)
+
+    def _enqueue(self, batch: FrameBatch):
+        can_ids, frames = batch
+        with self.condition:
+            # Okuyucu yetişemezse en eski çerçeveler atılır (gerçek RX buffer taşması gibi)
+            while self.queue and self.queued_frames + len(can_ids) > self.max_queued_frames:
+                old_ids, _, start = self.queue.popleft()
+                self.queued_frames -= len(old_ids) - start
+                self.dropped_frames += len(old_ids) - start
+            self.queue.append((can_ids, frames, 0))
+            self.queued_frames += len(can_ids)
+            self.condition.notify()
+
+    def send_batch(self, can_ids: np.ndarray, frames: np.ndarray,
+                   data_length: int = CAN_FD_FRAME_SIZE) -> int:
+        """Çerçeveleri bus'a yayınla (buffer yeniden kullanılabilsin diye kopyalanır)"""
+        can_ids = np.array(can_ids, dtype=np.uint32)
+        frames = np.array(frames, dtype=np.uint8).reshape(-1, data_length)
+        if data_length < CAN_FD_FRAME_SIZE:
+            # Sanal bus kuyruğu sabit 64 byte'lıktır; kısa çerçeveler sıfırla doldurulur
+            frames = np.pad(frames, ((0, 0), (0, CAN_FD_FRAME_SIZE - data_length)))
+        self.bus.publish(self, (can_ids, frames))
+        return len(can_ids)
+
+    def recv_batch(self, max_frames: int = 288, timeout: Optional[float] = None) -> FrameBatch:
+        """En fazla max_frames çerçeveyi tek seferde al (timeout içinde hiç gelmezse boş)"""
+        with self.condition:
+            if not self.queue and not self.condition.wait_for(lambda: self.queue, timeout):
+                return _empty_batch()
+
+            id_parts, frame_parts = [], []
+            remaining = max_frames
+            while self.queue and remaining > 0:
+                can_ids, frames, start = self.queue[0]
+                end = min(len(can_ids), start + remaining)
+                id_parts.append(can_ids[start:end])
+                frame_parts.append(frames[start:end])
+                remaining -= end - start
+                if end == len(can_ids):
+                    self.queue.popleft()
+                else:
+                    self.queue[0] = (can_ids, frames, end)
+            self.queued_frames -= max_frames - remaining
+
+        if len(id_parts) == 1:
+            return id_parts[0], frame_parts[0]
+        return np.concatenate(id_parts), np.concatenate(frame_parts)
+
+    def close(self):
+        self.bus.detach(self)
+
+class SocketCANTransport(CANTransport):
+    def __init__(self, channel: str = "can0", bitrate: Optional[int] = None):
+        try:
+            import can  # python-can opsiyonel bağımlılık
+        except ImportError as e:
+            raise ImportError("SocketCANTransport için python-can gerekli: pip install python-can") from e
+        self.can = can
+        kwargs = {"bitrate": bitrate} if bitrate else {}
+        self.bus = can.interface.Bus(channel=channel, interface='socketcan', fd=True, **kwargs)
+        self.dropped_frames = 0
+
+    def send_batch(self, can_ids: np.ndarray, frames: np.ndarray,
+                   data_length: int = CAN_FD_FRAME_SIZE) -> int:
+        frames = np.asarray(frames, dtype=np.uint8).reshape(-1, data_length)
+        sent = 0
+        for can_id, data in zip(np.asarray(can_ids).tolist(), frames):
+            message = self.can.Message(arbitration_id=can_id, data=data.tobytes(),
+                                       is_extended_id=False, is_fd=data_length > 8)
+            try:
+                self.bus.send(message)
+                sent += 1
+            except self.can.CanError:
+                self.dropped_frames += 1
+        return sent
+
+    def recv_batch(self, max_frames: int = 288, timeout: Optional[float] = None) -> FrameBatch:
+        can_ids = np.empty(max_frames, dtype=np.uint32)
+        frames = np.zeros((max_frames, CAN_FD_FRAME_SIZE), dtype=np.uint8)
+        count = 0
+        message = self.bus.recv(timeout)
+        while message is not None:
+            if len(message.data) == CAN_FD_FRAME_SIZE:
+                can_ids[count] = message.arbitration_id
+                frames[count] = np.frombuffer(message.data, dtype=np.uint8)
+                count += 1
+                if count == max_frames:
+                    break
+            message = self.bus.recv(0)  # Kuyruktaki diğer çerçeveleri bekletmeden topla
+        return can_ids[:count], frames[:count]
+
+    def close(self):
+        self.bus.shutdown()
+
+def open_can_transport(kind: str = "virtual", channel: str = "vcan0", **kwargs) -> CANTransport:
+    """'virtual' veya 'socketcan' backend'ini oluştur"""
+    if kind == "virtual":
+        return VirtualCANTransport(channel, **kwargs)
+    if kind == "socketcan":
+        return SocketCANTransport(channel, **kwargs)
+    raise ValueError(f"Bilinmeyen CAN transport: {kind}")
@@ -0,0 +1,143 @@
+"""
+Paket başına hücre voltajı segment ağaçları (min / max ve argmin / argmax)
+Tüm paketlerin ağaçları tek (paket, 2 * yaprak) dizisinde tutulur.
+
+  update_cell()      : tek hücre, O(log n) (skaler yol)
+  update()           : k yaprak için O(k log n), vektörel (aynı seviyedeki düğümler birlikte)
+  min() / max()      : kök düğüm, O(1)
+  range_min/max()    : hücre aralığı (ör. tek BMS kartının 18 hücresi), O(log n)
+
+Veri gelmemiş hücreler yaprakta +inf / -inf olarak kalır ve sonuçlara girmez.
+"""
+from typing import Sequence, Tuple
+import numpy as np
+
+class CellExtremaTree:
+    def __init__(self, total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_bms: Sequence[int] = (18, 18, 18, 18, 18, 14)):
+        self.packets_per_string = packets_per_string
+        self.cells_per_packet = cells_per_packet = sum(cells_per_bms)
+        # BMS kartı başına paket içi (ilk, son) hücre no (1 tabanlı, dahil)
+        ends = np.cumsum(cells_per_bms)
+        self.bms_ranges = [(int(end - count + 1), int(end)) for count, end in zip(cells_per_bms, ends)]
+        self.size = 1 << (cells_per_packet - 1).bit_length()  # Yaprak sayısı (2'nin kuvveti)
+        packets = total_strings * packets_per_string
+        self.min_values = np.full((packets, 2 * self.size), np.inf)
+        self.max_values = np.full((packets, 2 * self.size), -np.inf)
+        # Her düğümde alt ağaçtaki min / max yaprağın hücre indeksi (0 tabanlı)
+        leaves = np.arange(self.size)
+        self.min_index = np.zeros((packets, 2 * self.size), dtype=np.intp)
+        self.max_index = np.zeros((packets, 2 * self.size), dtype=np.intp)
+        self.min_index[:, self.size:] = leaves
+        self.max_index[:, self.size:] = leaves
+        for node in range(self.size - 1, 0, -1):
+            self.min_index[:, node] = self.min_index[:, 2 * node]
+            self.max_index[:, node] = self.max_index[:, 2 * node]
+
+    def _row(self, string_no: int, packet_no: int) -> int:
+        return (string_no - 1) * self.packets_per_string + (packet_no - 1)
+
+    def update_cell(self, string_no: int, packet_no: int, cell_no: int, voltage: float):
+        """Tek hücre güncellemesi; numpy çağrı maliyeti olmadan kökten yaprağa 7 adım"""
+        row = self._row(string_no, packet_no)
+        min_values, max_values = self.min_values[row], self.max_values[row]
+        min_index, max_index = self.min_index[row], self.max_index[row]
+        node = cell_no - 1 + self.size
+        min_values[node] = max_values[node] = voltage
+        node >>= 1
+        while node:
+            left, right = 2 * node, 2 * node + 1
+            if min_values[left] <= min_values[right]:
+                min_values[node], min_index[node] = min_values[left], min_index[left]
+            else:
+                min_values[node], min_index[node] = min_values[right], min_index[right]
+            if max_values[left] >= max_values[right]:
+                max_values[node], max_index[node] = max_values[left], max_index[left]
+            else:
+                max_values[node], max_index[node] = max_values[right], max_index[right]
+            node >>= 1
+
+    def update(self, string_index: np.ndarray, packet_index: np.ndarray,
+               cell_index: np.ndarray, voltages: np.ndarray):
+        """0 tabanlı (string, paket, hücre) üçlülerinin voltajlarını yaz ve yukarı doğru düzelt"""
+        rows = np.asarray(string_index) * self.packets_per_string + np.asarray(packet_index)
+        nodes = np.asarray(cell_index) + self.size
+        self.min_values[rows, nodes] = voltages
+        self.max_values[rows, nodes] = voltages
+
+        while nodes.size and nodes[0] > 1:
+            # Aynı ebeveyne çıkan yapraklar tek kez hesaplanır
+            keys = np.unique(rows * (2 * self.size) + nodes // 2)
+            rows, nodes = np.divmod(keys, 2 * self.size)
+            left, right = 2 * nodes, 2 * nodes + 1
+
+            left_min, right_min = self.min_values[rows, left], self.min_values[rows, right]
+            take_left = left_min <= right_min
+            self.min_values[rows, nodes] = np.where(take_left, left_min, right_min)
+            self.min_index[rows, nodes] = np.where(take_left, self.min_index[rows, left], self.min_index[rows, right])
+
+            left_max, right_max = self.max_values[rows, left], self.max_values[rows, right]
+            take_left = left_max >= right_max
+            self.max_values[rows, nodes] = np.where(take_left, left_max, right_max)
+            self.max_index[rows, nodes] = np.where(take_left, self.max_index[rows, left], self.max_index[rows, right])
+
+    def update_packets(self, cell_voltages: np.ndarray, mask: np.ndarray):
+        """(string, paket, hücre) dizisinden mask True olan hücreleri güncelle"""
+        string_index, packet_index, cell_index = np.nonzero(mask)
+        if len(cell_index):
+            self.update(string_index, packet_index, cell_index,
+                        cell_voltages[string_index, packet_index, cell_index])
+
+    def min(self, string_no: int, packet_no: int) -> Tuple[int, float]:
+        """(hücre no 1 tabanlı, voltaj); veri yoksa (0, inf)"""
+        row = self._row(string_no, packet_no)
+        value = self.min_values[row, 1]
+        return (int(self.min_index[row, 1]) + 1 if np.isfinite(value) else 0), float(value)
+
+    def max(self, string_no: int, packet_no: int) -> Tuple[int, float]:
+        row = self._row(string_no, packet_no)
+        value = self.max_values[row, 1]
+        return (int(self.max_index[row, 1]) + 1 if np.isfinite(value) else 0), float(value)
+
+    def spread(self, string_no: int, packet_no: int) -> float:
+        row = self._row(string_no, packet_no)
+        return float(self.max_values[row, 1] - self.min_values[row, 1])
+
+    def all_min(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Tüm paketler için (hücre indeksleri 0 tabanlı, voltajlar), şekil (string, paket)"""
+        shape = (-1, self.packets_per_string)
+        return self.min_index[:, 1].reshape(shape), self.min_values[:, 1].reshape(shape)
+
+    def all_max(self) -> Tuple[np.ndarray, np.ndarray]:
+        shape = (-1, self.packets_per_string)
+        return self.max_index[:, 1].reshape(shape), self.max_values[:, 1].reshape(shape)
+
+    def _range(self, values: np.ndarray, index: np.ndarray, row: int, first_cell: int, last_cell: int,
+               better) -> Tuple[int, float]:
+        best_value, best_index = None, 0
+        low, high = first_cell - 1 + self.size, last_cell + self.size  # [low, high)
+        while low < high:
+            for node in ((low,) if low & 1 else ()) + ((high - 1,) if high & 1 else ()):
+                if best_value is None or better(values[row, node], best_value):
+                    best_value, best_index = values[row, node], index[row, node]
+            low = (low + 1) >> 1
+            high >>= 1
+        if best_value is None or not np.isfinite(best_value):
+            return 0, float(best_value if best_value is not None else np.nan)
+        return int(best_index) + 1, float(best_value)
+
+    def range_min(self, string_no: int, packet_no: int, first_cell: int, last_cell: int) -> Tuple[int, float]:
+        """[first_cell, last_cell] (1 tabanlı, dahil) aralığındaki en düşük hücre"""
+        return self._range(self.min_values, self.min_index, self._row(string_no, packet_no),
+                           first_cell, last_cell, lambda a, b: a < b)
+
+    def range_max(self, string_no: int, packet_no: int, first_cell: int, last_cell: int) -> Tuple[int, float]:
+        return self._range(self.max_values, self.max_index, self._row(string_no, packet_no),
+                           first_cell, last_cell, lambda a, b: a > b)
+
+    def bms_min(self, string_no: int, packet_no: int, bms_no: int) -> Tuple[int, float]:
+        """Tek BMS kartındaki en düşük hücre (hücre no paket içi, 1 tabanlı)"""
+        return self.range_min(string_no, packet_no, *self.bms_ranges[bms_no - 1])
+
+    def bms_max(self, string_no: int, packet_no: int, bms_no: int) -> Tuple[int, float]:
+        return self.range_max(string_no, packet_no, *self.bms_ranges[bms_no - 1])
@@ -0,0 +1,163 @@
+"""
+Değişiklik aboneliği (report-by-exception)
+Master'lar 10k hücre / sıcaklık register'ını taramak yerine "şu sıradan beri değişenler" bloğunu okur.
+
+Her noktanın en son bildirilen değeri tutulur; yeni değer bundan deadband kadar uzaklaşınca
+nokta yeni bir sıra numarası alır (her değişen nokta ayrı numara, böylece sayfalama kayıpsızdır).
+Aynı nokta tekrar değişirse eski numarası yenisiyle değişir: master her zaman son değeri alır.
+
+Modbus erişimi (BMSChangeFeed): FC 0x17 ile CURSOR'a imleç (+ EPOCH) yazılır ve aynı istekte BLOCK_BASE okunur
+(ChangeFeedRegisters, FC 0x17 adres alanında bu aralıkların deposudur; reply() içinde akışa özel dal yoktur)
+  +0..1 sonraki imleç (u32) | +2 kayıt sayısı | +3 bayraklar (FEED_MORE, FEED_RESYNC) | +4 dönem
+  kayıt başına 3 register: nokta no, değer (32-bit float)
+İmleç 0 ilk senkronizasyondur (verisi olan tüm noktalar).
+Dönem (epoch) her açılışta rastgele seçilir; master'ın gönderdiği dönem farklıysa slave yeniden
+başlamıştır ve imleç ne olursa olsun yanıt baştan tam senkronizasyondur (FEED_RESYNC).
+"""
+import os
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from address_map import AddressSpace
+from bms_register_map import BMSChangeFeed
+from can_codec import floats_to_registers
+from modbus_core import MAX_READ_REGISTERS
+
+FEED_MORE = 0x01     # Yanıta sığmayan değişiklik var, dönen imleçle tekrar okunmalı
+FEED_RESYNC = 0x02   # İmleç geçersiz (slave yeniden başladı): yanıt baştan tam senkronizasyondur
+
+class ChangeFeed:
+    def __init__(self, cell_deadband: float = 0.002, temp_deadband: float = 0.5,
+                 total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_packet: int = 104, temps_per_packet: int = 42):
+        self.cell_points = total_strings * packets_per_string * cells_per_packet
+        self.temp_points = total_strings * packets_per_string * temps_per_packet
+        points = self.cell_points + self.temp_points
+        self.deadband = np.empty(points, dtype=np.float32)
+        self.set_deadbands(cell_deadband, temp_deadband)
+        self.reported = np.full(points, np.nan, dtype=np.float32)  # Son bildirilen değer
+        self.change_sequence = np.zeros(points, dtype=np.uint64)  # 0 = hiç bildirilmedi
+        self.sequence = 0  # Son verilen sıra numarası
+        self.epoch = int.from_bytes(os.urandom(2), 'big') or 1  # Açılış dönemi (0 master'da "bilinmiyor")
+        self.lock = threading.Lock()
+
+    def set_deadbands(self, cell_deadband: float, temp_deadband: float):
+        """Hücre (V) ve sıcaklık (°C) bildirim eşikleri"""
+        self.deadband[:self.cell_points] = cell_deadband
+        self.deadband[self.cell_points:] = temp_deadband
+
+    def update(self, cell_voltages: np.ndarray, temperatures: np.ndarray,
+               cells_mask: np.ndarray, temps_mask: np.ndarray) -> int:
+        """Deadband'i aşan noktalara yeni sıra numarası ver; değişen nokta sayısı"""
+        values = np.concatenate([cell_voltages.reshape(-1), temperatures.reshape(-1)]).astype(np.float32)
+        mask = np.concatenate([cells_mask.reshape(-1), temps_mask.reshape(-1)])
+        with self.lock:
+            # Hiç bildirilmemiş (NaN) noktalar karşılaştırmada False döner, ilk değer her zaman bildirilir
+            moved = mask & ~(np.abs(values - self.reported) < self.deadband)
+            points = np.flatnonzero(moved)
+            if len(points):
+                self.change_sequence[points] = self.sequence + 1 + np.arange(len(points), dtype=np.uint64)
+                self.sequence += len(points)
+                self.reported[points] = values[points]
+        return len(points)
+
+    def _full_cursor(self, cursor: int) -> int:
+        """Teldeki 32-bit imleci 64-bit iç sıraya genişlet"""
+        full = (self.sequence & ~0xFFFFFFFF) | cursor
+        if full > self.sequence:
+            full -= 1 << 32
+        return full
+
+    def changes_since(self, cursor: int, limit: int,
+                      epoch: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, int, int]:
+        """(nokta no'lar, değerler, sonraki imleç (u32), bayraklar); imleç 32-bit, epoch None = kontrol yok"""
+        with self.lock:
+            flags = 0
+            start = self._full_cursor(cursor)
+            # Başka açılışta alınmış imleç ya da slave'in henüz vermediği imleç
+            if start < 0 or (cursor and epoch is not None and epoch != self.epoch):
+                start, flags = 0, FEED_RESYNC
+            candidates = np.flatnonzero(self.change_sequence > start)
+            points = candidates[np.argsort(self.change_sequence[candidates])]
+            if len(points) > limit:
+                flags |= FEED_MORE
+                points = points[:limit]
+            values = self.reported[points]
+            if not flags & FEED_MORE:
+                next_sequence = self.sequence
+            else:
+                next_sequence = int(self.change_sequence[points[-1]]) if len(points) else start
+        return points, values, next_sequence & 0xFFFFFFFF, flags
+
+    def encode_block(self, cursor: int, register_count: int, epoch: Optional[int] = None) -> List[int]:
+        """FC 0x17 yanıtı için register_count register'lık blok"""
+        limit = max(0, (register_count - BMSChangeFeed.HEADER_SIZE) // BMSChangeFeed.ENTRY_SIZE)
+        points, values, next_cursor, flags = self.changes_since(cursor, limit, epoch)
+        block = np.zeros(max(register_count, BMSChangeFeed.HEADER_SIZE), dtype=np.uint16)
+        block[0], block[1] = next_cursor >> 16, next_cursor & 0xFFFF
+        block[2] = len(points)
+        block[3] = flags
+        block[4] = self.epoch
+        entries = np.empty((len(points), BMSChangeFeed.ENTRY_SIZE), dtype=np.uint16)
+        entries[:, 0] = points
+        entries[:, 1:] = floats_to_registers(values)
+        block[BMSChangeFeed.HEADER_SIZE:BMSChangeFeed.HEADER_SIZE + entries.size] = entries.reshape(-1)
+        return block[:register_count].tolist()
+
+class ChangeFeedRegisters:
+    """
+    CURSOR .. BLOCK_BASE + 125 aralığının hesaplanmış deposu (indeks = adres - CURSOR).
+    0-2'ye yazılan imleç / dönem bankaya değil isteği işleyen thread'e kaydedilir (her master kendi
+    imlecini taşır); BLOCK_OFFSET'ten itibaren okuma o imleçle encode_block üretir ve kaydı tüketir.
+    Dönem yazılmadan yalnızca imleç yazılırsa (eski istemci) dönem kontrolü yapılmaz.
+    """
+    HEADER_REGISTERS = 3                                            # CURSOR_HIGH, CURSOR_LOW, EPOCH
+    BLOCK_OFFSET = BMSChangeFeed.BLOCK_BASE - BMSChangeFeed.CURSOR
+
+    def __init__(self, feed: ChangeFeed):
+        self.feed = feed
+        self.local = threading.local()
+
+    def __len__(self) -> int:
+        return self.BLOCK_OFFSET + MAX_READ_REGISTERS
+
+    def _header(self) -> list:
+        header = getattr(self.local, 'header', None)
+        return [0, 0, None] if header is None else header
+
+    def __setitem__(self, key: slice, values):
+        start, stop, _ = key.indices(len(self))
+        header = self._header()
+        if start < 2:  # İmleç yeniden yazıldı: dönem bu istekte yazılmadıysa bilinmiyor
+            header[2] = None
+        for index, value in zip(range(start, min(stop, self.HEADER_REGISTERS)), values):
+            header[index] = int(value)
+        self.local.header = header
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        start, stop, _ = key.indices(len(self))
+        if start < self.BLOCK_OFFSET:  # İmleç register'ları: bu thread'in son yazdığı değerler
+            header = self._header()
+            return np.array([value or 0 for value in header[start:stop]], dtype=np.uint16)
+        header = self._header()
+        self.local.header = None
+        block = self.feed.encode_block((header[0] << 16) | header[1], stop - self.BLOCK_OFFSET, header[2])
+        return np.array(block[start - self.BLOCK_OFFSET:], dtype=np.uint16)
+
+def change_feed_space(space: AddressSpace, feed: ChangeFeed) -> AddressSpace:
+    """FC 0x17 holding alanının kopyası; imleç ve blok aralıkları feed'e bağlı (FC 0x03 bankayı okumaya devam eder)"""
+    store = ChangeFeedRegisters(feed)
+    space = space.overlay(BMSChangeFeed.CURSOR, store.HEADER_REGISTERS, store, 0, "change_feed")
+    return space.overlay(BMSChangeFeed.BLOCK_BASE, MAX_READ_REGISTERS, store, store.BLOCK_OFFSET, "change_feed")
+
+def describe_point(point: int, total_strings: int = 12, packets_per_string: int = 4,
+                   cells_per_packet: int = 104, temps_per_packet: int = 42) -> Tuple[str, int, int, int]:
+    """Nokta no -> ('cell' / 'temp', string no, paket no, hücre / sensör no)"""
+    cell_points = total_strings * packets_per_string * cells_per_packet
+    if point < cell_points:
+        kind, per_packet = "cell", cells_per_packet
+    else:
+        kind, per_packet, point = "temp", temps_per_packet, point - cell_points
+    packet, index = divmod(point, per_packet)
+    string_index, packet_index = divmod(packet, packets_per_string)
+    return kind, string_index + 1, packet_index + 1, index + 1
@@ -0,0 +1,74 @@
+"""
+Nokta grubu başına zaman damgası / kalite deposu
+Register bankasının yanında tutulur; her ingest ilgili grupları işaretler,
+kalite (GOOD / STALE / NO_DATA / SIMULATED) okuma anında yaşa göre hesaplanır.
+
+Gruplar (BMSPointGroups):
+  0       : Ana veriler
+  1-48    : String/paket başına hücre voltajları
+  49-96   : String/paket başına sıcaklıklar
+
+Register yerleşimi (BMSDiagnostics.QUALITY_BASE + grup * 4):
+  +0 kalite, +1 yaş (s, 65535'te doyar), +2/+3 son güncelleme (u32 unix s)
+"""
+import time
+from typing import Optional, Tuple
+import numpy as np
+from bms_register_map import BMSPointGroups, BMSDiagnostics, DataQuality
+
+REGISTERS_PER_GROUP = 4
+MAX_AGE_REGISTER = 0xFFFF
+
+class PointQualityStore:
+    def __init__(self, stale_after: float = 5.0, packets_per_string: int = 4):
+        self.stale_after = stale_after
+        self.packets_per_string = packets_per_string
+        self.timestamps = np.zeros(BMSPointGroups.COUNT)  # 0 -> hiç güncellenmedi
+        self.simulated = np.zeros(BMSPointGroups.COUNT, dtype=bool)
+
+    def mark(self, groups, timestamp: Optional[float] = None, simulated: bool = False):
+        """Grup(lar)ı güncellendi olarak işaretle"""
+        self.timestamps[groups] = time.time() if timestamp is None else timestamp
+        self.simulated[groups] = simulated
+
+    def mark_packets(self, string_index, packet_index, timestamp: Optional[float] = None,
+                     cells: bool = True, temps: bool = True, simulated: bool = False):
+        """0 tabanlı string / paket indekslerine karşılık gelen hücre ve/veya sıcaklık gruplarını işaretle"""
+        offset = np.asarray(string_index) * self.packets_per_string + np.asarray(packet_index)
+        if cells:
+            self.mark(BMSPointGroups.CELLS_BASE + offset, timestamp, simulated)
+        if temps:
+            self.mark(BMSPointGroups.TEMPS_BASE + offset, timestamp, simulated)
+
+    def qualities(self, now: Optional[float] = None) -> np.ndarray:
+        now = time.time() if now is None else now
+        quality = np.full(BMSPointGroups.COUNT, DataQuality.GOOD, dtype=np.uint16)
+        quality[now - self.timestamps > self.stale_after] = DataQuality.STALE
+        quality[self.simulated] = DataQuality.SIMULATED
+        quality[self.timestamps == 0] = DataQuality.NO_DATA
+        return quality
+
+    def status(self, group: int, now: Optional[float] = None) -> Tuple[DataQuality, float, float]:
+        """(kalite, yaş s, zaman damgası) — hiç güncellenmemiş grupta yaş inf"""
+        now = time.time() if now is None else now
+        timestamp = float(self.timestamps[group])
+        age = now - timestamp if timestamp else float("inf")
+        return DataQuality(int(self.qualities(now)[group])), age, timestamp
+
+    def encode_registers(self, now: Optional[float] = None) -> np.ndarray:
+        """(COUNT * 4,) uint16 register bloğu"""
+        now = time.time() if now is None else now
+        block = np.zeros((BMSPointGroups.COUNT, REGISTERS_PER_GROUP), dtype=np.uint16)
+        ages = np.clip(now - self.timestamps, 0, MAX_AGE_REGISTER)
+        ages[self.timestamps == 0] = MAX_AGE_REGISTER
+        stamps = self.timestamps.astype(np.uint32)
+        block[:, 0] = self.qualities(now)
+        block[:, 1] = ages.astype(np.uint16)
+        block[:, 2] = stamps >> 16
+        block[:, 3] = stamps & 0xFFFF
+        return block.reshape(-1)
+
+    def write_registers(self, tab_registers, now: Optional[float] = None):
+        base = BMSDiagnostics.QUALITY_BASE
+        block = self.encode_registers(now)
+        tab_registers[base:base + len(block)] = block.tolist()
@@ -9,11 +9,12 @@ BMS verilerini simüle eder.
 Referans: balanslamamain.py ve temperature_page.py
 
 KULLANIM:
-python3 fake_can_simulator.py
+python3 fake_can_simulator.py [--interval 0.1] [--strings 12] [--packets 4]
 ================================================================================
 """
 
 import time
+import math
 import random
 import struct
 import threading
@@ -22,27 +23,31 @@ from datetime import datetime
 import socket
 import json
 import os
+import argparse
+from bms_simulation import BMSSimulationState
+from can_codec import CANFrameEncoder
 
 class CANMessageSimulator:
-    def __init__(self):
+    def __init__(self, total_strings=12, packets_per_string=4, update_interval=2.0, seed=None, transport=None):
         self.running = False
-        self.update_interval = 2.0  # 2 saniyede bir güncelle
+        self.transport = transport  # can_transport.CANTransport (None: çerçeveler sadece üretilir)
+        self.update_interval = update_interval  # Varsayılan: 2 saniyede bir güncelle
         self.data_file = "bms_data.json"  # Veri dosyası
         
         # BMS Sistem Yapısı
-        self.TOTAL_STRINGS = 12
-        self.PACKETS_PER_STRING = 4  
+        self.TOTAL_STRINGS = total_strings
+        self.PACKETS_PER_STRING = packets_per_string
         self.BMS_PER_PACKET = 6
         self.CELLS_PER_BMS = [18, 18, 18, 18, 18, 14]  # BMS 1-5: 18 hücre, BMS 6: 14 hücre
         self.TEMPS_PER_BMS = 7  # Her BMS'te 7 sıcaklık sensörü
         
-        # Simülasyon Verileri
-        self.cell_voltages = {}  # {(string, packet, global_cell): voltage}
-        self.temperatures = {}   # {(string, packet, global_temp): celsius}
-        self.soc_values = {}     # {(string, packet): soc_percent}
-        self.soh_values = {}     # {(string, packet): soh_percent}
-        self.currents = {}       # {(string, packet): current_amps}
-        self.pack_voltages = {}  # {(string, packet): total_voltage}
+        # Simülasyon Verileri (string × paket × hücre/sensör matrisleri, bkz. bms_simulation.py)
+        self.state = BMSSimulationState(self.TOTAL_STRINGS, self.PACKETS_PER_STRING,
+                                        self.CELLS_PER_BMS, self.TEMPS_PER_BMS, seed=seed)
+        
+        # Döngü başına tüm çerçeveleri tek buffer'a yazan toplu kodlayıcı (CAN ID'ler önceden hesaplı)
+        self.encoder = CANFrameEncoder(self.TOTAL_STRINGS, self.PACKETS_PER_STRING,
+                                       self.CELLS_PER_BMS, self.TEMPS_PER_BMS, seed=seed)
         
         # Başlangıç değerlerini oluştur
         self.initialize_fake_data()
@@ -68,37 +73,7 @@ class CANMessageSimulator:
     def initialize_fake_data(self):
         """Başlangıç sahte verilerini oluştur"""
         print("🔧 Sahte veriler başlatılıyor...")
-        
-        for string_id in range(1, self.TOTAL_STRINGS + 1):
-            for packet_id in range(1, self.PACKETS_PER_STRING + 1):
-                
-                # Ana sistem parametreleri
-                self.soc_values[(string_id, packet_id)] = random.uniform(80.0, 95.0)
-                self.soh_values[(string_id, packet_id)] = random.uniform(95.0, 99.5)
-                self.currents[(string_id, packet_id)] = random.uniform(-100.0, 50.0)
-                
-                # Hücre voltajları
-                cell_count = 0
-                total_voltage = 0.0
-                
-                for bms_id in range(1, self.BMS_PER_PACKET + 1):
-                    cells_in_bms = self.CELLS_PER_BMS[bms_id - 1]
-                    
-                    for cell_in_bms in range(1, cells_in_bms + 1):
-                        cell_count += 1
-                        base_voltage = random.uniform(3.65, 3.75)
-                        self.cell_voltages[(string_id, packet_id, cell_count)] = base_voltage
-                        total_voltage += base_voltage
-                
-                self.pack_voltages[(string_id, packet_id)] = total_voltage
-                
-                # Sıcaklık sensörleri
-                temp_count = 0
-                for bms_id in range(1, self.BMS_PER_PACKET + 1):
-                    for temp_sensor in range(1, self.TEMPS_PER_BMS + 1):
-                        temp_count += 1
-                        base_temp = random.uniform(20.0, 35.0)
-                        self.temperatures[(string_id, packet_id, temp_count)] = base_temp
+        self.state.initialize()
 
     def voltage_to_bytes(self, voltage):
         """Voltajı CAN formatındaki byte'lara çevir (reverse engineering)"""
@@ -121,7 +96,6 @@ class CANMessageSimulator:
             # math.log(10000 / ntc) = (1 / 298.15 - 1 / t_kelvin) * 4100
             log_ratio = (1 / 298.15 - 1 / t_kelvin) * 4100
             # 10000 / ntc = exp(log_ratio) -> ntc = 10000 / exp(log_ratio)
-            import math
             ntc = 10000 / math.exp(log_ratio)
             # ntc = volt * 10000 / (3 - volt) -> volt = 3 * ntc / (ntc + 10000)
             volt = 3 * ntc / (ntc + 10000)
@@ -140,13 +114,8 @@ class CANMessageSimulator:
         temp_offset = 0
         for temp_sensor in range(1, self.TEMPS_PER_BMS + 1):
             global_temp_index = (bms_in_packet - 1) * self.TEMPS_PER_BMS + temp_sensor
-            temp_key = (string_id, packet_id, global_temp_index)
-            
-            if temp_key in self.temperatures:
-                temp_celsius = self.temperatures[temp_key]
-                temp_bytes = self.temp_to_voltage_bytes(temp_celsius)
-            else:
-                temp_bytes = [0x00, 0x00]
+            temp_celsius = self.state.temperature(string_id, packet_id, global_temp_index)
+            temp_bytes = self.temp_to_voltage_bytes(temp_celsius)
             
             data[temp_offset] = temp_bytes[1]      # Low byte
             data[temp_offset + 1] = temp_bytes[0]  # High byte
@@ -169,13 +138,8 @@ class CANMessageSimulator:
         for cell_index in range(1, 19):  # Her zaman 18 slot var
             if cell_index <= cells_in_bms:
                 global_cell_number = bms_offset + cell_index
-                cell_key = (string_id, packet_id, global_cell_number)
-                
-                if cell_key in self.cell_voltages:
-                    voltage = self.cell_voltages[cell_key]
-                    voltage_bytes = self.voltage_to_bytes(voltage)
-                else:
-                    voltage_bytes = [0x00, 0x00]
+                voltage = self.state.cell_voltage(string_id, packet_id, global_cell_number)
+                voltage_bytes = self.voltage_to_bytes(voltage)
             else:
                 voltage_bytes = [0x00, 0x00]  # Kullanılmayan hücre slotları
             
@@ -198,11 +162,7 @@ class CANMessageSimulator:
             data[56 + i] = b
         
         # Current (4 byte float)
-        current_key = (string_id, packet_id)
-        if current_key in self.currents:
-            current_value = self.currents[current_key]
-        else:
-            current_value = 0.0
+        current_value = float(self.state.currents[string_id - 1, packet_id - 1])
         current_bytes = struct.pack('f', current_value)
         for i, b in enumerate(current_bytes):
             data[60 + i] = b
@@ -224,62 +184,8 @@ class CANMessageSimulator:
         return can_id
 
     def update_simulation_data(self):
-        """Simülasyon verilerini güncelle (gerçekçi değişimler)"""
-        
-        for string_id in range(1, self.TOTAL_STRINGS + 1):
-            for packet_id in range(1, self.PACKETS_PER_STRING + 1):
-                
-                # SOC azalması (şarj tükenmesi simülasyonu)
-                soc_key = (string_id, packet_id)
-                if soc_key in self.soc_values:
-                    self.soc_values[soc_key] = max(10.0, 
-                        self.soc_values[soc_key] - random.uniform(0.1, 0.3))
-                
-                # SOH çok yavaş azalması
-                soh_key = (string_id, packet_id)
-                if soh_key in self.soh_values:
-                    self.soh_values[soh_key] = max(90.0,
-                        self.soh_values[soh_key] - random.uniform(0.001, 0.01))
-                
-                # Akım değişimi
-                current_key = (string_id, packet_id)
-                if current_key in self.currents:
-                    current_change = random.uniform(-5.0, 5.0)
-                    self.currents[current_key] = max(-200.0, min(100.0,
-                        self.currents[current_key] + current_change))
-                
-                # Hücre voltajları (küçük değişimler)
-                cell_count = 0
-                total_voltage = 0.0
-                
-                for bms_id in range(1, self.BMS_PER_PACKET + 1):
-                    cells_in_bms = self.CELLS_PER_BMS[bms_id - 1]
-                    
-                    for cell_in_bms in range(1, cells_in_bms + 1):
-                        cell_count += 1
-                        cell_key = (string_id, packet_id, cell_count)
-                        
-                        if cell_key in self.cell_voltages:
-                            voltage_change = random.uniform(-0.01, 0.01)
-                            new_voltage = self.cell_voltages[cell_key] + voltage_change
-                            new_voltage = max(3.0, min(4.2, new_voltage))
-                            self.cell_voltages[cell_key] = new_voltage
-                            total_voltage += new_voltage
-                
-                self.pack_voltages[(string_id, packet_id)] = total_voltage
-                
-                # Sıcaklık değişimleri
-                temp_count = 0
-                for bms_id in range(1, self.BMS_PER_PACKET + 1):
-                    for temp_sensor in range(1, self.TEMPS_PER_BMS + 1):
-                        temp_count += 1
-                        temp_key = (string_id, packet_id, temp_count)
-                        
-                        if temp_key in self.temperatures:
-                            temp_change = random.uniform(-1.0, 2.0)
-                            new_temp = self.temperatures[temp_key] + temp_change
-                            new_temp = max(0.0, min(80.0, new_temp))
-                            self.temperatures[temp_key] = new_temp
+        """Simülasyon verilerini güncelle (gerçekçi değişimler, vektörel)"""
+        self.state.step()
 
     def save_data_to_file(self):
         """BMS verilerini JSON dosyasına kaydet - TAM İSKELET YAPISI"""
@@ -288,6 +194,12 @@ class CANMessageSimulator:
             ref_string = 1
             ref_packet = 1
             
+            state = self.state
+            temps = state.temperatures
+            cells = state.cell_voltages
+            nonzero_temps = temps[temps != 0]
+            nonzero_cells = cells[cells != 0]
+            
             bms_data = {
                 "timestamp": datetime.now().isoformat(),
                 "system_info": {
@@ -297,16 +209,16 @@ class CANMessageSimulator:
                     "total_temps": self.calculate_total_temps()
                 },
                 "main_data": {
-                    "soc": self.soc_values.get((ref_string, ref_packet), 85.0),
-                    "soh": self.soh_values.get((ref_string, ref_packet), 98.0),
-                    "current": self.currents.get((ref_string, ref_packet), -50.0),
-                    "pack_voltage": self.pack_voltages.get((ref_string, ref_packet), 400.0),
-                    "max_temperature": max([temp for temp in self.temperatures.values() if temp], default=25.0),
-                    "min_temperature": min([temp for temp in self.temperatures.values() if temp], default=20.0),
-                    "avg_temperature": sum(self.temperatures.values()) / len(self.temperatures) if self.temperatures else 25.0,
-                    "max_cell_voltage": max([volt for volt in self.cell_voltages.values() if volt], default=3.7),
-                    "min_cell_voltage": min([volt for volt in self.cell_voltages.values() if volt], default=3.6),
-                    "avg_cell_voltage": sum(self.cell_voltages.values()) / len(self.cell_voltages) if self.cell_voltages else 3.65
+                    "soc": float(state.soc[ref_string - 1, ref_packet - 1]),
+                    "soh": float(state.soh[ref_string - 1, ref_packet - 1]),
+                    "current": float(state.currents[ref_string - 1, ref_packet - 1]),
+                    "pack_voltage": float(state.pack_voltages[ref_string - 1, ref_packet - 1]),
+                    "max_temperature": float(nonzero_temps.max()) if nonzero_temps.size else 25.0,
+                    "min_temperature": float(nonzero_temps.min()) if nonzero_temps.size else 20.0,
+                    "avg_temperature": float(temps.mean()) if temps.size else 25.0,
+                    "max_cell_voltage": float(nonzero_cells.max()) if nonzero_cells.size else 3.7,
+                    "min_cell_voltage": float(nonzero_cells.min()) if nonzero_cells.size else 3.6,
+                    "avg_cell_voltage": float(cells.mean()) if cells.size else 3.65
                 },
                 "cell_voltages": {},
                 "temperatures": {},
@@ -314,42 +226,39 @@ class CANMessageSimulator:
             }
             
             # ✅ TAM İSKELET: BÜTÜN HÜCRELERİ OLUŞTUR (12 String × 4 Paket × 104 Hücre = 4,992 hücre)
+            cell_values = cells.tolist()
             for string_id in range(1, self.TOTAL_STRINGS + 1):  # 1-12 string
                 for packet_id in range(1, self.PACKETS_PER_STRING + 1):  # 1-4 paket
+                    packet_cells = cell_values[string_id - 1][packet_id - 1]
                     for cell_id in range(1, 105):  # 1-104 hücre (tam iskelet!)
                         cell_key = f"string_{string_id}_packet_{packet_id}_cell_{cell_id}"
-                        
-                        # Simülasyon verisini kontrol et ve değer ata
-                        sim_key = (string_id, packet_id, cell_id)
-                        if sim_key in self.cell_voltages:
-                            bms_data["cell_voltages"][cell_key] = self.cell_voltages[sim_key]
-                        else:
-                            bms_data["cell_voltages"][cell_key] = 0.0  # Veri yoksa 0.0 ata
+                        # Veri yoksa 0.0 ata
+                        bms_data["cell_voltages"][cell_key] = packet_cells[cell_id - 1] if cell_id <= len(packet_cells) else 0.0
             
             # ✅ TAM İSKELET: BÜTÜN SICAKLIK SENSÖRLERİNİ OLUŞTUR (12 String × 4 Paket × 8 Sensör = 384 sensör)  
+            temp_values = temps.tolist()
             for string_id in range(1, self.TOTAL_STRINGS + 1):  # 1-12 string
                 for packet_id in range(1, self.PACKETS_PER_STRING + 1):  # 1-4 paket
+                    packet_temps = temp_values[string_id - 1][packet_id - 1]
                     for temp_id in range(1, 9):  # 1-8 sıcaklık sensörü (tam iskelet!)
                         temp_key = f"string_{string_id}_packet_{packet_id}_temp_{temp_id}"
-                        
-                        # Simülasyon verisini kontrol et ve değer ata
-                        sim_key = (string_id, packet_id, temp_id)
-                        if sim_key in self.temperatures:
-                            bms_data["temperatures"][temp_key] = self.temperatures[sim_key]
-                        else:
-                            bms_data["temperatures"][temp_key] = 0.0  # Veri yoksa 0.0 ata
+                        # Veri yoksa 0.0 ata
+                        bms_data["temperatures"][temp_key] = packet_temps[temp_id - 1] if temp_id <= len(packet_temps) else 0.0
             
             # ✅ TAM İSKELET: BÜTÜN STRING VERİLERİNİ OLUŞTUR (12 String × 4 Paket = 48 adet)
+            soc_values = state.soc.tolist()
+            soh_values = state.soh.tolist()
+            current_values = state.currents.tolist()
+            pack_values = state.pack_voltages.tolist()
             for string_id in range(1, self.TOTAL_STRINGS + 1):  # 1-12 string
                 for packet_id in range(1, self.PACKETS_PER_STRING + 1):  # 1-4 paket
                     string_key = f"string_{string_id}_packet_{packet_id}"
-                    
-                    # Bu string-packet için veriler varsa kullan, yoksa varsayılan değerler
+                    s, p = string_id - 1, packet_id - 1
                     bms_data["string_data"][string_key] = {
-                        "soc": self.soc_values.get((string_id, packet_id), 85.0 + random.uniform(-5, 5)),
-                        "soh": self.soh_values.get((string_id, packet_id), 98.0 + random.uniform(-2, 2)),
-                        "current": self.currents.get((string_id, packet_id), -50.0 + random.uniform(-10, 10)),
-                        "pack_voltage": self.pack_voltages.get((string_id, packet_id), 400.0 + random.uniform(-5, 5))
+                        "soc": soc_values[s][p],
+                        "soh": soh_values[s][p],
+                        "current": current_values[s][p],
+                        "pack_voltage": pack_values[s][p]
                     }
             
             # JSON dosyasına yaz
@@ -372,35 +281,23 @@ class CANMessageSimulator:
         sample_packet = 1
         
         # Ana parametreler
-        soc_key = (sample_string, sample_packet)
-        soh_key = (sample_string, sample_packet)
-        current_key = (sample_string, sample_packet)
-        voltage_key = (sample_string, sample_packet)
-        
-        if soc_key in self.soc_values:
-            print(f"🔋 SOC: {self.soc_values[soc_key]:.2f}%")
-        if soh_key in self.soh_values:
-            print(f"💪 SOH: {self.soh_values[soh_key]:.2f}%")
-        if current_key in self.currents:
-            print(f"⚡ Current: {self.currents[current_key]:.2f}A")
-        if voltage_key in self.pack_voltages:
-            print(f"🔌 Pack Voltage: {self.pack_voltages[voltage_key]:.2f}V")
+        s, p = sample_string - 1, sample_packet - 1
+        print(f"🔋 SOC: {self.state.soc[s, p]:.2f}%")
+        print(f"💪 SOH: {self.state.soh[s, p]:.2f}%")
+        print(f"⚡ Current: {self.state.currents[s, p]:.2f}A")
+        print(f"🔌 Pack Voltage: {self.state.pack_voltages[s, p]:.2f}V")
         
         # Örnek hücre voltajları (ilk 5 hücre)
         print("\n📍 Örnek Hücre Voltajları (String-1, Packet-1):")
         for cell_num in range(1, 6):
-            cell_key = (sample_string, sample_packet, cell_num)
-            if cell_key in self.cell_voltages:
-                voltage = self.cell_voltages[cell_key]
-                print(f"   Cell-{cell_num}: {voltage:.3f}V")
+            voltage = self.state.cell_voltage(sample_string, sample_packet, cell_num)
+            print(f"   Cell-{cell_num}: {voltage:.3f}V")
         
         # Örnek sıcaklık değerleri (ilk 3 sensör)
         print("\n🌡️ Örnek Sıcaklık Değerleri (String-1, Packet-1):")
         for temp_num in range(1, 4):
-            temp_key = (sample_string, sample_packet, temp_num)
-            if temp_key in self.temperatures:
-                temp = self.temperatures[temp_key]
-                print(f"   Temp-{temp_num}: {temp:.1f}°C")
+            temp = self.state.temperature(sample_string, sample_packet, temp_num)
+            print(f"   Temp-{temp_num}: {temp:.1f}°C")
 
     def simulate_can_messages(self):
         """Ana simülasyon döngüsü"""
@@ -410,22 +307,18 @@ class CANMessageSimulator:
             try:
                 timestamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
                 
-                # Tüm string ve paketler için mesajlar oluştur
-                for string_id in range(1, self.TOTAL_STRINGS + 1):
-                    for packet_id in range(1, self.PACKETS_PER_STRING + 1):
-                        for bms_id in range(1, self.BMS_PER_PACKET + 1):
-                            
-                            # CAN ID oluştur
-                            can_id = self.generate_can_id(string_id, packet_id, bms_id)
-                            
-                            # 64-byte mesaj oluştur
-                            message_data = self.create_can_message(string_id, packet_id, bms_id)
-                            
-                            # Mesajı sessizce gönder (CAN dump formatında yazdırmıyoruz)
-                            # hex_data = ' '.join([f'{b:02X}' for b in message_data])
-                            # print(f"  can0  {can_id:03X}   [64]  {hex_data}")
-                            
-                            message_count += 1
+                # Tüm string ve paketler için mesajları tek seferde oluştur
+                # (can_ids[i] <-> frames[i], sıra: string -> paket -> bms)
+                can_ids = self.encoder.can_ids
+                frames = self.encoder.encode(self.state)
+                
+                # Mesajları sessizce gönder (CAN dump formatında yazdırmıyoruz)
+                if self.transport is not None:
+                    self.transport.send_batch(can_ids, frames)
+                # for can_id, message_data in zip(can_ids, frames):
+                #     print(f"  can0  {can_id:03X}   [64]  {message_data.tobytes().hex(' ').upper()}")
+                
+                message_count += len(frames)
                 
                 # Durum bilgisi
                 if message_count % 100 == 0:
@@ -477,8 +370,24 @@ def main():
     print("  • Gerçekçi veri değişimleri")
     print("=" * 50)
     
+    parser = argparse.ArgumentParser(description="Sahte CAN FD mesaj simülatörü")
+    parser.add_argument("--interval", type=float, default=2.0, help="Güncelleme aralığı (saniye)")
+    parser.add_argument("--strings", type=int, default=12, help="String sayısı")
+    parser.add_argument("--packets", type=int, default=4, help="String başına paket sayısı")
+    parser.add_argument("--seed", type=int, default=None, help="Tekrarlanabilir simülasyon için seed")
+    # VirtualCANBus süreç içidir (can_pipeline_benchmark.py); iki süreç arası test için vcan0 kullanın
+    parser.add_argument("--can", choices=["socketcan"], default=None,
+                        help="Çerçeveleri CAN transport'una yayınla")
+    parser.add_argument("--channel", default="can0")
+    args = parser.parse_args()
+    
+    transport = None
+    if args.can:
+        from can_transport import open_can_transport
+        transport = open_can_transport(args.can, args.channel)
+    
     # Simülatörü başlat
-    simulator = CANMessageSimulator()
+    simulator = CANMessageSimulator(args.strings, args.packets, args.interval, args.seed, transport)
     
     try:
         simulator.start_simulation()
@@ -488,6 +397,8 @@ def main():
         print(f"❌ Kritik hata: {e}")
     finally:
         simulator.stop_simulation()
+        if transport is not None:
+            transport.close()
         print("👋 Simülasyon tamamlandı!")
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+"""
+Bellek içi ring-buffer historian
+Tüm hücre voltajları ve sıcaklıklar sabit boyutlu float32 dizilerde (zaman slotu x string x paket x nokta) tutulur.
+
+Slotlar sabit aralıklıdır (varsayılan 1 s): aynı slota düşen ingest'ler son değeri yazar,
+atlanan slotlar NaN ile doldurulur; böylece "son N dakika" her zaman N*60/interval slottur.
+
+Her slot tampona iki kez yazılır (i ve i + capacity). Bu sayede capacity'ye kadar her pencere
+tek parça bir numpy view'dır — sorgular kopya üretmez.
+"""
+import math
+import threading
+import time
+from typing import Optional, Tuple
+import numpy as np
+
+class RingHistorian:
+    def __init__(self, retention: float = 900.0, interval: float = 1.0,
+                 total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_packet: int = 104, temps_per_packet: int = 42):
+        self.interval = interval
+        self.capacity = max(1, int(math.ceil(retention / interval)))
+        shape = (2 * self.capacity, total_strings, packets_per_string)
+        self.cells = np.full(shape + (cells_per_packet,), np.nan, dtype=np.float32)
+        self.temps = np.full(shape + (temps_per_packet,), np.nan, dtype=np.float32)
+        self.timestamps = np.zeros(2 * self.capacity)
+        self.slots_written = 0  # Toplam ilerlenen slot sayısı (sarmadan bağımsız)
+        self.last_slot = None  # Son yazılan slotun mutlak numarası (timestamp // interval)
+        self.lock = threading.Lock()  # Yalnızca yazıcılar arası; okuyucular view alır
+
+    @property
+    def length(self) -> int:
+        return min(self.slots_written, self.capacity)
+
+    def _clear_slot(self, index: int, timestamp: float):
+        for i in (index, index + self.capacity):
+            self.cells[i] = np.nan
+            self.temps[i] = np.nan
+            self.timestamps[i] = timestamp
+
+    def append(self, cell_voltages: np.ndarray, temperatures: np.ndarray,
+               timestamp: Optional[float] = None, cells_received: np.ndarray = None,
+               temps_received: np.ndarray = None):
+        """Güncel anlık görüntüyü (string, paket, nokta) zaman slotuna yaz; alınmamış noktalar NaN kalır"""
+        timestamp = time.time() if timestamp is None else timestamp
+        slot = int(timestamp // self.interval)
+        with self.lock:
+            if self.last_slot is None or slot > self.last_slot:
+                steps = 1 if self.last_slot is None else slot - self.last_slot
+                # Veri gelmeyen slotlar NaN, zaman damgası slot başlangıcı (en fazla bir tam tur)
+                for k in range(max(0, steps - self.capacity), steps):
+                    self._clear_slot((self.slots_written + k) % self.capacity,
+                                     (slot - steps + 1 + k) * self.interval)
+                self.slots_written += steps
+                self.last_slot = slot
+            elif slot < self.last_slot:
+                return  # Geç gelen eski veri: geçmiş slotlar yeniden yazılmaz
+
+            index = (self.slots_written - 1) % self.capacity
+            for i in (index, index + self.capacity):
+                if cells_received is None:
+                    self.cells[i] = cell_voltages
+                else:
+                    np.copyto(self.cells[i], cell_voltages, where=cells_received)
+                if temps_received is None:
+                    self.temps[i] = temperatures
+                else:
+                    np.copyto(self.temps[i], temperatures, where=temps_received)
+                self.timestamps[i] = timestamp
+
+    def _window_slice(self, seconds: Optional[float]) -> slice:
+        count = self.length if seconds is None else min(self.length, int(math.ceil(seconds / self.interval)))
+        end = (self.slots_written - 1) % self.capacity + 1 + self.capacity
+        return slice(end - count, end)
+
+    def window(self, seconds: Optional[float] = None, string_no: Optional[int] = None,
+               packet_no: Optional[int] = None, kind: str = "cells") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Son `seconds` saniyenin (None: tüm tampon) (timestamps, values) view'ları.
+        values şekli: (slot, [string], [paket], nokta); string/paket verilirse o eksen düşer.
+        Dönen diziler tampona bakar; saklanacaksa çağıran kopyalamalıdır.
+        """
+        if self.slots_written == 0:
+            empty = self.cells if kind == "cells" else self.temps
+            return self.timestamps[:0], empty[:0]
+        data = self.cells if kind == "cells" else self.temps
+        window = self._window_slice(seconds)
+        values = data[window]
+        if string_no is not None:
+            values = values[:, string_no - 1]
+            if packet_no is not None:
+                values = values[:, packet_no - 1]
+        elif packet_no is not None:
+            values = values[:, :, packet_no - 1]
+        return self.timestamps[window], values
+
+    def cell_history(self, string_no: int, packet_no: int, cell_no: int,
+                     seconds: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps, values = self.window(seconds, string_no, packet_no, "cells")
+        return timestamps, values[:, cell_no - 1]
+
+    def temp_history(self, string_no: int, packet_no: int, temp_no: int,
+                     seconds: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        timestamps, values = self.window(seconds, string_no, packet_no, "temps")
+        return timestamps, values[:, temp_no - 1]
+
+    def memory_bytes(self) -> int:
+        return self.cells.nbytes + self.temps.nbytes + self.timestamps.nbytes
@@ -0,0 +1,133 @@
+"""
+Çok çözünürlüklü rollup'lar (varsayılan 1 dk ve 1 saat) — hücre voltajları ve sıcaklıklar için min / max / ortalama
+Her ingest örneği tüm seviyelere doğrudan eklenir (O(nokta)), kovalar ring buffer'da tutulur.
+
+Uzun aralık sorguları ham örneklere değil kovalara bakar: kova başına sabit maliyet.
+Paket / string seviyesi, sorgu anında hücre kovalarının min/max/toplam/adet değerlerinden indirgenir
+(toplam/adet birleştirildiği için ortalama ağırlıklıdır).
+"""
+import threading
+import time
+import warnings
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+DEFAULT_LEVELS = ((60.0, 360), (3600.0, 168))  # (çözünürlük s, saklanan kova): 6 saat dakikalık, 7 gün saatlik
+
+class RollupLevel:
+    def __init__(self, resolution: float, buckets: int, shapes: Dict[str, tuple]):
+        self.resolution = resolution
+        self.buckets = buckets
+        self.starts = np.full(buckets, np.nan)  # Kova başlangıç zamanı (boş slot NaN)
+        self.current = None  # Açık kovanın mutlak numarası
+        self.stats = {}
+        for kind, shape in shapes.items():
+            self.stats[kind] = (
+                np.full((buckets,) + shape, np.nan, dtype=np.float32),   # min
+                np.full((buckets,) + shape, np.nan, dtype=np.float32),   # max
+                np.zeros((buckets,) + shape, dtype=np.float64),          # toplam (saatlik kovada float32 kayar)
+                np.zeros((buckets,) + shape, dtype=np.uint32),           # adet
+            )
+
+    def _open(self, bucket: int):
+        slot = bucket % self.buckets
+        for minimum, maximum, total, count in self.stats.values():
+            minimum[slot] = np.nan
+            maximum[slot] = np.nan
+            total[slot] = 0
+            count[slot] = 0
+        self.starts[slot] = bucket * self.resolution
+        self.current = bucket
+
+    def add(self, timestamp: float, samples: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        bucket = int(timestamp // self.resolution)
+        if self.current is None or bucket > self.current:
+            self._open(bucket)
+        elif bucket < self.current:
+            return  # Kapanmış kovalar yeniden açılmaz
+        slot = bucket % self.buckets
+        for kind, (values, mask) in samples.items():
+            minimum, maximum, total, count = self.stats[kind]
+            np.fmin(minimum[slot], values, out=minimum[slot], where=mask)
+            np.fmax(maximum[slot], values, out=maximum[slot], where=mask)
+            np.add(total[slot], values, out=total[slot], where=mask)
+            count[slot] += mask
+
+    def slots(self, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        """[start, end] aralığıyla kesişen kovaların slot indeksleri, zaman sırasıyla"""
+        if self.current is None:
+            return np.empty(0, dtype=np.intp)
+        # Ring en eskiden en yeniye: açık kovanın bir sonrası en eski slottur
+        order = (np.arange(1, self.buckets + 1) + self.current) % self.buckets
+        starts = self.starts[order]
+        valid = ~np.isnan(starts)
+        if start is not None:
+            valid &= starts + self.resolution > start
+        if end is not None:
+            valid &= starts <= end
+        return order[valid]
+
+class RollupPipeline:
+    def __init__(self, levels: Sequence[Tuple[float, int]] = DEFAULT_LEVELS,
+                 total_strings: int = 12, packets_per_string: int = 4,
+                 cells_per_packet: int = 104, temps_per_packet: int = 42):
+        shapes = {
+            "cells": (total_strings, packets_per_string, cells_per_packet),
+            "temps": (total_strings, packets_per_string, temps_per_packet),
+        }
+        self.levels = {resolution: RollupLevel(resolution, buckets, shapes) for resolution, buckets in levels}
+        self.lock = threading.Lock()
+
+    def add(self, cell_voltages: np.ndarray, temperatures: np.ndarray, timestamp: Optional[float] = None,
+            cells_mask: np.ndarray = None, temps_mask: np.ndarray = None):
+        """Bir örneği tüm seviyelere ekle; mask False olan noktalar bu örnekte sayılmaz"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if cells_mask is None:
+            cells_mask = ~np.isnan(cell_voltages)
+        if temps_mask is None:
+            temps_mask = ~np.isnan(temperatures)
+        samples = {"cells": (cell_voltages, cells_mask), "temps": (temperatures, temps_mask)}
+        with self.lock:
+            for level in self.levels.values():
+                level.add(timestamp, samples)
+
+    def query(self, resolution: float, start: Optional[float] = None, end: Optional[float] = None,
+              kind: str = "cells", scope: str = "cell", string_no: Optional[int] = None,
+              packet_no: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Kova başına {start, min, max, mean, count}.
+        scope: 'cell'   -> (kova, [string], [paket], nokta)
+               'packet' -> (kova, [string], [paket])   paket içindeki tüm noktalar üzerinden
+               'string' -> (kova, [string])            string içindeki tüm noktalar üzerinden
+        string_no / packet_no verilirse ilgili eksen düşer.
+        """
+        level = self.levels[resolution]
+        with self.lock:
+            slots = level.slots(start, end)
+            minimum, maximum, total, count = (array[slots] for array in level.stats[kind])
+            starts = level.starts[slots]
+
+        if scope != "cell":
+            axes = (-1,) if scope == "packet" else (-2, -1)
+            with warnings.catch_warnings():
+                # Hiç örneği olmayan gruplarda nanmin/nanmax NaN döner; "All-NaN slice" uyarısı bastırılır
+                warnings.simplefilter("ignore", RuntimeWarning)
+                minimum = np.nanmin(minimum, axis=axes)
+                maximum = np.nanmax(maximum, axis=axes)
+            total = total.sum(axis=axes, dtype=np.float64)
+            count = count.sum(axis=axes)
+
+        if string_no is not None:
+            minimum, maximum, total, count = (a[:, string_no - 1] for a in (minimum, maximum, total, count))
+            if packet_no is not None and scope != "string":
+                minimum, maximum, total, count = (a[:, packet_no - 1] for a in (minimum, maximum, total, count))
+        elif packet_no is not None and scope != "string":
+            minimum, maximum, total, count = (a[:, :, packet_no - 1] for a in (minimum, maximum, total, count))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        return {"start": starts, "min": minimum, "max": maximum, "mean": mean, "count": count}
+
+    def memory_bytes(self) -> int:
+        return sum(array.nbytes for level in self.levels.values()
+                   for arrays in level.stats.values() for array in arrays)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Modbus protokol çekirdeği ve register haritası mikro benchmark'ları
+ModbusMaster ve BMSMaster aynı çekirdeği kullandığı için ölçüm tek yerde yapılır.
+Baseline mutlak süre değil, referans case'e (split_frames) oran olarak saklanır;
+böylece farklı makinede / yük altında da karşılaştırılabilir.
+Her ölçüm turu en az MIN_ROUND_TIME sürer ve turların en iyisi alınır. Baseline ayrı süreçlerde
+BASELINE_RUNS kez ölçülür; case başına tolerans süreçler arası sapmadan hesaplanıp saklanır.
+Toleransı aşan case ayrı süreçlerde CONFIRM_RUNS kez yeniden ölçülür; gerçek regresyon her
+süreçte görünür, tek sürecin gürültüsü görünmez.
+Baseline'da 1 µs altında kalan case'ler zamanlayıcı gürültüsünden ayrılamadığı için raporlanır
+ama regresyon kapısına girmez.
+
+KULLANIM:
+python3 modbus_benchmark.py                          # Ölç ve baseline ile karşılaştır (rapor)
+python3 modbus_benchmark.py --fail-on-regression     # Regresyonda çıkış kodu 1 (CI kapısı)
+python3 modbus_benchmark.py --save-baseline          # Mevcut sonuçları baseline olarak kaydet
+python3 modbus_benchmark.py --filter coil            # Sadece ismi 'coil' içeren case'ler
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+from datetime import datetime
+from modbus_core import (
+    ModbusFunctions, encode_read_request, encode_write_multiple_coils,
+    encode_write_multiple_registers, decode_read_bits_response,
+    decode_read_registers_response, pack_bits, unpack_bits, split_frames,
+    MBAP_STRUCT, PackedBits
+)
+from bms_register_map import BMSDataConverter, BMSAddressCalculator
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+REGRESSION_THRESHOLD = 0.20  # Göreli maliyette %20'den fazla artış regresyon sayılır
+REFERENCE_CASE = "split_frames[16 x 259B]"  # Oranların paydası (µs mertebesinde, kararlı); her zaman ölçülür
+MIN_ROUND_TIME = 0.05  # Tur başına en az süre (s); kısa case'lerde iterasyon sayısı buna göre artar
+NOISE_FLOOR_USEC = 1.0  # Baseline süresi bundan kısa case'ler kapı dışı (yalnızca rapor)
+BASELINE_RUNS = 5  # --save-baseline'da ayrı süreçte tekrarlanan ölçüm sayısı
+CONFIRM_RUNS = 3  # Regresyon görünen case'in ayrı süreçte yeniden ölçülme sayısı
+
+def _register_response(count: int) -> bytes:
+    data = bytes(range(256)) * 2
+    payload = data[:count * 2]
+    return MBAP_STRUCT.pack(1, 0, len(payload) + 3, 1, 0x03) + bytes([len(payload)]) + payload
+
+def _coil_response(count: int) -> bytes:
+    payload = pack_bits([i % 3 == 0 for i in range(count)])
+    return MBAP_STRUCT.pack(1, 0, len(payload) + 3, 1, 0x01) + bytes([len(payload)]) + payload
+
+def build_cases():
+    """(isim, çağrılabilir) listesi"""
+    coils = [i % 2 == 0 for i in range(2000)]
+    registers = list(range(123))
+    register_response = _register_response(125)
+    coil_response = _coil_response(2000)
+    packed_coils = pack_bits(coils)
+    coil_store = PackedBits(50000)
+    coil_store[40000:44992] = [i % 2 == 0 for i in range(4992)]
+    stream = bytes(_register_response(125) * 16)
+    high, low = BMSDataConverter.float_to_registers(3.7312)
+    cell_address = BMSAddressCalculator.get_cell_voltage_address(7, 3, 55)
+    temp_address = BMSAddressCalculator.get_temperature_address(7, 3, 4, 5)
+
+    return [
+        # Protokol çekirdeği
+        ("encode_read_request", lambda: encode_read_request(1, ModbusFunctions.READ_HOLDING_REGISTERS, 1000, 125)),
+        ("encode_write_multiple_registers[123]", lambda: encode_write_multiple_registers(1, 1000, registers)),
+        ("encode_write_multiple_coils[1968]", lambda: encode_write_multiple_coils(1, 0, coils[:1968])),
+        ("decode_read_registers_response[125]", lambda: decode_read_registers_response(register_response, 125)),
+        ("decode_read_bits_response[2000]", lambda: decode_read_bits_response(coil_response, 2000)),
+        ("pack_bits[2000]", lambda: pack_bits(coils)),
+        ("unpack_bits[2000]", lambda: unpack_bits(packed_coils, 2000)),
+        ("PackedBits.read_packed[2000]", lambda: coil_store.read_packed(40003, 2000)),
+        ("PackedBits.write_packed[1968]", lambda: coil_store.write_packed(40003, 1968, packed_coils)),
+        ("split_frames[16 x 259B]", lambda: split_frames(bytearray(stream))),
+        # Register haritası
+        ("float_to_registers", lambda: BMSDataConverter.float_to_registers(3.7312)),
+        ("registers_to_float", lambda: BMSDataConverter.registers_to_float(high, low)),
+        ("get_cell_voltage_address", lambda: BMSAddressCalculator.get_cell_voltage_address(7, 3, 55)),
+        ("get_temperature_address", lambda: BMSAddressCalculator.get_temperature_address(7, 3, 4, 5)),
+        ("get_balancing_status_address", lambda: BMSAddressCalculator.get_balancing_status_address(7, 3, 55)),
+        ("parse_cell_address", lambda: BMSAddressCalculator.parse_cell_address(cell_address)),
+        ("parse_temp_address", lambda: BMSAddressCalculator.parse_temp_address(temp_address)),
+    ]
+
+def run_benchmark(iterations: int = 10000, repeat: int = 7, name_filter: str = None) -> dict:
+    """Her case için en iyi turun çağrı başına süresini (µs) döndür"""
+    cases = [(name, func) for name, func in build_cases()
+             if not name_filter or name_filter in name or name == REFERENCE_CASE]
+    numbers = {}
+    for name, func in cases:
+        # Tur süresi MIN_ROUND_TIME ile 0.5 s arasında tutulur (kısa case'ler için zamanlayıcı çözünürlüğü)
+        single = timeit.timeit(func, number=100) / 100
+        numbers[name] = min(max(iterations, int(MIN_ROUND_TIME / single) + 1), max(10, int(0.5 / single)))
+    # Turlar case'ler arasında dönüşümlü: makinedeki yük dalgalanması tüm case'lere (ve referansa) eşit düşer
+    results = {name: float("inf") for name, _ in cases}
+    for _ in range(repeat):
+        for name, func in cases:
+            results[name] = min(results[name], timeit.timeit(func, number=numbers[name]) / numbers[name] * 1e6)
+    return results
+
+def run_isolated(runs: int, iterations: int, repeat: int, name_filter: str = None) -> list:
+    """run_benchmark'ı ayrı süreçlerde çalıştır; süreçler arası sapma tek süreçtekinden büyüktür"""
+    command = [sys.executable, os.path.abspath(__file__), "--json",
+               "--iterations", str(iterations), "--repeat", str(repeat)]
+    if name_filter:
+        command += ["--filter", name_filter]
+    return [json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout)
+            for _ in range(runs)]
+
+def load_baseline(path: str = BASELINE_FILE) -> dict:
+    """isim -> {"cost": göreli maliyet, "tolerance": izin verilen artış, "usec": baseline süresi}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get("reference") != REFERENCE_CASE:
+        return {}  # Başka referansa göre oranlar karşılaştırılamaz
+    tolerances, usecs = data.get("tolerances", {}), data.get("usec", {})
+    return {name: {"cost": cost, "tolerance": tolerances.get(name), "usec": usecs.get(name)}
+            for name, cost in data.get("results", {}).items()}
+
+def relative(results: dict) -> dict:
+    """µs sonuçlarını referans case'e oranla (makineden bağımsız göreli maliyet)"""
+    reference = results[REFERENCE_CASE]
+    return {name: usec / reference for name, usec in results.items()}
+
+def baseline_from_runs(runs: list, threshold: float = REGRESSION_THRESHOLD) -> dict:
+    """Süreç başına µs sonuçlarından baseline girdileri: en iyi oran, sapma + eşik kadar tolerans"""
+    costs = [relative(results) for results in runs]
+    baseline = {}
+    for name in runs[0]:
+        values = [cost[name] for cost in costs]
+        baseline[name] = {"cost": min(values), "tolerance": max(values) / min(values) - 1 + threshold,
+                          "usec": min(results[name] for results in runs)}
+    return baseline
+
+def save_baseline(baseline: dict, path: str = BASELINE_FILE):
+    """baseline: load_baseline / baseline_from_runs biçimi"""
+    data = {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "reference": REFERENCE_CASE,
+        "results": {name: round(entry["cost"], 4) for name, entry in baseline.items()},
+        "tolerances": {name: round(entry["tolerance"], 3) for name, entry in baseline.items()
+                       if entry["tolerance"] is not None},
+        "usec": {name: round(entry["usec"], 3) for name, entry in baseline.items() if entry["usec"] is not None},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def compare(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD, costs: dict = None) -> list:
+    """(isim, µs, göreli maliyet, baseline göreli maliyet, oran, durum) satırları; oran = yeni / baseline"""
+    rows = []
+    costs = costs or relative(results)
+    for name, usec in results.items():
+        cost = costs[name]
+        entry = baseline.get(name)
+        base = entry["cost"] if entry else None
+        if not entry or name == REFERENCE_CASE:
+            rows.append((name, usec, cost, base, None, "YENİ" if not entry else "REFERANS"))
+            continue
+        ratio = cost / base
+        tolerance = entry["tolerance"] if entry["tolerance"] is not None else threshold
+        if (entry["usec"] if entry["usec"] is not None else usec) < NOISE_FLOOR_USEC:
+            status = "KAPI DIŞI"  # Zamanlayıcı gürültüsü eşikten büyük
+        elif ratio > 1 + tolerance:
+            status = "REGRESYON"
+        elif ratio < 1 - threshold:
+            status = "İYİLEŞME"
+        else:
+            status = "OK"
+        rows.append((name, usec, cost, base, ratio, status))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Modbus çekirdek / register haritası mikro benchmark'ları")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--filter", default=None, help="Sadece ismi bu metni içeren case'ler")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline JSON dosyası")
+    parser.add_argument("--save-baseline", action="store_true", help="Sonuçları baseline olarak kaydet")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Regresyon eşiği (0.20 = %%20); baseline toleransına eklenir")
+    parser.add_argument("--runs", type=int, default=BASELINE_RUNS,
+                        help="--save-baseline'da ayrı süreçte ölçüm sayısı")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)  # run_isolated alt süreci
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Regresyon varsa çıkış kodu 1 (varsayılan yalnızca rapor)")
+    args = parser.parse_args()
+
+    if args.json:
+        print(json.dumps(run_benchmark(args.iterations, args.repeat, args.filter)))
+        return
+
+    if args.save_baseline:
+        runs = run_isolated(args.runs, args.iterations, args.repeat, args.filter)
+        baseline = {**load_baseline(args.baseline), **baseline_from_runs(runs, args.threshold)}
+        save_baseline(baseline, args.baseline)
+        print(f"💾 Baseline kaydedildi: {args.baseline} ({args.runs} süreç)")
+        results = runs[-1]
+    else:
+        results = run_benchmark(args.iterations, args.repeat, args.filter)
+
+    baseline = load_baseline(args.baseline)
+    costs = relative(results)
+    suspects = [row[0] for row in compare(results, baseline, args.threshold, costs) if row[5] == "REGRESYON"]
+    for name in suspects:
+        for run in run_isolated(CONFIRM_RUNS, args.iterations, args.repeat, name):
+            costs[name] = min(costs[name], relative(run)[name])
+    if suspects:
+        print(f"🔁 {len(suspects)} case {CONFIRM_RUNS} ayrı süreçte yeniden ölçüldü (en iyi oran alınır)")
+    rows = compare(results, baseline, args.threshold, costs)
+    print("⏱️ MODBUS ÇEKİRDEK / REGISTER HARİTASI BENCHMARK")
+    print("=" * 97)
+    print(f"  {'case':<40} {'µs':>10} {'göreli':>10} {'baseline':>10} {'oran':>8}  durum")
+    print("-" * 97)
+    for name, usec, cost, base, ratio, status in rows:
+        base_text = f"{base:10.3f}" if base else f"{'-':>10}"
+        ratio_text = f"{ratio:8.2f}" if ratio else f"{'-':>8}"
+        print(f"  {name:<40} {usec:10.3f} {cost:10.3f} {base_text} {ratio_text}  {status}")
+    print("=" * 97)
+    print(f"  göreli = µs / {REFERENCE_CASE} µs; baseline'da {NOISE_FLOOR_USEC:g} µs altındaki case'ler kapı dışı")
+
+    regressions = [row for row in rows if row[5] == "REGRESYON"]
+    if regressions:
+        print(f"⚠️ {len(regressions)} case'in göreli maliyeti baseline toleransından fazla arttı")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
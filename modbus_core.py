@@ -0,0 +1,300 @@
+"""
+Ortak Modbus TCP protokol çekirdeği
+modbus.py (ModbusMaster) ve bms_client.py (BMSMaster) aynı PDU kodlama/çözme,
+çerçeveleme ve hata eşleme fonksiyonlarını buradan kullanır
+"""
+from enum import Enum
+import struct
+import socket
+from itertools import chain
+from typing import Tuple, List, Optional, Sequence, Union
+
+# C kodundaki sabitler
+MODBUS_RECEIVE_MAX_DATA_SIZE = 251
+MODBUS_WRITE_MULT_REQ_MAX_DATA_SIZE = 247
+MODBUS_TCP_MAX_ADU_LENGTH = 260  # 7 (MBAP) + 253 (PDU)
+MBAP_HEADER_LENGTH = 7
+
+# Modbus spesifikasyonu limitleri
+MAX_READ_BITS = 2000
+MAX_READ_REGISTERS = 125
+MAX_WRITE_COILS = 1968
+MAX_WRITE_REGISTERS = 123
+MAX_READ_WRITE_REGISTERS = 121  # 0x17 yazma kısmı
+
+DEFAULT_UNIT_ID = 0x01  # Varsayılan unit ID
+
+class ModbusFunctions(Enum):
+    """C kodundaki modbus_functions_t"""
+    READ_COILS = 0x01
+    READ_DISCRETE_INPUTS = 0x02
+    READ_HOLDING_REGISTERS = 0x03
+    READ_INPUT_REGISTERS = 0x04
+    WRITE_SINGLE_COIL = 0x05
+    WRITE_SINGLE_REGISTER = 0x06
+    WRITE_MULTIPLE_COILS = 0x0F
+    WRITE_MULTIPLE_REGISTERS = 0x10
+    READ_WRITE_MULTIPLE_REGISTERS = 0x17
+
+class CoilValue(Enum):
+    """C kodundaki write_single_coil_value_t"""
+    COIL_OFF = 0x0000
+    COIL_ON = 0xFF00
+
+class ModbusError(Enum):
+    """C kodundaki modbus_req_return_val_t ve modbus_response_return_val_t birleşimi"""
+    OK = 0
+    GENERAL_ERROR = 1
+    ILLEGAL_FUNCTION = 2
+    ILLEGAL_ADDRESS = 3
+    ILLEGAL_VALUE = 4
+    COMMUNICATION_ERROR = 5
+    NO_RESPONSE = 6
+    WRONG_DATA = 7
+    GATEWAY_ERROR = 8  # Gateway hedef unit'e ulaşamadı (exception 0x0A / 0x0B)
+
+# Slave exception kodu -> ModbusError
+EXCEPTION_CODE_MAP = {
+    0x01: ModbusError.ILLEGAL_FUNCTION,
+    0x02: ModbusError.ILLEGAL_ADDRESS,
+    0x03: ModbusError.ILLEGAL_VALUE,
+    0x04: ModbusError.GENERAL_ERROR,
+    0x0A: ModbusError.GATEWAY_ERROR,  # Gateway Path Unavailable
+    0x0B: ModbusError.GATEWAY_ERROR,  # Gateway Target Device Failed to Respond
+}
+
+# Sık kullanılan struct formatları bir kez derlenir
+MBAP_STRUCT = struct.Struct('>HHHBB')    # Transaction, Protocol, Length, Unit, Function
+HEADER_STRUCT = struct.Struct('>HHHB')   # Fonksiyon kodu hariç MBAP
+ADDRESS_STRUCT = struct.Struct('>HH')    # Adres + adet / değer
+MULTI_WRITE_STRUCT = struct.Struct('>HHB')
+READ_WRITE_STRUCT = struct.Struct('>HHHHB')  # Okuma adresi / adedi, yazma adresi / adedi, byte sayısı
+
+# ---------------------------------------------------------------------------
+# Bit / register paketleme
+# ---------------------------------------------------------------------------
+
+# Byte -> 8 bool (LSB ilk) tablosu ve byte başına '0' / '1' karakteri (0 dışındaki her değer '1')
+BIT_TABLE = [tuple(bool(byte >> i & 1) for i in range(8)) for byte in range(256)]
+BIT_CHARS = b'0' + b'1' * 255
+
+def pack_bits(values: Sequence[bool]) -> bytes:
+    """Bool listesini Modbus bit sırasına (LSB ilk) göre byte dizisine çevir"""
+    if not values:
+        return b''
+    try:
+        raw = bytes(values)  # bool / 0-255 int listesi tek C çağrısıyla
+    except (TypeError, ValueError):
+        raw = bytes(map(bool, values))
+    # Ters çevrilmiş '0'/'1' dizisi ikilik sayı olarak okunur: ilk değer en düşük bit
+    return int(raw[::-1].translate(BIT_CHARS), 2).to_bytes((len(values) + 7) // 8, 'little')
+
+def unpack_bits(data: bytes, count: int) -> List[bool]:
+    """Byte dizisinden ilk `count` biti bool listesi olarak çıkar"""
+    count = min(count, len(data) * 8)
+    bits = list(chain.from_iterable(map(BIT_TABLE.__getitem__, data[:(count + 7) // 8])))
+    del bits[count:]
+    return bits
+
+class PackedBits:
+    """Coil / discrete input deposu: bit başına 1 bit, Modbus tel sırasıyla (LSB ilk) bytearray
+
+    Liste gibi indekslenir (store[i], store[a:b] = [...]); FC01 / FC02 / FC0F yolları
+    read_packed / write_packed ile bitleri döngüsüz, int.from_bytes kaydırmalarıyla kopyalar.
+    data verilirse (ör. paylaşımlı bellek memoryview'ı) bitler orada tutulur.
+    """
+
+    def __init__(self, size: int, data=None):
+        self.size = size
+        self.data = bytearray((size + 7) // 8) if data is None else data
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _slice_range(self, key: slice) -> Tuple[int, int]:
+        start, stop, step = key.indices(self.size)
+        if step != 1:
+            raise ValueError("PackedBits yalnızca adımsız dilimleri destekler")
+        return start, max(start, stop)
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            start, stop = self._slice_range(key)
+            return unpack_bits(self.read_packed(start, stop - start), stop - start)
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("bit adresi aralık dışında")
+        return bool(self.data[key >> 3] >> (key & 7) & 1)
+
+    def __setitem__(self, key: Union[int, slice], value):
+        if isinstance(key, slice):
+            start, stop = self._slice_range(key)
+            values = list(value)
+            if len(values) != stop - start:
+                raise ValueError("PackedBits dilim ataması boyutu değiştiremez")
+            self.write_packed(start, len(values), pack_bits(values))
+            return
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("bit adresi aralık dışında")
+        if value:
+            self.data[key >> 3] |= 1 << (key & 7)
+        else:
+            self.data[key >> 3] &= ~(1 << (key & 7)) & 0xFF
+
+    def read_packed(self, address: int, count: int) -> bytes:
+        """[address, address + count) bitleri yanıt formatında ((count + 7) // 8 byte); depo dışı bitler 0"""
+        if count <= 0:
+            return b''
+        if address < 0:  # Deponun önüne taşan kısım 0
+            window = int.from_bytes(self.read_packed(0, count + address), 'little') << -address
+            return window.to_bytes((count + 7) // 8, 'little')
+        window = int.from_bytes(self.data[address >> 3:(address + count + 7) >> 3], 'little') >> (address & 7)
+        return (window & ((1 << count) - 1)).to_bytes((count + 7) // 8, 'little')
+
+    def write_packed(self, address: int, count: int, packed: bytes):
+        """İstek formatındaki (LSB ilk) `count` biti address'ten itibaren yaz"""
+        if count <= 0:
+            return
+        if address < 0 or address + count > self.size:
+            raise IndexError("bit aralığı depo dışında")
+        first, last = address >> 3, (address + count + 7) >> 3
+        shift = address & 7
+        mask = ((1 << count) - 1) << shift
+        bits = (int.from_bytes(packed[:(count + 7) // 8], 'little') << shift) & mask
+        window = int.from_bytes(self.data[first:last], 'little')
+        self.data[first:last] = ((window & ~mask) | bits).to_bytes(last - first, 'little')
+
+def pack_registers(values: Sequence[int]) -> bytes:
+    """16-bit register değerlerini big-endian byte dizisine çevir"""
+    return struct.pack(f'>{len(values)}H', *values)
+
+def unpack_registers(data: bytes, count: int) -> List[int]:
+    """Big-endian byte dizisinden `count` adet 16-bit register çıkar"""
+    return list(struct.unpack_from(f'>{count}H', data))
+
+# ---------------------------------------------------------------------------
+# İstek kodlama (ADU = MBAP + PDU)
+# ---------------------------------------------------------------------------
+
+def build_request(transaction_id: int, function: ModbusFunctions, pdu_data: bytes,
+                  unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """MBAP header + fonksiyon kodu + PDU verisinden tam istek oluştur"""
+    length = len(pdu_data) + 2  # Unit ID (1) + Fonksiyon kodu (1) + Data Length
+    return MBAP_STRUCT.pack(transaction_id, 0, length, unit_id, function.value) + pdu_data
+
+def encode_read_request(transaction_id: int, function: ModbusFunctions, address: int,
+                        count: int, unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """0x01-0x04 okuma isteği"""
+    return build_request(transaction_id, function, ADDRESS_STRUCT.pack(address, count), unit_id)
+
+def encode_write_single(transaction_id: int, function: ModbusFunctions, address: int,
+                        value: int, unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """0x05 / 0x06 tekli yazma isteği"""
+    return build_request(transaction_id, function, ADDRESS_STRUCT.pack(address, value), unit_id)
+
+def encode_write_multiple_coils(transaction_id: int, address: int, values: Sequence[bool],
+                                unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """0x0F çoklu coil yazma isteği"""
+    coil_bytes = pack_bits(values)
+    pdu = MULTI_WRITE_STRUCT.pack(address, len(values), len(coil_bytes)) + coil_bytes
+    return build_request(transaction_id, ModbusFunctions.WRITE_MULTIPLE_COILS, pdu, unit_id)
+
+def encode_write_multiple_registers(transaction_id: int, address: int, values: Sequence[int],
+                                    unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """0x10 çoklu register yazma isteği"""
+    register_bytes = pack_registers(values)
+    pdu = MULTI_WRITE_STRUCT.pack(address, len(values), len(register_bytes)) + register_bytes
+    return build_request(transaction_id, ModbusFunctions.WRITE_MULTIPLE_REGISTERS, pdu, unit_id)
+
+def encode_read_write_registers(transaction_id: int, read_address: int, read_count: int,
+                                write_address: int, values: Sequence[int],
+                                unit_id: int = DEFAULT_UNIT_ID) -> bytes:
+    """0x17 tek istekte register yazma + okuma (yazma önce uygulanır)"""
+    register_bytes = pack_registers(values)
+    pdu = READ_WRITE_STRUCT.pack(read_address, read_count, write_address, len(values),
+                                 len(register_bytes)) + register_bytes
+    return build_request(transaction_id, ModbusFunctions.READ_WRITE_MULTIPLE_REGISTERS, pdu, unit_id)
+
+# ---------------------------------------------------------------------------
+# Yanıt çözme ve hata eşleme
+# ---------------------------------------------------------------------------
+
+def check_response(response: bytes, min_size: int = 8) -> ModbusError:
+    """Yanıt boyutunu ve exception bitini kontrol et"""
+    if len(response) < min_size:
+        return ModbusError.COMMUNICATION_ERROR
+    if response[7] & 0x80:  # Hata yanıtı
+        if len(response) > 8:
+            return EXCEPTION_CODE_MAP.get(response[8], ModbusError.GENERAL_ERROR)
+        return ModbusError.ILLEGAL_FUNCTION
+    return ModbusError.OK
+
+def decode_read_bits_response(response: bytes, count: int) -> Tuple[ModbusError, List[bool]]:
+    """0x01 / 0x02 yanıtını bool listesine çevir"""
+    error = check_response(response, 9)  # MBAP (7) + Function (1) + Byte Count (1)
+    if error != ModbusError.OK:
+        return error, []
+    byte_count = response[8]
+    return ModbusError.OK, unpack_bits(response[9:9 + byte_count], count)
+
+def decode_read_registers_response(response: bytes, count: int) -> Tuple[ModbusError, List[int]]:
+    """0x03 / 0x04 / 0x17 yanıtını register listesine çevir"""
+    error = check_response(response, 9)
+    if error != ModbusError.OK:
+        return error, []
+    byte_count = response[8]
+    if byte_count != count * 2 or len(response) < 9 + byte_count:
+        return ModbusError.WRONG_DATA, []
+    return ModbusError.OK, unpack_registers(response[9:], count)
+
+def decode_write_response(response: bytes) -> ModbusError:
+    """0x05 / 0x06 / 0x0F / 0x10 yanıtını kontrol et"""
+    return check_response(response, 8)
+
+# ---------------------------------------------------------------------------
+# Çerçeveleme (TCP akışından tam ADU ayırma)
+# ---------------------------------------------------------------------------
+
+def frame_length(header: bytes) -> int:
+    """MBAP header'dan tüm ADU uzunluğunu hesapla"""
+    return 6 + ((header[4] << 8) | header[5])
+
+def split_frames(buffer: bytearray) -> List[bytes]:
+    """Buffer'daki tamamlanmış ADU'ları ayır, kalan parçayı buffer'da bırak"""
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= MBAP_HEADER_LENGTH:
+        total = frame_length(buffer[offset:offset + 6])
+        if len(buffer) - offset < total:
+            break
+        frames.append(bytes(buffer[offset:offset + total]))
+        offset += total
+    if offset:
+        del buffer[:offset]
+    return frames
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Soketten tam olarak `size` byte oku (bağlantı kapanırsa None)"""
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Soketten tek bir tam Modbus TCP ADU oku"""
+    header = recv_exact(sock, MBAP_HEADER_LENGTH)
+    if header is None:
+        return None
+    remaining = frame_length(header) - MBAP_HEADER_LENGTH
+    if remaining < 0 or remaining > MODBUS_TCP_MAX_ADU_LENGTH - MBAP_HEADER_LENGTH:
+        return None
+    body = recv_exact(sock, remaining) if remaining else b''
+    if body is None:
+        return None
+    return header + body
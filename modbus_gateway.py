@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Modbus TCP gateway / proxy
+Çok sayıda master'ı (upstream) az sayıda downstream bağlantısı üzerinden saha cihazlarına (BMS slave) taşır.
+
+  - Sunucu tarafı MegaBMSSlave'in serve() döngüsüdür; reply() isteği yanıtlamak yerine downstream'e iletir
+  - Downstream bağlantıları ModbusMaster / TCPClient ile açılır; her bağlantıda en fazla max_in_flight
+    istek pipelined gönderilir, transaction ID'ler bağlantı başına yeniden numaralanır ve yanıtta geri eşlenir
+  - Aynı (hedef, unit, PDU) okuması havadayken gelen okumalar yeni istek üretmez, aynı yanıtı paylaşır
+  - Bir unit'e yazma gelince o unit'in havadaki okumaları birleştirmeye kapatılır (yazma sonrası okuma
+    yazmadan önce gönderilmiş yanıtı almaz)
+  - Tüm bağlantılar doluysa istekler kuyrukta bekler; cihaz (veya kuyruk) timeout içinde yanıt vermezse 0x0B döner
+  - Downstream bağlantıları havuz başına connector thread'inde açılır; serve() döngüsü yalnızca kuyruğa alıp
+    haber verir (yavaş / erişilemeyen hedef diğer hedeflerin trafiğini durdurmaz)
+
+KULLANIM:
+python3 modbus_gateway.py --port 1502 --downstream 127.0.0.1:1024
+python3 modbus_gateway.py --downstream 1=10.0.0.5:502 --downstream 2=10.0.0.6:502 --connections 2 --max-in-flight 4
+"""
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from bms_slave import MegaBMSSlave
+from modbus import ModbusMaster
+from modbus_core import HEADER_STRUCT, split_frames
+
+READ_FUNCTIONS = (0x01, 0x02, 0x03, 0x04)
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+EXPIRE_INTERVAL = 0.2  # Okuma döngüsünün timeout kontrol aralığı (s); soket timeout'u da budur
+
+@dataclass
+class PendingRequest:
+    key: Optional[tuple]  # (havuz, unit, PDU); yalnızca okumalar birleştirilir
+    unit_id: int
+    pdu: bytes            # Fonksiyon kodu + veri (MBAP hariç)
+    waiters: List[tuple] = field(default_factory=list)  # (upstream soket, transaction ID, protocol ID, istek boyu, başlangıç)
+    sent: float = 0.0
+    queued: float = 0.0   # Havuza verildiği an (kuyrukta bekleme de timeout'a sayılır)
+
+class DownstreamConnection:
+    """Tek downstream TCP bağlantısı; yanıtlar downstream transaction ID ile isteğe eşlenir"""
+
+    def __init__(self, pool: "DownstreamPool"):
+        self.pool = pool
+        self.master: Optional[ModbusMaster] = None
+        self.pending: Dict[int, PendingRequest] = {}
+        self.last_attempt = 0.0
+        self.connecting = False  # open() kilit dışında sürüyor; başka thread aynı bağlantıyı açmaz
+        self.thread = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.master is not None
+
+    def open(self) -> Optional[ModbusMaster]:
+        """Bağlan (gateway kilidi dışında, bloklayabilir); bağlantı attach() ile devreye alınır"""
+        master = ModbusMaster()
+        if not master.connect(self.pool.host, self.pool.port):
+            master.close()
+            return None
+        try:
+            master.tcp_client.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            master.tcp_client.socket.settimeout(EXPIRE_INTERVAL)  # Boştaki okuma döngüsü de timeout kontrolü yapar
+        except OSError:
+            master.close()  # Bağlantı hemen koptu; connecting bayrağı connector'da yine temizlenir
+            return None
+        return master
+
+    def attach(self, master: ModbusMaster):
+        """Açılan bağlantıyı kullanıma al ve okuma thread'ini başlat (gateway kilidi altında)"""
+        self.master = master
+        self.thread = threading.Thread(target=self.read_loop, args=(master,), daemon=True,
+                                       name=f"downstream-{self.pool.host}:{self.pool.port}")
+        self.thread.start()
+
+    def send(self, request: PendingRequest) -> bool:
+        """Gateway kilidi altında çağrılır"""
+        transaction_id = self.master._next_transaction_id()
+        frame = HEADER_STRUCT.pack(transaction_id, 0, len(request.pdu) + 1, request.unit_id) + request.pdu
+        request.sent = time.monotonic()
+        self.pending[transaction_id] = request
+        if self.master.tcp_client.send_data_to_server(frame) != 0:
+            del self.pending[transaction_id]
+            return False
+        return True
+
+    def read_loop(self, master: ModbusMaster):
+        buffer = bytearray()
+        sock = master.tcp_client.socket
+        last_expire = time.monotonic()
+        try:
+            while self.master is master:
+                try:
+                    data = sock.recv(4096)
+                except socket.timeout:
+                    data = None
+                except OSError:
+                    data = b''
+                if data == b'':
+                    break
+                if data:
+                    buffer.extend(data)
+                    for frame in split_frames(buffer):
+                        self.pool.gateway.complete(self, frame)
+                # Veri akmaya devam etse de (ör. diğer isteklerin yanıtları) yanıtsız istekler zaman aşımına düşer
+                now = time.monotonic()
+                if data is None or now - last_expire >= EXPIRE_INTERVAL:
+                    last_expire = now
+                    self.pool.gateway.expire(self)
+        except Exception as e:
+            # Thread sessizce ölürse bağlantı açık görünür, istekleri hiç yanıtlanmaz
+            print(f"❌ Downstream okuma hatası ({self.pool.host}:{self.pool.port}): {e}")
+        self.pool.gateway.connection_lost(self, master)
+
+    def close(self) -> List[PendingRequest]:
+        """Bağlantıyı kapat; yanıtı beklenen istekleri döndür (gateway kilidi altında)"""
+        failed = list(self.pending.values())
+        self.pending.clear()
+        if self.master is not None:
+            self.master.close()
+            self.master = None
+        return failed
+
+class DownstreamPool:
+    """Tek downstream hedefine (host:port) bağlantı havuzu ve slot bekleyen istek kuyruğu"""
+
+    def __init__(self, gateway: "ModbusGateway", host: str, port: int, connections: int = 2,
+                 max_in_flight: int = 4, retry_interval: float = 1.0):
+        self.gateway = gateway
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight  # Bağlantı başına havadaki istek üst sınırı (cihaz koruması)
+        self.retry_interval = retry_interval  # Kopan bağlantıyı yeniden deneme aralığı (s)
+        self.connections = [DownstreamConnection(self) for _ in range(connections)]
+        self.queue = deque()
+        self.wakeup = threading.Event()  # Kuyruğa istek düştü / bağlantı koptu: connector bağlantı açmayı dener
+        self.stopped = False
+        self.connector = threading.Thread(target=self.connector_loop, daemon=True, name=f"connector-{host}:{port}")
+        self.connector.start()
+
+    def connector_loop(self):
+        """Bağlantıları serve() ve okuma thread'leri dışında aç; açılış bu havuzdan başka trafiği bekletmez"""
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.stopped:
+                return
+            self.gateway._dispatch(self)
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def _available(self) -> Optional[DownstreamConnection]:
+        open_connections = [c for c in self.connections if c.is_open and len(c.pending) < self.max_in_flight]
+        if open_connections:
+            return min(open_connections, key=lambda c: len(c.pending))
+        return None
+
+    def claim_reconnects(self) -> List[DownstreamConnection]:
+        """Kuyrukta istek varken yeniden denenecek kapalı bağlantılar (kilit altında işaretlenir)"""
+        if not self.queue:
+            return []
+        now = time.monotonic()
+        claimed = [c for c in self.connections if not c.is_open and not c.connecting and
+                   now - c.last_attempt >= self.retry_interval]
+        for connection in claimed:
+            connection.connecting = True
+            connection.last_attempt = now
+        return claimed
+
+    def submit(self, request: PendingRequest) -> bool:
+        """İsteği boş slotu olan bağlantıya gönder, yoksa kuyruğa al (kilit altında); gönderildi mi"""
+        request.queued = time.monotonic()
+        connection = self._available()
+        if connection is not None and connection.send(request):
+            return True
+        self.queue.append(request)
+        return False
+
+    def expire_queue(self, now: float, timeout: float) -> List[PendingRequest]:
+        """timeout süresinden uzun kuyrukta bekleyen istekleri çıkar (kilit altında)"""
+        expired = [request for request in self.queue if now - request.queued > timeout]
+        if expired:
+            self.queue = deque(request for request in self.queue if now - request.queued <= timeout)
+        return expired
+
+    def drain(self) -> List[PendingRequest]:
+        """Boşalan slotlara kuyruktaki istekleri gönder (kilit altında)"""
+        while self.queue:
+            connection = self._available()
+            if connection is None:
+                break
+            request = self.queue.popleft()
+            if not connection.send(request):
+                self.queue.appendleft(request)
+                break
+        if not any(c.is_open or c.connecting for c in self.connections):
+            failed = list(self.queue)
+            self.queue.clear()
+            return failed
+        return []
+
+class ModbusGateway(MegaBMSSlave):
+    def __init__(self, host: str = "0.0.0.0", port: int = 1502, timeout: float = 2.0):
+        super().__init__(host, port)
+        self.verbose = False
+        self.refresh_on_request = False
+        self.timeout = timeout  # Downstream yanıt süresi üst sınırı (s)
+        self.routes: Dict[int, DownstreamPool] = {}  # unit ID -> havuz
+        self.default_route: Optional[DownstreamPool] = None  # Rotası olmayan unit'ler
+        self.in_flight: Dict[tuple, PendingRequest] = {}  # Birleştirilebilir okumalar
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()  # Farklı downstream thread'leri aynı upstream sokete yazabilir
+        self.forwarded = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+
+    def add_route(self, host: str, port: int, unit_id: int = None, connections: int = 2,
+                  max_in_flight: int = 4) -> DownstreamPool:
+        """unit_id None ise rotası olmayan tüm unit'ler bu hedefe gider; unit ID değiştirilmeden iletilir"""
+        pool = DownstreamPool(self, host, port, connections, max_in_flight)
+        if unit_id is None:
+            self.default_route = pool
+        else:
+            self.routes[unit_id] = pool
+        return pool
+
+    def _respond(self, waiters: List[tuple], unit_id: int, pdu: bytes):
+        for client_socket, transaction_id, protocol_id, query_length, start in waiters:
+            response = HEADER_STRUCT.pack(transaction_id, protocol_id, len(pdu) + 1, unit_id) + pdu
+            try:
+                with self.send_lock:
+                    client_socket.sendall(response)
+            except OSError:
+                continue  # Master bu sırada bağlantıyı kapatmış
+            self.metrics.record(self._client_name(client_socket), pdu[0] & 0x7F, query_length, len(response),
+                                time.perf_counter() - start, bool(pdu[0] & 0x80))
+
+    def _fail(self, requests: List[PendingRequest], exception_code: int = GATEWAY_TARGET_FAILED):
+        for request in requests:
+            with self.lock:
+                if request.key is not None and self.in_flight.get(request.key) is request:
+                    del self.in_flight[request.key]
+                waiters = list(request.waiters)
+            self._respond(waiters, request.unit_id, bytes([request.pdu[0] | 0x80, exception_code]))
+
+    def reply(self, client_socket: socket.socket, query: bytes) -> bool:
+        start = time.perf_counter()
+        if len(query) < 8:
+            return False
+        transaction_id, protocol_id, _, unit_id = HEADER_STRUCT.unpack_from(query)
+        pdu = query[7:]
+        waiter = (client_socket, transaction_id, protocol_id, len(query), start)
+
+        pool = self.routes.get(unit_id, self.default_route)
+        if pool is None:
+            self._respond([waiter], unit_id, bytes([pdu[0] | 0x80, GATEWAY_PATH_UNAVAILABLE]))
+            return True
+
+        key = (id(pool), unit_id, pdu) if pdu[0] in READ_FUNCTIONS else None
+        with self.lock:
+            if key is not None:
+                request = self.in_flight.get(key)
+                if request is not None:
+                    request.waiters.append(waiter)
+                    self.deduplicated += 1
+                    return True
+            else:
+                # Yazmadan sonra gelen okumalar yazmadan önce gönderilmiş okumalara bağlanmaz
+                for stale in [k for k in self.in_flight if k[0] == id(pool) and k[1] == unit_id]:
+                    del self.in_flight[stale]
+            request = PendingRequest(key, unit_id, pdu, [waiter])
+            if key is not None:
+                self.in_flight[key] = request
+            self.forwarded += 1
+            sent = pool.submit(request)
+        if not sent:
+            pool.wakeup.set()  # Bağlantı açma connector thread'inde; serve() döngüsü beklemez
+        return True
+
+    def _dispatch(self, pool: DownstreamPool):
+        """Connector thread'i: kapalı bağlantıları kilit dışında aç, sonra kuyruğu boşalt (açık bağlantı yoksa 0x0B)"""
+        with self.lock:
+            connections = pool.claim_reconnects()
+        opened = [(connection, connection.open()) for connection in connections]
+        with self.lock:
+            for connection, master in opened:
+                connection.connecting = False
+                if master is not None:
+                    connection.attach(master)
+            failed = pool.drain()
+        self._fail(failed)
+
+    def complete(self, connection: DownstreamConnection, frame: bytes):
+        """Downstream yanıtı: transaction ID ile isteği bul, tüm bekleyenlere gönder"""
+        if len(frame) < 8:
+            return
+        transaction_id = struct.unpack_from('>H', frame)[0]
+        with self.lock:
+            request = connection.pending.pop(transaction_id, None)
+            if request is None:
+                return  # Timeout'a düşmüş isteğin geç yanıtı
+            if request.key is not None and self.in_flight.get(request.key) is request:
+                del self.in_flight[request.key]
+            waiters = list(request.waiters)
+            failed = connection.pool.drain()
+        self._respond(waiters, request.unit_id, frame[7:])
+        self._fail(failed)
+
+    def expire(self, connection: DownstreamConnection):
+        """timeout süresini aşan (gönderilmiş veya havuz kuyruğunda bekleyen) istekleri 0x0B ile yanıtla"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [tid for tid, request in connection.pending.items() if now - request.sent > self.timeout]
+            requests = [connection.pending.pop(tid) for tid in expired]
+            queued = connection.pool.expire_queue(now, self.timeout)
+            self.timeouts += len(requests) + len(queued)
+            failed = connection.pool.drain() if requests else []
+        self._fail(requests + queued + failed)
+
+    def connection_lost(self, connection: DownstreamConnection, master: ModbusMaster):
+        with self.lock:
+            if connection.master is not master:
+                return
+            failed = connection.close()
+        print(f"⚠️ Downstream bağlantısı koptu ({connection.pool.host}:{connection.pool.port}), "
+              f"{len(failed)} istek başarısız")
+        self._fail(failed)
+        connection.pool.wakeup.set()  # Kuyruk diğer bağlantılara ya da yeniden bağlantıya gider
+
+    def stats(self) -> dict:
+        with self.lock:
+            pools = ([self.default_route] if self.default_route else []) + list(self.routes.values())
+            return {
+                "forwarded": self.forwarded,
+                "deduplicated": self.deduplicated,
+                "timeouts": self.timeouts,
+                "in_flight": sum(len(c.pending) for pool in pools for c in pool.connections),
+                "queued": sum(len(pool.queue) for pool in pools),
+            }
+
+    def close(self):
+        with self.lock:
+            pools = ([self.default_route] if self.default_route else []) + list(self.routes.values())
+            for pool in pools:
+                pool.stop()
+                for connection in pool.connections:
+                    connection.close()
+        super().close()
+
+def parse_downstream(spec: str) -> Tuple[Optional[int], str, int]:
+    """'host:port' veya 'unit=host:port' -> (unit ID veya None, host, port)"""
+    unit_id = None
+    if "=" in spec:
+        unit, spec = spec.split("=", 1)
+        unit_id = int(unit)
+    host, _, port = spec.rpartition(":")
+    return unit_id, host, int(port)
+
+def run_gateway(port: int, downstream: List[str], connections: int = 2, max_in_flight: int = 4,
+                timeout: float = 2.0, metrics_port: int = None):
+    gateway = ModbusGateway(port=port, timeout=timeout)
+    for spec in downstream:
+        unit_id, host, downstream_port = parse_downstream(spec)
+        gateway.add_route(host, downstream_port, unit_id, connections, max_in_flight)
+        target = "varsayılan" if unit_id is None else f"unit {unit_id}"
+        print(f"🔀 {target} -> {host}:{downstream_port} ({connections} bağlantı x {max_in_flight} pipelined istek)")
+
+    if not gateway.tcp_listen(max_connections=64):
+        print("Socket açılamadı")
+        return
+    if metrics_port:
+        from slave_metrics import start_metrics_server
+        start_metrics_server(gateway.metrics, metrics_port)
+        print(f"📈 Metrikler: http://127.0.0.1:{metrics_port}/metrics")
+
+    print(f"🚪 Modbus gateway port {port} üzerinde dinliyor (downstream timeout {timeout:g}s)")
+    try:
+        gateway.serve()
+    except KeyboardInterrupt:
+        print("\n🛑 Gateway kapatılıyor...")
+    finally:
+        stats = gateway.stats()
+        print(f"📊 İletilen {stats['forwarded']} | birleştirilen {stats['deduplicated']} | timeout {stats['timeouts']}")
+        gateway.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Modbus TCP gateway / proxy")
+    parser.add_argument("--port", type=int, default=1502, help="Upstream master'ların bağlanacağı port")
+    parser.add_argument("--downstream", action="append", required=True,
+                        help="Hedef slave: host:port (tüm unit'ler) veya unit=host:port; tekrarlanabilir")
+    parser.add_argument("--connections", type=int, default=2, help="Hedef başına downstream bağlantı sayısı")
+    parser.add_argument("--max-in-flight", type=int, default=4,
+                        help="Bağlantı başına havadaki istek üst sınırı (cihaz koruması)")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Downstream yanıt timeout'u (s)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Metrikleri bu portta HTTP ile sun (/metrics, /metrics.json)")
+    args = parser.parse_args()
+    run_gateway(args.port, args.downstream, args.connections, args.max_in_flight, args.timeout, args.metrics_port)
@@ -0,0 +1,87 @@
+"""
+ModbusMaster için istemci tarafı okuma önbelleği (read-through)
+Anahtar (unit, FC, adres, adet); kayıt TTL süresi dolana kadar ağ turu olmadan döner.
+
+  set_ttl(address, count, ttl, function)  : aralık başına TTL (ör. SOC 1 s, dengeleme bayrakları 5 s)
+                                            birden çok aralığa düşen okuma en kısa TTL'i alır; 0 = önbelleğe alma
+  get() / put()                           : ModbusMaster._read_bits / _read_registers kullanır
+  invalidate(unit, FC, adres, adet)       : yazma sonrası örtüşen okumalar düşürülür (FC05/0F -> FC01, FC06/10/17 -> FC03)
+
+max_entries dolunca en uzun süredir kullanılmayan kayıt (LRU) atılır.
+"""
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Yazma fonksiyon kodu -> geçersizleşen okuma fonksiyon kodları
+WRITE_INVALIDATES = {
+    0x05: (0x01,), 0x0F: (0x01,),
+    0x06: (0x03,), 0x10: (0x03,), 0x17: (0x03,),
+}
+
+class ReadCache:
+    def __init__(self, default_ttl: float = 1.0, max_entries: int = 256):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Tuple[float, list]]" = OrderedDict()  # anahtar -> (son geçerlilik, değerler)
+        # Okuma FC'si (None = tümü) -> başlangıca göre sıralı (başlangıç, bitiş, ttl) kuralları
+        self.rules: Dict[Optional[int], List[Tuple[int, int, float]]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_ttl(self, address: int, count: int, ttl: float, function: Optional[int] = None):
+        """[address, address + count) okumalarının TTL'i; function None ise tüm okuma FC'leri"""
+        rules = self.rules.setdefault(function, [])
+        rules.append((address, address + count, ttl))
+        rules.sort()
+
+    def ttl_for(self, function: int, address: int, count: int) -> float:
+        end = address + count
+        ttl = None
+        for rules in (self.rules.get(function, ()), self.rules.get(None, ())):
+            # Başlangıcı okumanın bitişinden önce olan kurallardan örtüşenler
+            for start, stop, rule_ttl in rules[:bisect_right(rules, (end,))]:
+                if stop > address and start < end:
+                    ttl = rule_ttl if ttl is None else min(ttl, rule_ttl)
+        return self.default_ttl if ttl is None else ttl
+
+    def get(self, key: tuple) -> Optional[list]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: tuple, values: list):
+        unit_id, function, address, count = key
+        ttl = self.ttl_for(function, address, count)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, list(values))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, unit_id: int, write_function: int, address: int, count: int) -> int:
+        """Yazmayla örtüşen okuma kayıtlarını düşür; düşürülen kayıt sayısı"""
+        functions = WRITE_INVALIDATES.get(write_function, ())
+        end = address + count
+        with self.lock:
+            stale = [key for key in self.entries
+                     if key[0] == unit_id and key[1] in functions and key[2] < end and key[2] + key[3] > address]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
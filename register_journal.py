@@ -0,0 +1,126 @@
+"""
+Register bankası için yazma günlüğü (journal) ve kirli aralık bitmap'leri
+Slave'e gelen her yazma (FC05 / FC06 / FC10) tek bir kayıt olarak günlüğe eklenir ve
+kayıtlı tüm tüketicilerin (dengeleme, kalıcılık, replikasyon, önbellek ...) bitmap'lerini işaretler.
+
+Tüketiciler iki yoldan birini kullanır:
+  consumer(name).take(table)   : son take'ten beri değişen aralıklar, birleştirilmiş (start, count) listesi
+  ranges_since(sequence, table): sıra numarasından beri değişen aralıklar (günlük taşmışsa None -> tam tarama)
+
+Aynı döngüde üst üste gelen / bitişik yazmalar aralık listesinde birleşir;
+50.000 girişlik tabloyu taramak yerine yalnızca değişen aralıklar işlenir.
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+TABLES = ("bits", "input_bits", "registers", "input_registers")
+
+@dataclass
+class JournalEntry:
+    sequence: int
+    table: str
+    address: int
+    count: int
+    generation: int
+    timestamp: float
+    source: str = "modbus"
+
+def bitmap_ranges(bitmap: np.ndarray) -> List[Tuple[int, int]]:
+    """Bool bitmap'teki ardışık True bölgeleri -> [(start, count), ...]"""
+    edges = np.diff(np.concatenate(([0], bitmap.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), (ends - starts).tolist()))
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Çakışan / bitişik (start, count) aralıklarını birleştir"""
+    merged = []
+    for start, count in sorted(ranges):
+        if merged and start <= merged[-1][0] + merged[-1][1]:
+            last_start, last_count = merged[-1]
+            merged[-1] = (last_start, max(last_count, start + count - last_start))
+        else:
+            merged.append((start, count))
+    return merged
+
+class DirtyRanges:
+    """Tek tüketicinin tablo başına kirli bitmap'i (yalnızca izlediği tablolar için)"""
+
+    def __init__(self, sizes: Dict[str, int], wakeup: Optional[threading.Event] = None):
+        self.bitmaps = {table: np.zeros(size, dtype=bool) for table, size in sizes.items()}
+        self.counts = dict.fromkeys(sizes, 0)  # take'ten beri işaretlenen yazma sayısı
+        self.wakeup = wakeup  # Verilirse her işaretlemede set edilir (tüketici thread'ini uyandırır)
+        self.lock = threading.Lock()
+
+    def mark(self, table: str, address: int, count: int = 1):
+        if table not in self.bitmaps:
+            return
+        with self.lock:
+            self.bitmaps[table][address:address + count] = True
+            self.counts[table] += 1
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def pending(self, table: str = "registers") -> bool:
+        return self.counts[table] > 0
+
+    def take(self, table: str = "registers") -> List[Tuple[int, int]]:
+        """Kirli aralıkları döndür ve temizle"""
+        with self.lock:
+            if not self.counts[table]:
+                return []
+            bitmap = self.bitmaps[table]
+            ranges = bitmap_ranges(bitmap)
+            for start, count in ranges:
+                bitmap[start:start + count] = False
+            self.counts[table] = 0
+        return ranges
+
+class WriteJournal:
+    def __init__(self, sizes: Dict[str, int], max_entries: int = 4096):
+        self.sizes = sizes
+        self.entries = deque(maxlen=max_entries)
+        self.sequence = 0  # Son kaydın sıra numarası (1'den başlar)
+        self.consumers: Dict[str, DirtyRanges] = {}
+        self.lock = threading.Lock()
+
+    def consumer(self, name: str, tables: Sequence[str] = TABLES,
+                 wakeup: Optional[threading.Event] = None) -> DirtyRanges:
+        """Adlandırılmış tüketicinin bitmap'i (ilk çağrıda oluşturulur, önceki yazmaları görmez)"""
+        with self.lock:
+            dirty = self.consumers.get(name)
+            if dirty is None:
+                sizes = {table: self.sizes[table] for table in tables}
+                dirty = self.consumers[name] = DirtyRanges(sizes, wakeup)
+            return dirty
+
+    def record(self, table: str, address: int, count: int, generation: int, source: str = "modbus") -> int:
+        """Yazmayı günlüğe ekle ve tüketicileri işaretle; kaydın sıra numarası"""
+        with self.lock:
+            self.sequence += 1
+            self.entries.append(JournalEntry(self.sequence, table, address, count, generation,
+                                             time.time(), source))
+            consumers = list(self.consumers.values())
+            sequence = self.sequence
+        for dirty in consumers:
+            dirty.mark(table, address, count)
+        return sequence
+
+    def since(self, sequence: int) -> Optional[List[JournalEntry]]:
+        """sequence'tan sonraki kayıtlar; aradaki kayıtlar düşmüşse None"""
+        with self.lock:
+            if sequence >= self.sequence:
+                return []
+            if not self.entries or self.entries[0].sequence > sequence + 1:
+                return None
+            return [entry for entry in self.entries if entry.sequence > sequence]
+
+    def ranges_since(self, sequence: int, table: str = "registers") -> Optional[List[Tuple[int, int]]]:
+        entries = self.since(sequence)
+        if entries is None:
+            return None
+        return merge_ranges([(entry.address, entry.count) for entry in entries if entry.table == table])
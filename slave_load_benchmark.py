@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+MegaBMSSlave yük üreteci ve throughput / gecikme benchmark'ı
+Slave ayrı bir süreçte yerel olarak başlatılır (veya --host ile mevcut slave'e bağlanılır),
+her master ayrı süreçte pipelined istekler gönderir.
+
+İstek türleri (--mix ile ağırlıklandırılır):
+  main   : Ana parametreler (FC03, 1000-1015)
+  cells  : Tüm hücre voltajı taraması (FC03, 124'lük bloklar)
+  coils  : Coil okuma (FC01, 2000 coil)
+  write  : Coil yazma (FC05)
+
+KULLANIM:
+python3 slave_load_benchmark.py [--clients 4] [--depth 8] [--duration 5] [--mix main=4,cells=4,coils=1,write=1]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+from typing import Dict, List, Tuple
+from bms_register_map import BMSRegisters
+from modbus_core import (
+    ModbusFunctions, CoilValue, encode_read_request, encode_write_single, split_frames
+)
+
+CELL_REGISTER_COUNT = 12 * 4 * 104 * 2
+SWEEP_BLOCK = 124  # Float çiftleri bölünmesin diye çift sayı
+
+def build_request_kinds() -> Dict[str, List[Tuple[ModbusFunctions, int, int]]]:
+    """Her istek türü için sırayla gönderilecek (FC, adres, adet/değer) listesi"""
+    cell_sweep = []
+    for offset in range(0, CELL_REGISTER_COUNT, SWEEP_BLOCK):
+        count = min(SWEEP_BLOCK, CELL_REGISTER_COUNT - offset)
+        cell_sweep.append((ModbusFunctions.READ_HOLDING_REGISTERS, BMSRegisters.CELL_VOLTAGE_BASE + offset, count))
+    return {
+        "main": [(ModbusFunctions.READ_HOLDING_REGISTERS, BMSRegisters.SOC, 16)],
+        "cells": cell_sweep,
+        "coils": [(ModbusFunctions.READ_COILS, 0, 2000)],
+        "write": [(ModbusFunctions.WRITE_SINGLE_COIL, address, value)
+                  for address in range(100, 110)
+                  for value in (CoilValue.COIL_ON.value, CoilValue.COIL_OFF.value)],
+    }
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - set(build_request_kinds())
+    if unknown:
+        raise ValueError(f"Bilinmeyen istek türü: {', '.join(sorted(unknown))}")
+    return mix
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Sıralı listeden nearest-rank yüzdelik"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def _slave_process(port: int, refresh_on_request: bool, ready, stop_event):
+    sys.stdout = open(os.devnull, "w")
+    from bms_slave import MegaBMSSlave
+    slave = MegaBMSSlave(port=port)
+    slave.verbose = False
+    slave.refresh_on_request = refresh_on_request
+    slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000)
+    slave.initialize_mega_bms_data()
+    if not slave.tcp_listen(max_connections=128):
+        return
+    ready.set()
+    try:
+        slave.serve(stop_event, poll_interval=0.1)
+    finally:
+        slave.close()
+
+def _client_process(host: str, port: int, mix: Dict[str, int], depth: int,
+                    duration: float, seed: int, results):
+    kinds = build_request_kinds()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    positions = {name: 0 for name in names}
+    rng = random.Random(seed)
+
+    sock = socket.create_connection((host, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    buffer = bytearray()
+    inflight = {}
+    latencies = {name: [] for name in names}
+    errors = 0
+    transaction_id = 0
+    deadline = time.perf_counter() + duration
+
+    def next_request() -> Tuple[str, bytes]:
+        nonlocal transaction_id
+        name = rng.choices(names, weights)[0]
+        plan = kinds[name]
+        function, address, value = plan[positions[name] % len(plan)]
+        positions[name] += 1
+        transaction_id = (transaction_id + 1) % 65536
+        if function in (ModbusFunctions.WRITE_SINGLE_COIL, ModbusFunctions.WRITE_SINGLE_REGISTER):
+            return name, encode_write_single(transaction_id, function, address, value)
+        return name, encode_read_request(transaction_id, function, address, value)
+
+    try:
+        while inflight or time.perf_counter() < deadline:
+            # Pipeline derinliğine kadar istek gönder
+            batch = []
+            while len(inflight) < depth and time.perf_counter() < deadline:
+                name, request = next_request()
+                inflight[transaction_id] = (time.perf_counter(), name)
+                batch.append(request)
+            if batch:
+                sock.sendall(b"".join(batch))
+
+            data = sock.recv(65536)
+            if not data:
+                break
+            buffer.extend(data)
+            now = time.perf_counter()
+            for frame in split_frames(buffer):
+                sent = inflight.pop((frame[0] << 8) | frame[1], None)
+                if sent is None:
+                    errors += 1
+                    continue
+                latencies[sent[1]].append(now - sent[0])
+                if frame[7] & 0x80:
+                    errors += 1
+    finally:
+        sock.close()
+    results.put((latencies, errors))
+
+def run_benchmark(clients: int = 4, depth: int = 8, duration: float = 5.0,
+                  mix: Dict[str, int] = None, host: str = None, port: int = 15022,
+                  refresh_on_request: bool = False) -> dict:
+    mix = mix or {"main": 4, "cells": 4, "coils": 1, "write": 1}
+    slave = None
+    stop_event = multiprocessing.Event()
+    if host is None:
+        host = "127.0.0.1"
+        ready = multiprocessing.Event()
+        slave = multiprocessing.Process(target=_slave_process,
+                                        args=(port, refresh_on_request, ready, stop_event))
+        slave.start()
+        if not ready.wait(30):
+            slave.terminate()
+            raise RuntimeError("Slave başlatılamadı")
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_client_process,
+                                       args=(host, port, mix, depth, duration, seed, results))
+               for seed in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - started
+    for worker in workers:
+        worker.join()
+    if slave is not None:
+        stop_event.set()
+        slave.join(5)
+
+    per_kind = {name: [] for name in mix}
+    errors = 0
+    for latencies, worker_errors in collected:
+        errors += worker_errors
+        for name, values in latencies.items():
+            per_kind[name].extend(values)
+
+    def summarize(values: List[float]) -> dict:
+        values = sorted(values)
+        return {
+            "requests": len(values),
+            "p50_ms": percentile(values, 0.50) * 1e3,
+            "p99_ms": percentile(values, 0.99) * 1e3,
+            "p999_ms": percentile(values, 0.999) * 1e3,
+        }
+
+    all_latencies = [value for values in per_kind.values() for value in values]
+    summary = summarize(all_latencies)
+    summary["throughput_rps"] = len(all_latencies) / elapsed
+    summary["errors"] = errors
+    summary["per_kind"] = {name: summarize(values) for name, values in per_kind.items()}
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="MegaBMSSlave yük üreteci")
+    parser.add_argument("--clients", type=int, default=4, help="Eşzamanlı master sayısı")
+    parser.add_argument("--depth", type=int, default=8, help="Master başına pipeline derinliği")
+    parser.add_argument("--duration", type=float, default=5.0, help="Süre (saniye)")
+    parser.add_argument("--mix", default="main=4,cells=4,coils=1,write=1", help="İstek türü ağırlıkları")
+    parser.add_argument("--host", default=None, help="Mevcut slave (verilmezse yerelde başlatılır)")
+    parser.add_argument("--port", type=int, default=15022)
+    parser.add_argument("--json-refresh", action="store_true",
+                        help="Slave her istekte bms_data.json'u okusun (varsayılan: kapalı)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.clients, args.depth, args.duration, parse_mix(args.mix),
+                           args.host, args.port, args.json_refresh)
+
+    print("\n⏱️ MEGA BMS SLAVE YÜK TESTİ")
+    print("=" * 72)
+    print(f"  Master: {args.clients} | Pipeline: {args.depth} | Süre: {args.duration:.1f}s | Mix: {args.mix}")
+    print(f"  Throughput: {result['throughput_rps']:.0f} istek/s | Hata: {result['errors']}")
+    print("-" * 72)
+    print(f"  {'tür':<8} {'istek':>10} {'p50 ms':>10} {'p99 ms':>10} {'p999 ms':>10}")
+    rows = list(result["per_kind"].items()) + [("toplam", result)]
+    for name, stats in rows:
+        print(f"  {name:<8} {stats['requests']:>10} {stats['p50_ms']:>10.3f} "
+              f"{stats['p99_ms']:>10.3f} {stats['p999_ms']:>10.3f}")
+    print("=" * 72)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+MegaBMSSlave metrik kaydı
+Fonksiyon kodu ve master başına istek / hata / byte sayaçları ve HDR tarzı gecikme histogramları.
+
+  SlaveMetrics.record()       : reply() içinden her istek için çağrılır (kısa kilit altında, O(1);
+                                gateway'de downstream thread'lerinden eşzamanlı çağrılır)
+  SlaveMetrics.render_text()  : Prometheus text formatı (/metrics)
+  SlaveMetrics.format_table() : Periyodik konsol dökümü
+  start_metrics_server()      : Yerel HTTP endpoint (/metrics, /metrics.json)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+FUNCTION_NAMES = {
+    0x01: "read_coils",
+    0x02: "read_discrete_inputs",
+    0x03: "read_holding_registers",
+    0x04: "read_input_registers",
+    0x05: "write_single_coil",
+    0x06: "write_single_register",
+    0x0F: "write_multiple_coils",
+    0x10: "write_multiple_registers",
+    0x17: "read_write_multiple_registers",
+}
+
+class LatencyHistogram:
+    """Log-lineer kovalı histogram (µs); her ikinin kuvveti SUB_BUCKET_BITS ile alt kovalara bölünür"""
+    SUB_BUCKET_BITS = 5  # 2^5 = 32 alt kova -> en fazla ~%3 göreli hata
+    MAX_BITS = 40  # ~12 gün (µs); daha büyük değerler son kovaya yazılır
+
+    def __init__(self):
+        half = 1 << (self.SUB_BUCKET_BITS - 1)
+        self.counts = [0] * ((self.MAX_BITS - self.SUB_BUCKET_BITS + 2) * half)
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket_index(cls, value_us: int) -> int:
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value_us
+        return (shift << (cls.SUB_BUCKET_BITS - 1)) + (value_us >> shift)
+
+    @classmethod
+    def bucket_value(cls, index: int) -> int:
+        """Kovanın alt sınırı (µs)"""
+        if index < (1 << cls.SUB_BUCKET_BITS):
+            return index
+        shift = (index >> (cls.SUB_BUCKET_BITS - 1)) - 1
+        return (index - (shift << (cls.SUB_BUCKET_BITS - 1))) << shift
+
+    def record(self, seconds: float):
+        value = int(seconds * 1e6)
+        index = self.bucket_index(value)
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        if self.count == 0 or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+        self.count += 1
+        self.total_us += value
+
+    def percentile(self, fraction: float) -> int:
+        """Yaklaşık yüzdelik (µs, kova alt sınırı)"""
+        if self.count == 0:
+            return 0
+        target = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, bucket in enumerate(list(self.counts)):
+            seen += bucket
+            if seen >= target:
+                return min(max(self.bucket_value(index), self.min_us), self.max_us)
+        return self.max_us
+
+    def mean(self) -> float:
+        return self.total_us / self.count if self.count else 0.0
+
+class RequestStats:
+    """Tek bir anahtar (FC veya master) için sayaçlar"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = LatencyHistogram()
+
+    def record(self, bytes_in: int, bytes_out: int, elapsed: float, error: bool):
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.latency.record(elapsed)
+
+    def snapshot(self) -> dict:
+        latency = self.latency
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency_us": {
+                "min": latency.min_us,
+                "mean": round(latency.mean(), 1),
+                "p50": latency.percentile(0.50),
+                "p99": latency.percentile(0.99),
+                "p999": latency.percentile(0.999),
+                "max": latency.max_us,
+            },
+        }
+
+class SlaveMetrics:
+    """Fonksiyon kodu ve master başına metrikler"""
+
+    def __init__(self, max_clients: int = 256):
+        self.started = time.time()
+        self.max_clients = max_clients
+        self.by_function: Dict[int, RequestStats] = {}
+        self.by_client: Dict[str, RequestStats] = {}
+        self.lock = threading.Lock()  # Eşzamanlı record() çağrıları (eviction ve sayaçlar) için
+
+    def record(self, client: str, function_code: int, bytes_in: int, bytes_out: int,
+               elapsed: float, error: bool = False):
+        with self.lock:
+            stats = self.by_function.get(function_code)
+            if stats is None:
+                stats = self.by_function[function_code] = RequestStats()
+            stats.record(bytes_in, bytes_out, elapsed, error)
+
+            stats = self.by_client.get(client)
+            if stats is None:
+                # Sürekli yeniden bağlanan master'lar sözlüğü şişirmesin: en eski kayıt atılır
+                if len(self.by_client) >= self.max_clients:
+                    del self.by_client[next(iter(self.by_client))]
+                stats = self.by_client[client] = RequestStats()
+            stats.record(bytes_in, bytes_out, elapsed, error)
+
+    def total_requests(self) -> int:
+        return sum(stats.requests for stats in list(self.by_function.values()))
+
+    def snapshot(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "functions": {f"{fc:02X}": stats.snapshot() for fc, stats in list(self.by_function.items())},
+            "clients": {client: stats.snapshot() for client, stats in list(self.by_client.items())},
+        }
+
+    def render_text(self) -> str:
+        """Prometheus text formatı"""
+        lines = [f"bms_slave_uptime_seconds {time.time() - self.started:.1f}"]
+        groups = [("fc", f"{fc:02X}", stats) for fc, stats in list(self.by_function.items())]
+        groups += [("client", client, stats) for client, stats in list(self.by_client.items())]
+        for label, value, stats in groups:
+            data = stats.snapshot()
+            tag = f'{label}="{value}"'
+            for name in ("requests", "errors", "bytes_in", "bytes_out"):
+                lines.append(f"bms_slave_{name}_total{{{tag}}} {data[name]}")
+            for name, micros in data["latency_us"].items():
+                lines.append(f'bms_slave_latency_us{{{tag},stat="{name}"}} {micros}')
+        return "\n".join(lines) + "\n"
+
+    def format_table(self) -> str:
+        """Konsol dökümü"""
+        lines = [f"{'':<24} {'istek':>10} {'hata':>6} {'KB in':>9} {'KB out':>9} "
+                 f"{'p50 µs':>8} {'p99 µs':>8} {'max µs':>8}"]
+        rows = [(f"FC{fc:02X} {FUNCTION_NAMES.get(fc, '')}"[:24], stats)
+                for fc, stats in sorted(list(self.by_function.items()))]
+        rows += [(client[:24], stats) for client, stats in list(self.by_client.items())]
+        for name, stats in rows:
+            latency = stats.latency
+            lines.append(f"{name:<24} {stats.requests:>10} {stats.errors:>6} "
+                         f"{stats.bytes_in / 1024:>9.1f} {stats.bytes_out / 1024:>9.1f} "
+                         f"{latency.percentile(0.50):>8} {latency.percentile(0.99):>8} {latency.max_us:>8}")
+        return "\n".join(lines)
+
+def start_metrics_server(metrics: SlaveMetrics, port: int = 9108,
+                         host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """/metrics (text) ve /metrics.json endpoint'lerini arka planda sun"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.render_text().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot(), indent=2).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # İstek başına erişim logu basılmaz
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def start_periodic_dump(metrics: SlaveMetrics, interval: float = 60.0,
+                        stop_event: Optional[threading.Event] = None) -> threading.Thread:
+    """Metrik tablosunu belirli aralıklarla konsola bas"""
+    stop_event = stop_event or threading.Event()
+
+    def dump_loop():
+        while not stop_event.wait(interval):
+            print(f"\n📈 SLAVE METRİKLERİ ({time.strftime('%H:%M:%S')})")
+            print(metrics.format_table())
+
+    thread = threading.Thread(target=dump_loop, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
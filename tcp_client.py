@@ -2,6 +2,7 @@ import socket
 import select
 import time
 from typing import Tuple, Optional
+from modbus_core import recv_frame
 
 class TCPClient:
     
@@ -103,6 +104,20 @@ class TCPClient:
         except socket.error:
             return -1, b'', 0
 
+    def receive_frame_from_server(self) -> Tuple[int, bytes, int]:
+
+        if not self.socket or not self.connected:
+            return -1, b'', 0
+
+        try:
+            # MBAP length alanına göre tam bir ADU oku (kısmi / birleşik paketlere karşı)
+            data = recv_frame(self.socket)
+            if not data:
+                return -1, b'', 0
+            return 0, data, len(data)
+        except socket.error:
+            return -1, b'', 0
+
     def close_connection(self):
 
         if self.socket:
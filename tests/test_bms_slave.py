@@ -0,0 +1,37 @@
+import json
+import pytest
+from bms_register_map import BMSAddressCalculator, BMSDataConverter, SummaryField
+from bms_slave import MegaBMSSlave
+
+def _slave() -> MegaBMSSlave:
+    slave = MegaBMSSlave(production=True)
+    slave.verbose = False
+    slave.mapping = slave.mapping_new(50000, 50000, 50000, 50000)
+    slave.attach_change_feed()
+    slave.initialize_mega_bms_data()
+    return slave
+
+@pytest.mark.parametrize("ingest", [MegaBMSSlave.simulate_mega_bms_data, MegaBMSSlave.update_from_can_data])
+def test_json_path_feeds_summaries(ingest, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    json.dump({"main_data": {},
+               "cell_voltages": {f"string_2_packet_3_cell_{c}": 3.3 + c / 1000 for c in range(1, 105)},
+               "temperatures": {f"string_2_packet_3_temp_{t}": 20.0 + t for t in range(1, 43)}},
+              open("bms_data.json", "w"))
+    slave = _slave()
+    ingest(slave)
+
+    registers = slave.mapping.tab_registers
+
+    def read_float(address):
+        return BMSDataConverter.registers_to_float(registers[address], registers[address + 1])
+
+    # Paket ve string özet blokları (31000 / 31600) CAN ingest'indeki gibi dolar
+    for base in (BMSAddressCalculator.get_packet_summary_address(2, 3),
+                 BMSAddressCalculator.get_string_summary_address(2)):
+        assert read_float(base + SummaryField.MIN_CELL_VOLTAGE) == pytest.approx(3.301, abs=1e-5)
+        assert read_float(base + SummaryField.MAX_CELL_VOLTAGE) == pytest.approx(3.404, abs=1e-5)
+        assert read_float(base + SummaryField.MAX_TEMPERATURE) == pytest.approx(62.0)
+    assert slave.cell_extrema.min(2, 3) == (1, pytest.approx(3.301))
+    assert slave.cell_extrema.max(2, 3) == (104, pytest.approx(3.404))
+    assert slave.change_feed.sequence == 104 + 42
@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+import numpy as np
+from bms_register_map import BMSAddressCalculator, BMSDataConverter
+from can_codec import VOLTAGE_LSB, CANFrameDecoder, CANFrameEncoder, floats_to_registers, parse_can_ids
+
+STRINGS, PACKETS = 3, 2
+
+def _state(rng) -> SimpleNamespace:
+    return SimpleNamespace(cell_voltages=rng.uniform(3.0, 4.2, (STRINGS, PACKETS, 104)),
+                           temperatures=rng.uniform(-10.0, 60.0, (STRINGS, PACKETS, 42)),
+                           currents=rng.uniform(-80.0, 80.0, (STRINGS, PACKETS)))
+
+def test_can_ids_round_trip():
+    encoder = CANFrameEncoder(STRINGS, PACKETS, seed=1)
+    string_id, packet_id, bms_in_packet, response_bit = parse_can_ids(encoder.can_ids)
+    assert (response_bit == 1).all()
+    assert list(zip(string_id, packet_id, bms_in_packet)) == [
+        (s, p, b) for s in range(1, STRINGS + 1) for p in range(1, PACKETS + 1) for b in range(1, 7)]
+
+def test_decoder_recovers_encoded_state():
+    rng = np.random.default_rng(2)
+    state = _state(rng)
+    encoder = CANFrameEncoder(STRINGS, PACKETS, seed=2)
+    decoder = CANFrameDecoder(STRINGS, PACKETS)
+
+    frames = encoder.encode(state)
+    assert frames.shape == (STRINGS * PACKETS * 6, 64)
+    assert decoder.decode(encoder.can_ids, frames) == len(frames)
+    assert decoder.cells_received.all() and decoder.temps_received.all()
+    # Ham değer kesilerek kodlanır: hata bir LSB'den küçük
+    assert np.abs(decoder.cell_voltages - state.cell_voltages).max() < VOLTAGE_LSB
+    assert np.abs(decoder.temperatures - state.temperatures).max() < 0.1
+    assert np.allclose(decoder.currents, state.currents.astype(np.float32))
+    assert ((decoder.pressures >= 1.0) & (decoder.pressures <= 3.0)).all()
+
+    # bytes girdisi de aynı sonucu verir
+    again = CANFrameDecoder(STRINGS, PACKETS)
+    again.decode(encoder.can_ids, frames.tobytes())
+    assert np.array_equal(again.cell_voltages, decoder.cell_voltages)
+    assert np.array_equal(again.temperatures, decoder.temperatures)
+
+def test_decoder_rejects_foreign_frames():
+    encoder = CANFrameEncoder(STRINGS, PACKETS, seed=3)
+    decoder = CANFrameDecoder(STRINGS - 1, PACKETS)  # Son string decoder'ın dışında
+    frames = encoder.encode(_state(np.random.default_rng(3)))
+    can_ids = encoder.can_ids.copy()
+    can_ids[0] ^= 1 << 10  # Yanıt biti olmayan (istek) çerçeve
+    assert decoder.decode(can_ids, frames) == (STRINGS - 1) * PACKETS * 6 - 1
+    assert not decoder.cells_received[0, 0, :18].any()
+    assert decoder.cells_received[0, 0, 18:].all()
+
+def test_write_registers_matches_address_map():
+    rng = np.random.default_rng(4)
+    state = _state(rng)
+    encoder = CANFrameEncoder(STRINGS, PACKETS, seed=4)
+    decoder = CANFrameDecoder(STRINGS, PACKETS)
+    decoder.decode(encoder.can_ids, encoder.encode(state))
+    registers = [0] * 50000
+    decoder.write_registers(registers, full=True)
+
+    def read_float(address):
+        return BMSDataConverter.registers_to_float(registers[address], registers[address + 1])
+
+    # Hücre bloğu sıcaklık bloğuyla çakışır; çakışmayan bir hücre ve tüm sıcaklıklar kontrol edilir
+    address = BMSAddressCalculator.get_cell_voltage_address(1, 1, 1)
+    assert np.isclose(read_float(address), decoder.cell_voltages[0, 0, 0], atol=1e-6)
+    for s in range(STRINGS):
+        for p in range(PACKETS):
+            for t in range(42):
+                address = BMSAddressCalculator.get_temperature_address(s + 1, p + 1, t // 7 + 1, t % 7 + 1)
+                assert np.isclose(read_float(address), decoder.temperatures[s, p, t], atol=1e-4)
+
+    # Değişmeyen ikinci çerçeve grubu register yazmaz; tek hücre değişince yalnızca o yazılır
+    decoder.decode(encoder.can_ids, encoder.encode(state))
+    assert not decoder.cells_changed.any() and not decoder.temps_changed.any()
+    state.cell_voltages[1, 1, 50] += 0.01
+    decoder.decode(encoder.can_ids, encoder.encode(state))
+    assert list(zip(*np.nonzero(decoder.cells_changed))) == [(1, 1, 50)]
+    assert [tuple(axis) for axis in decoder.changed_packets()] == [(1,), (1,)]
+
+class _RecordingBank(list):
+    """Liste bank; yazılan indeksleri kaydeder"""
+
+    def __init__(self, size):
+        super().__init__([0] * size)
+        self.written = set()
+
+    def __setitem__(self, key, value):
+        indices = range(*key.indices(len(self))) if isinstance(key, slice) else [key]
+        self.written.update(indices)
+        super().__setitem__(key, value)
+
+def test_write_registers_touches_only_decoded_pairs():
+    state = _state(np.random.default_rng(5))
+    encoder = CANFrameEncoder(STRINGS, PACKETS, seed=5)
+    addresses = [BMSAddressCalculator.get_cell_voltage_address(1, 1, 6),
+                 BMSAddressCalculator.get_cell_voltage_address(3, 2, 91)]
+    for bank in (_RecordingBank(50000), np.zeros(50000, dtype=np.uint16)):
+        decoder = CANFrameDecoder(STRINGS, PACKETS)
+        decoder.decode(encoder.can_ids, encoder.encode(state))
+        decoder.write_registers(bank, full=True)
+        # Birbirinden uzak iki hücre değişir; aradaki register'lar (ör. master yazmaları) yazılmamalı
+        state.cell_voltages[0, 0, 5] += 0.01
+        state.cell_voltages[2, 1, 90] += 0.01
+        decoder.decode(encoder.can_ids, encoder.encode(state))
+        if isinstance(bank, _RecordingBank):
+            bank.written.clear()
+        before = np.array(bank, dtype=np.uint16)
+        decoder.write_registers(bank)
+        after = np.array(bank, dtype=np.uint16)
+        if isinstance(bank, _RecordingBank):
+            assert bank.written == {a + k for a in addresses for k in (0, 1)}
+        assert set(np.flatnonzero(before != after)) <= {a + k for a in addresses for k in (0, 1)}
+        for address, value in zip(addresses, (decoder.cell_voltages[0, 0, 5], decoder.cell_voltages[2, 1, 90])):
+            assert list(after[address:address + 2]) == floats_to_registers(value).reshape(-1).tolist()
+        state.cell_voltages[0, 0, 5] -= 0.01
+        state.cell_voltages[2, 1, 90] -= 0.01
@@ -0,0 +1,113 @@
+import struct
+import numpy as np
+import pytest
+from address_map import AddressSpace, ArrayRegisterCodec, RegisterCodec
+from bms_register_map import BMSChangeFeed, BMSDataConverter
+from change_feed import FEED_MORE, FEED_RESYNC, ChangeFeed, change_feed_space
+
+def _feed() -> ChangeFeed:
+    return ChangeFeed(cell_deadband=0.01, temp_deadband=0.5, total_strings=1, packets_per_string=2,
+                      cells_per_packet=10, temps_per_packet=3)
+
+def _update(feed: ChangeFeed, cells: np.ndarray, temps: np.ndarray) -> int:
+    return feed.update(cells, temps, np.ones(cells.shape, dtype=bool), np.ones(temps.shape, dtype=bool))
+
+def _read_all(feed: ChangeFeed, cursor: int, register_count: int, epoch=None):
+    """Master gibi FEED_MORE bitene kadar blok oku; (nokta -> değer, son imleç, sayfa sayısı, bayraklar)"""
+    changes, pages, seen_flags = {}, 0, 0
+    while True:
+        block = feed.encode_block(cursor, register_count, epoch)
+        pages += 1
+        cursor, count, flags = (block[0] << 16) | block[1], block[2], block[3]
+        seen_flags |= flags
+        assert block[4] == feed.epoch
+        entries = np.array(block[BMSChangeFeed.HEADER_SIZE:BMSChangeFeed.HEADER_SIZE + count * 3],
+                           dtype=np.uint16).reshape(-1, 3)
+        for point, high, low in entries:
+            changes[int(point)] = BMSDataConverter.registers_to_float(int(high), int(low))
+        if not flags & FEED_MORE:
+            return changes, cursor, pages, seen_flags
+
+def test_pagination_is_lossless():
+    feed = _feed()
+    cells = np.linspace(3.0, 3.5, 20, dtype=np.float32)
+    temps = np.arange(6, dtype=np.float32) + 20
+    assert _update(feed, cells, temps) == 26
+
+    # Blok başına 4 kayıt: 26 nokta 7 sayfada gelir
+    changes, cursor, pages, flags = _read_all(feed, 0, BMSChangeFeed.HEADER_SIZE + 4 * 3)
+    assert pages == 7 and flags == FEED_MORE
+    assert cursor == feed.sequence
+    assert sorted(changes) == list(range(26))
+    assert np.allclose([changes[p] for p in range(20)], cells)
+    assert np.allclose([changes[20 + p] for p in range(6)], temps)
+
+    # Deadband altındaki oynama bildirilmez, aşan tek nokta bildirilir
+    cells[3] += 0.005
+    cells[7] += 0.05
+    assert _update(feed, cells, temps) == 1
+    changes, next_cursor, pages, flags = _read_all(feed, cursor, BMSChangeFeed.HEADER_SIZE + 4 * 3, feed.epoch)
+    assert changes == {7: float(cells[7])} and pages == 1 and flags == 0
+    changes, _, _, _ = _read_all(feed, next_cursor, BMSChangeFeed.HEADER_SIZE + 4 * 3, feed.epoch)
+    assert changes == {}
+
+def test_point_changed_during_paging_is_not_lost():
+    feed = _feed()
+    cells = np.full(20, 3.3, dtype=np.float32)
+    temps = np.full(6, 25.0, dtype=np.float32)
+    _update(feed, cells, temps)
+    block = feed.encode_block(0, BMSChangeFeed.HEADER_SIZE + 5 * 3)
+    assert block[3] == FEED_MORE
+    cursor = (block[0] << 16) | block[1]
+
+    # İlk sayfada alınmış nokta sayfalama sürerken tekrar değişir: yeni numarasıyla sonda gelir
+    cells[0] = 3.6
+    _update(feed, cells, temps)
+    changes, _, _, _ = _read_all(feed, cursor, BMSChangeFeed.HEADER_SIZE + 5 * 3)
+    assert changes[0] == np.float32(3.6)
+    assert set(changes) == set(range(26)) - {1, 2, 3, 4}
+
+def test_epoch_mismatch_forces_resync():
+    feed = _feed()
+    _update(feed, np.full(20, 3.3, dtype=np.float32), np.full(6, 25.0, dtype=np.float32))
+    _, cursor, _, _ = _read_all(feed, 0, 125, feed.epoch)
+
+    changes, _, _, flags = _read_all(feed, cursor, 125, feed.epoch)
+    assert changes == {} and flags == 0
+    # Eski dönemin imleci: slave yeniden başlamış sayılır, tam senkronizasyon
+    stale_epoch = feed.epoch ^ 0x5A5A
+    changes, _, _, flags = _read_all(feed, cursor, 125, stale_epoch)
+    assert flags & FEED_RESYNC and len(changes) == 26
+    # Dönem gönderilmezse (eski istemci) imleç olduğu gibi kullanılır
+    changes, _, _, flags = _read_all(feed, cursor, 125)
+    assert changes == {} and flags == 0
+    # Slave'in henüz vermediği imleç de yeniden senkronizasyondur
+    _, _, _, flags = _read_all(feed, cursor + 100, 125, feed.epoch)
+    assert flags & FEED_RESYNC
+
+@pytest.mark.parametrize("codec, bank", [(RegisterCodec, lambda: [0] * 40000),
+                                         (ArrayRegisterCodec, lambda: np.zeros(40000, dtype=np.uint16))])
+def test_feed_is_served_by_the_address_space(codec, bank):
+    feed = _feed()
+    _update(feed, np.full(20, 3.3, dtype=np.float32), np.full(6, 25.0, dtype=np.float32))
+    holding = AddressSpace(codec)
+    registers = bank()
+    holding.add(0, len(registers), registers, table="registers")
+    space = change_feed_space(holding, feed)
+
+    # İmleç + dönem yazılır, blok aynı "istekte" okunur; banka değişmez
+    written = space.write(BMSChangeFeed.CURSOR, 3, struct.pack('>3H', 0, 0, feed.epoch))
+    assert {table for table, _, _ in written} == {"change_feed"}
+    block = struct.unpack('>17H', space.read(BMSChangeFeed.BLOCK_BASE, 17))
+    assert block[:5] == (0, 4, 4, FEED_MORE, feed.epoch)
+    assert list(block[5::3]) == [0, 1, 2, 3]
+    assert not any(registers[BMSChangeFeed.CURSOR:BMSChangeFeed.BLOCK_BASE + 17])
+
+    # Yalnızca imleç (2 register, eski istemci): dönem kontrolü yok; blok ortasından okuma da çalışır
+    space.write(BMSChangeFeed.CURSOR, 2, struct.pack('>2H', 0, 24))
+    tail = struct.unpack('>11H', space.read(BMSChangeFeed.BLOCK_BASE + 2, 11))
+    assert tail[:3] == (2, 0, feed.epoch) and tail[3] == 24
+    # Akış aralığı dışındaki register'lar bankaya gider
+    space.write(BMSChangeFeed.CURSOR + 3, 1, b'\x00\x07')
+    assert registers[BMSChangeFeed.CURSOR + 3] == 7
+    assert holding.read(BMSChangeFeed.BLOCK_BASE, 1) == b'\x00\x00'
@@ -0,0 +1,122 @@
+import socket
+import struct
+import threading
+import time
+import pytest
+from modbus_gateway import GATEWAY_TARGET_FAILED, DownstreamConnection, ModbusGateway
+
+DROPPED_FROM = 1000  # Sahte downstream bu adresten itibaren okumalara hiç yanıt vermez
+
+def _serve_downstream(listener: socket.socket):
+    while True:
+        try:
+            conn, _ = listener.accept()
+        except OSError:
+            return
+        threading.Thread(target=_answer, args=(conn,), daemon=True).start()
+
+def _answer(conn: socket.socket):
+    buffer = b''
+    while True:
+        try:
+            data = conn.recv(4096)
+        except OSError:
+            return
+        if not data:
+            return
+        buffer += data
+        while len(buffer) >= 12:
+            transaction_id, _, length, unit_id = struct.unpack('>HHHB', buffer[:7])
+            frame, buffer = buffer[:6 + length], buffer[6 + length:]
+            address = struct.unpack('>H', frame[8:10])[0]
+            if address < DROPPED_FROM:
+                conn.sendall(struct.pack('>HHHBBBH', transaction_id, 0, 5, unit_id, 0x03, 2, address))
+
+class _Upstream:
+    """Gateway'in yanıt yazdığı master soketi yerine geçer"""
+
+    def __init__(self):
+        self.responses = {}
+        self.lock = threading.Lock()
+
+    def sendall(self, data: bytes):
+        with self.lock:
+            self.responses[struct.unpack('>H', data[:2])[0]] = data[7:]
+
+    def getpeername(self):
+        return ("upstream", 1)
+
+def _read(transaction_id: int, address: int, unit_id: int = 1) -> bytes:
+    return struct.pack('>HHHBBHH', transaction_id, 0, 6, unit_id, 0x03, address, 1)
+
+@pytest.fixture
+def gateway():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    threading.Thread(target=_serve_downstream, args=(listener,), daemon=True).start()
+    gateway = ModbusGateway(port=0, timeout=0.3)
+    gateway.add_route('127.0.0.1', listener.getsockname()[1], unit_id=1, connections=1, max_in_flight=2)
+    yield gateway
+    gateway.close()
+    listener.close()
+
+def test_unanswered_request_expires_while_other_replies_flow(gateway):
+    upstream = _Upstream()
+    gateway.reply(upstream, _read(1, DROPPED_FROM))
+    # Aynı bağlantıdan sürekli yanıt gelir, okuma soketi hiç boşta kalmaz
+    start = time.monotonic()
+    transaction_id = 100
+    while 1 not in upstream.responses and time.monotonic() - start < 2.0:
+        gateway.reply(upstream, _read(transaction_id, transaction_id % 500))
+        transaction_id += 1
+        time.sleep(0.002)
+    assert upstream.responses.get(1) == bytes([0x83, GATEWAY_TARGET_FAILED])
+    assert time.monotonic() - start < 1.0
+    time.sleep(0.05)
+    assert all(upstream.responses[t][0] == 0x03 for t in range(100, transaction_id))
+
+def test_queued_requests_expire(gateway):
+    upstream = _Upstream()
+    for transaction_id in range(4):  # Bağlantı açılınca 2'si havada, 2'si kuyrukta
+        gateway.reply(upstream, _read(transaction_id, DROPPED_FROM + transaction_id))
+    start = time.monotonic()
+    while gateway.stats()["in_flight"] < 2 and time.monotonic() - start < 0.2:
+        time.sleep(0.005)  # Bağlantı connector thread'inde açılır
+    assert gateway.stats()["queued"] == 2
+    time.sleep(0.8)
+    assert upstream.responses == {t: bytes([0x83, GATEWAY_TARGET_FAILED]) for t in range(4)}
+    assert gateway.stats() == {**gateway.stats(), "timeouts": 4, "in_flight": 0, "queued": 0}
+
+def test_unreachable_route_does_not_block_serve(gateway, monkeypatch):
+    unreachable = socket.socket()
+    unreachable.bind(('127.0.0.1', 0))
+    unreachable_port = unreachable.getsockname()[1]
+    open_connection = DownstreamConnection.open
+
+    def slow_open(connection):
+        if connection.pool.port == unreachable_port:
+            time.sleep(1.0)  # Yanıt vermeyen hedefe connect() timeout'u
+            return None
+        return open_connection(connection)
+
+    monkeypatch.setattr(DownstreamConnection, "open", slow_open)
+    gateway.add_route('127.0.0.1', unreachable_port, unit_id=2, connections=1)
+    assert gateway.tcp_listen()
+    stop = threading.Event()
+    threading.Thread(target=gateway.serve, args=(stop, 0.05), daemon=True).start()
+    client = socket.create_connection(('127.0.0.1', gateway.socket.getsockname()[1]))
+    client.settimeout(2.0)
+    try:
+        start = time.monotonic()
+        client.sendall(_read(1, 10, unit_id=2) + _read(2, 20, unit_id=1))
+        response = client.recv(4096)
+        # Erişilemeyen hedefin bağlantısı açılırken diğer rotanın yanıtı beklemez
+        assert struct.unpack('>H', response[:2])[0] == 2 and response[7:] == bytes([0x03, 2, 0, 20])
+        assert time.monotonic() - start < 0.5
+        response = client.recv(4096)
+        assert struct.unpack('>H', response[:2])[0] == 1 and response[7:] == bytes([0x83, GATEWAY_TARGET_FAILED])
+    finally:
+        stop.set()
+        client.close()
+        unreachable.close()
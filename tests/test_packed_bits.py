@@ -0,0 +1,72 @@
+import random
+import pytest
+from modbus_core import PackedBits, pack_bits, unpack_bits
+
+def _reference_pack(bits) -> bytes:
+    out = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            out[i // 8] |= 1 << (i % 8)
+    return bytes(out)
+
+def test_pack_unpack_round_trip():
+    rng = random.Random(3)
+    for count in (1, 7, 8, 9, 15, 16, 17, 1968, 2000):
+        bits = [rng.random() < 0.5 for _ in range(count)]
+        packed = pack_bits(bits)
+        assert packed == _reference_pack(bits)
+        assert unpack_bits(packed, count) == bits
+    assert pack_bits([]) == b''
+    assert pack_bits([0, 2, 255, 0, 1]) == pack_bits([False, True, True, False, True])
+    assert unpack_bits(b'\xff', 20) == [True] * 8  # Veri kadarıyla sınırlı
+
+def test_read_packed_matches_list_at_unaligned_offsets():
+    rng = random.Random(4)
+    size = 203
+    reference = [rng.random() < 0.5 for _ in range(size)]
+    store = PackedBits(size)
+    store[0:size] = reference
+    for address in range(0, 24):
+        for count in (1, 3, 8, 13, 64, 150):
+            expected = reference[address:address + count]
+            expected += [False] * (count - len(expected))  # Depo dışı bitler 0
+            assert store.read_packed(address, count) == _reference_pack(expected)
+    assert store.read_packed(size - 5, 20) == _reference_pack(reference[-5:] + [False] * 15)
+    assert store.read_packed(10, 0) == b''
+
+def test_read_packed_negative_address_pads_front():
+    store = PackedBits(32)
+    store[0:32] = [True] * 32
+    assert store.read_packed(-3, 10) == _reference_pack([False] * 3 + [True] * 7)
+    assert store.read_packed(-12, 10) == _reference_pack([False] * 10)
+
+def test_write_packed_matches_list_at_unaligned_offsets():
+    rng = random.Random(5)
+    size = 203
+    reference = [rng.random() < 0.5 for _ in range(size)]
+    store = PackedBits(size)
+    store[0:size] = reference
+    for _ in range(300):
+        address = rng.randrange(size)
+        count = rng.randint(1, size - address)
+        bits = [rng.random() < 0.5 for _ in range(count)]
+        # Son byte'taki fazla bitler (count dışı) yazılmamalı
+        packed = bytearray(_reference_pack(bits))
+        if count % 8:
+            packed[-1] |= 0xFF << (count % 8) & 0xFF
+        store.write_packed(address, count, bytes(packed))
+        reference[address:address + count] = bits
+        assert store[0:size] == reference
+        assert [store[i] for i in (address, address + count - 1, -1)] == \
+            [reference[address], reference[address + count - 1], reference[-1]]
+
+def test_write_packed_rejects_out_of_range():
+    store = PackedBits(16)
+    with pytest.raises(IndexError):
+        store.write_packed(-1, 4, b'\x0f')
+    with pytest.raises(IndexError):
+        store.write_packed(14, 4, b'\x0f')
+    with pytest.raises(IndexError):
+        store[16] = True
+    with pytest.raises(ValueError):
+        store[0:4] = [True]
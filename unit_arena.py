@@ -0,0 +1,86 @@
+"""
+Çok unit'li slave için paylaşımlı bellek register arenası
+Her unit ID'nin (konteyner) coil / discrete input / holding / input register bankası tek bir
+multiprocessing.shared_memory bloğunda ardışık dilimlerdir. Slave bankaları kopyasız görünümler
+olarak kullanır; konteyner başına ingest süreçleri aynı arenaya adıyla bağlanıp kendi unit'ine yazar.
+
+Yerleşim (unit'ler ID sırasıyla):
+  başlık : unit başına uint64 dış yazma nesli (touch())
+  unit   : holding register'lar (uint16) | input register'lar (uint16) | coil'ler | discrete input'lar (bit-paketli)
+
+Dış yazıcı örneği:
+  arena = UnitArena([1, 2, 3], name="bms_units", create=False)
+  _, _, registers, _ = arena.tables(2)
+  registers[1000:1002] = (high, low); arena.touch(2)   # slave yanıt önbelleği geçersizleşir
+"""
+import os
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from modbus_core import PackedBits
+
+class UnitArena:
+    def __init__(self, unit_ids: Iterable[int], nb_bits: int = 50000, nb_input_bits: int = 50000,
+                 nb_registers: int = 50000, nb_input_registers: int = 50000,
+                 name: Optional[str] = None, create: bool = True):
+        self.unit_ids = sorted(set(unit_ids))
+        if not self.unit_ids or not all(0 <= unit_id <= 0xFF for unit_id in self.unit_ids):
+            raise ValueError(f"Geçersiz unit ID listesi: {self.unit_ids}")
+        self.index = {unit_id: i for i, unit_id in enumerate(self.unit_ids)}
+        self.sizes = (nb_bits, nb_input_bits, nb_registers, nb_input_registers)
+        # Unit içi dilim ofsetleri; unit boyutu 8 byte'a hizalanır
+        self.layout = (0, 2 * nb_registers, 2 * (nb_registers + nb_input_registers),
+                       2 * (nb_registers + nb_input_registers) + (nb_bits + 7) // 8)
+        unit_bytes = self.layout[3] + (nb_input_bits + 7) // 8
+        self.unit_bytes = (unit_bytes + 7) & ~7
+        self.header_bytes = 8 * len(self.unit_ids)
+        size = self.header_bytes + self.unit_bytes * len(self.unit_ids)
+        if create or sys.version_info < (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+            if not create and os.name == "posix":
+                # Python < 3.13: bağlanan süreç çıkarken resource_tracker bloğu silmesin
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        else:
+            self.shm = shared_memory.SharedMemory(name=name, create=False, size=size, track=False)
+        self.created = create
+        self.generations = np.ndarray((len(self.unit_ids),), dtype=np.uint64, buffer=self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def tables(self, unit_id: int) -> Tuple[PackedBits, PackedBits, np.ndarray, np.ndarray]:
+        """(coil'ler, discrete input'lar, holding register'lar, input register'lar) — arenaya görünüm"""
+        nb_bits, nb_input_bits, nb_registers, nb_input_registers = self.sizes
+        base = self.header_bytes + self.index[unit_id] * self.unit_bytes
+        registers_offset, input_registers_offset, bits_offset, input_bits_offset = self.layout
+        buffer = self.shm.buf
+        registers = np.ndarray((nb_registers,), dtype=np.uint16, buffer=buffer, offset=base + registers_offset)
+        input_registers = np.ndarray((nb_input_registers,), dtype=np.uint16, buffer=buffer,
+                                     offset=base + input_registers_offset)
+        bits = PackedBits(nb_bits, buffer[base + bits_offset:base + bits_offset + (nb_bits + 7) // 8])
+        input_bits = PackedBits(nb_input_bits, buffer[base + input_bits_offset:
+                                                      base + input_bits_offset + (nb_input_bits + 7) // 8])
+        return bits, input_bits, registers, input_registers
+
+    def generation_view(self, unit_id: int) -> np.ndarray:
+        """Unit'in dış yazma nesli (1 elemanlı görünüm, ModbusMapping.shared_generation)"""
+        i = self.index[unit_id]
+        return self.generations[i:i + 1]
+
+    def touch(self, unit_id: int):
+        """Dış süreç bankayı değiştirdikten sonra çağırır"""
+        self.generations[self.index[unit_id]] += 1
+
+    def close(self):
+        """Bellek eşlemesini bırak; önce tables() görünümlerini tutan bankalar bırakılmalıdır"""
+        self.generations = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Görünümler (numpy / PackedBits) hâlâ kullanımda; eşleme süreç çıkışında bırakılır
+
+    def unlink(self):
+        if self.created:
+            self.shm.unlink()